@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import json
+from functools import wraps
+from flask import Response, request, session
+from exports import json_value
+
+API_PREFIX = '/api/v1'
+PRODUCT_FIELDS = ('id', 'name', 'description', 'price', 'category', 'stock')
+CART_ITEM_FIELDS = ('product_id', 'name', 'category', 'price', 'quantity', 'line_total')
+ORDER_FIELDS = ('id', 'status', 'total', 'timestamp')
+ORDER_DETAIL_FIELDS = ORDER_FIELDS + ('address', 'items', 'history')
+API_PAGE_SIZE = 50
+MAX_API_PAGE_SIZE = 200
+# Bodies smaller than this fit in a packet or two; compressing them only
+# costs CPU on both ends.
+GZIP_MIN_SIZE = 1024
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def register_api(app):
+    # API errors are JSON, whichever view raised them
+    @app.errorhandler(ApiError)
+    def api_error(error):
+        return json_response({'error': error.message}, status=error.status)
+
+
+def api_login_required(f):
+    # a 401 instead of the login redirect the HTML views use
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            raise ApiError(401, "Please log in.")
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def parse_fields(args, allowed):
+    # ?fields=id,name,price keeps only those keys; the default is all of them
+    requested = [name.strip() for name in args.get('fields', '').split(',') if name.strip()]
+    if not requested:
+        return allowed
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise ApiError(400, f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(allowed)}.")
+    return tuple(dict.fromkeys(requested))
+
+
+def page_limit(args):
+    return min(max(args.get('limit', API_PAGE_SIZE, type=int), 1), MAX_API_PAGE_SIZE)
+
+
+def select_fields(record, fields):
+    return {name: record.get(name) for name in fields}
+
+
+def json_response(payload, status=200):
+    body = json.dumps(payload, separators=(',', ':'), default=json_value).encode()
+    response = Response(status=status, mimetype='application/json')
+    if len(body) >= GZIP_MIN_SIZE and request.accept_encodings['gzip']:
+        body = gzip.compress(body, compresslevel=6, mtime=0)
+        response.headers['Content-Encoding'] = 'gzip'
+    response.set_data(body)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def version_etag(versions, key=None):
+    # Row versions change on every write, so hashing them with the URL (which
+    # carries the page and field selection) names one exact response body.
+    # `key` replaces the URL when several endpoints answer with the same body.
+    digest = hashlib.sha256((key or request.full_path).encode())
+    digest.update(repr(list(versions)).encode())
+    return digest.hexdigest()[:32]
+
+
+def versioned_response(versions, build, key=None, status=200):
+    # Answers from the row versions alone when the client already has this
+    # representation: `build` (which loads and serialises the rows) only runs
+    # on a miss. Clients must revalidate each time, so a change shows at once.
+    etag = version_etag(versions, key)
+    if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.vary.add('Accept-Encoding')
+    else:
+        response = json_response(build(), status=status)
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
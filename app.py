@@ -1,36 +1,88 @@
-from flask import Flask, render_template, request, redirect, session, url_for, flash
-from models import db, User, Product, CartItem, Order, OrderItem , Rating
-from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
-from flask_sqlalchemy import SQLAlchemy
+import click
+from flask import Flask, render_template, request, redirect, session, url_for, flash, abort, jsonify
+from models import db, User, Product, Order
+from queries import (admin_dashboard_data, customer_orders_page, order_detail, order_export_rows,
+                     order_record, order_versions, product_record, products_page, sales_export_rows)
+from api import (API_PREFIX, CART_ITEM_FIELDS, ORDER_DETAIL_FIELDS, ORDER_FIELDS, PRODUCT_FIELDS, ApiError,
+                 api_login_required, page_limit, parse_fields, register_api, select_fields,
+                 versioned_response)
+from exports import ORDER_EXPORT_FIELDS, SALES_EXPORT_FIELDS, export_response, parse_date_range, report_range
+from catalog import CATEGORIES, render_catalog, seed_products
+from search import (MAX_RESULTS, SEARCH_PAGE_SIZE, CachedSearch, exclude_search_tables,
+                    product_search_backend, rebuild_search_index)
+from orders import CheckoutError, OrderStatusError, change_order_status, place_order
+from ratings import STAR_VALUES, rebuild_rating_summaries, save_ratings
+from sales import rebuild_sales_rollups, sales_report
+from identity import CurrentUser, Identity
+from database import configure_database
+from sessions import ServerSessionInterface, SqlSessionStore
+from instrumentation import Instrumentation
+from assets import StaticAssets
+from pages import PageCache, enable_template_bytecode_cache
+from passwords import PasswordHasher, PasswordHasherBusy
+from ratelimit import LoginThrottle, trust_proxies
+from carts import (add_item, cart_has_items, cart_item_record, cart_items, cart_summary, cart_versions,
+                   invalidate_cart, remove_item, summarize)
+from sqlalchemy import event
 from flask_migrate import Migrate
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///homemade_pickles.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_database(app)
 app.secret_key = 'your-secret-key'
+trust_proxies(app)
 
 db.init_app(app)
-migrate = Migrate(app, db)
-
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
+migrate = Migrate(app, db, include_object=exclude_search_tables)
+app.session_interface = ServerSessionInterface(SqlSessionStore(app))
+instrumentation = Instrumentation(app, sql=True)
+enable_template_bytecode_cache(app)
+static_assets = StaticAssets(app)
+page_cache = PageCache()
+product_search = CachedSearch(product_search_backend(app))
+register_api(app)
+
+def current_user_snapshot(user):
+    return CurrentUser(id=user.id, username=user.username, email=user.email, is_admin=user.is_admin)
+
+def load_user(user_id):
+    user = db.session.get(User, user_id)
+    return current_user_snapshot(user) if user else None
+
+identity = Identity(load_user)
+login_required = identity.login_required
+passwords = PasswordHasher()
+login_throttle = LoginThrottle()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    identity.invalidate(target.id)
+
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_update')
+@event.listens_for(Product, 'after_delete')
+def invalidate_product_search(mapper, connection, target):
+    product_search.clear()
+
+@app.context_processor
+def inject_cart_summary():
+    if 'user_id' not in session:
+        return {}
+    return {'cart_summary': cart_summary(session['user_id'])}
 
 @app.route('/')
+@page_cache.anonymous
 def home():
     return render_template('index.html')
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
+        if not login_throttle.allow(request.remote_addr):
+            flash("Too many attempts. Please wait a minute and try again.", "error")
+            return render_template('register.html'), 429
         username = request.form['username']
         email = request.form['email']
-        password = generate_password_hash(request.form['password'])
         role = request.form['role']
         is_admin = True if role == 'admin' else False
 
@@ -38,6 +90,11 @@ def register():
             flash("Email already registered.", "error")
             return redirect(url_for('register'))
 
+        try:
+            password = passwords.hash(request.form['password'])
+        except PasswordHasherBusy:
+            flash("The server is busy. Please try again.", "error")
+            return render_template('register.html'), 503
         user = User(username=username, email=email, password=password, is_admin=is_admin)
         db.session.add(user)
         db.session.commit()
@@ -50,12 +107,29 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email')  
         password = request.form.get('password')
+        if not login_throttle.allow(request.remote_addr, email):
+            flash("Too many login attempts. Please wait a minute and try again.", "error")
+            return render_template('login.html'), 429
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password, password):
+        try:
+            valid = user is not None and passwords.verify(user.password, password)
+        except PasswordHasherBusy:
+            flash("The server is busy. Please try again.", "error")
+            return render_template('login.html'), 503
+        try:
+            if valid and passwords.needs_rehash(user.password):
+                user.password = passwords.hash(password)
+                db.session.commit()
+        except PasswordHasherBusy:
+            # the password checked out; upgrade the hash on a quieter login
+            pass
+
+        if valid:
             session['user_id'] = user.id
             session['username'] = user.username  
             session['is_admin'] = user.is_admin
+            identity.remember(current_user_snapshot(user))
             flash("Login successful.", "success")
             return redirect(url_for('dashboard'))
         else:
@@ -70,25 +144,18 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
-def dashboard():
-    user = User.query.get(session['user_id'])
+async def dashboard():
+    user = identity.current_user()
+    if not user:
+        session.clear()
+        return redirect(url_for('login'))
 
     if user.is_admin:
-        products = Product.query.all()
-        for product in products:
-            avg = db.session.query(db.func.avg(Rating.stars)).filter_by(product_id=product.id).scalar()
-            product.avg_rating = avg
-
-        orders = Order.query.all()
-        for order in orders:
-            rating = Rating.query.filter_by(order_id=order.id).first()
-            order.rating = rating
-
-        customers = User.query.filter_by(is_admin=False).all()
-        admins = User.query.filter_by(is_admin=True).all()
-
-        return render_template('admin_dashboard.html', customers=customers, admins=admins,
-                               products=products, orders=orders)
+        try:
+            data = await admin_dashboard_data(request.args)
+        except ValueError:
+            abort(400)
+        return render_template('admin_dashboard.html', **data)
     else:
         orders = Order.query.filter_by(user_id=user.id).all()
         return render_template('customer_dashboard.html', user=user, orders=orders)
@@ -96,34 +163,43 @@ def dashboard():
 @app.route('/products')
 @login_required
 def products():
-    products = Product.query.all()
-    return render_template('products.html', products=products)
+    query = request.args.get('q', '').strip()
+    if query:
+        ids = [result['id'] for result in product_search.search(query, SEARCH_PAGE_SIZE)]
+        found = {product.id: product for product in Product.query.filter(Product.id.in_(ids))}
+        return render_template('products.html', products=[found[id] for id in ids if id in found],
+                               category=None, query=query)
+    category = request.args.get('category')
+    if category not in CATEGORIES:
+        category = None
+    return render_template('products.html', catalog_html=render_catalog(category),
+                           category=category)
+
+@app.route('/api/products/search')
+@login_required
+def search_products():
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', MAX_RESULTS, type=int), 1), SEARCH_PAGE_SIZE)
+    response = jsonify(query=query, results=product_search.search(query, limit))
+    response.cache_control.private = True
+    response.cache_control.max_age = 30
+    return response
 
 @app.route('/add-to-cart', methods=['POST'])
 @login_required
 def add_to_cart():
-    name = request.form.get('name')
-    price = float(request.form.get('price'))
-    description = request.form.get('description')
-    category = request.form.get('category')
-    quantity = int(request.form.get('quantity', 1))
+    product_id = request.form.get('product_id', type=int)
+    quantity = request.form.get('quantity', 1, type=int)
     user_id = session['user_id']
 
-    product = Product.query.filter_by(name=name).first()
-    if not product:
-        product = Product(name=name, description=description, price=price,
-                          category=category, stock=100)
-        db.session.add(product)
-        db.session.commit()
-
-    cart_item = CartItem.query.filter_by(user_id=user_id, product_id=product.id).first()
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        cart_item = CartItem(user_id=user_id, product_id=product.id, quantity=quantity)
-        db.session.add(cart_item)
+    product = db.session.get(Product, product_id) if product_id else None
+    if not product or quantity < 1:
+        flash("Product not found.", "error")
+        return redirect(url_for('products'))
 
-    db.session.commit()
+    if not add_item(user_id, product.id, quantity):
+        flash("Could not add the item to your cart. Please try again.", "error")
+        return redirect(url_for('products'))
     flash("Item added to cart.", "success")
     return redirect(url_for('products'))
 
@@ -131,17 +207,14 @@ def add_to_cart():
 @login_required
 def cart():
     user_id = session['user_id']
-    cart_items = CartItem.query.filter_by(user_id=user_id).all()
-    valid_cart = [item for item in cart_items if item.product is not None]
-    total = sum(item.product.price * item.quantity for item in valid_cart)
-    return render_template('cart.html', cart=valid_cart, total_price=total)
+    items = cart_items(user_id)
+    return render_template('cart.html', cart=items, total_price=summarize(items).total)
 
 @app.route('/checkout')
 @login_required
 def checkout():
     user_id = session['user_id']
-    cart_items = CartItem.query.filter_by(user_id=user_id).all()
-    if not cart_items:
+    if not cart_has_items(user_id):
         flash("Your cart is empty.", "info")
         return redirect(url_for('products'))
     return render_template('address_form.html')
@@ -151,25 +224,19 @@ def checkout():
 def process_checkout():
     user_id = session['user_id']
     address = request.form.get('address')
-    cart_items = CartItem.query.filter_by(user_id=user_id).all()
 
-    if not address or not cart_items:
+    if not address:
         flash("Address is required and cart must not be empty.", "error")
         return redirect(url_for('checkout'))
 
-    total = sum(item.product.price * item.quantity for item in cart_items if item.product)
-    new_order = Order(user_id=user_id, total=total, address=address)
-    db.session.add(new_order)
-    db.session.commit()
-
-    for item in cart_items:
-        if item.product:
-            order_item = OrderItem(order_id=new_order.id, product_id=item.product_id,
-                                   quantity=item.quantity, price=item.product.price)
-            db.session.add(order_item)
-            db.session.delete(item)
+    try:
+        new_order = place_order(user_id, address)
+    except CheckoutError as e:
+        flash(str(e), "error")
+        return redirect(url_for('cart'))
+    finally:
+        invalidate_cart(user_id)
 
-    db.session.commit()
     return redirect(url_for('payment_success', order_id=new_order.id))
 
 @app.route('/payment-success/<int:order_id>')
@@ -183,7 +250,56 @@ def track_order(order_id):
     order = Order.query.get_or_404(order_id)
     return render_template('track_order.html', order=order)
 
+@app.route('/admin/orders/status', methods=['POST'])
+@login_required
+def update_order_status():
+    user = identity.current_user()
+    if not user or not user.is_admin:
+        abort(403)
+    status = request.form.get('status')
+    order_ids = request.form.getlist('order_id', type=int)
+    try:
+        changed = change_order_status(order_ids, status, changed_by=user.id)
+    except OrderStatusError as e:
+        flash(str(e), "error")
+    else:
+        skipped = len(set(order_ids)) - len(changed)
+        message = f"Moved {len(changed)} order(s) to {status}."
+        if skipped:
+            message += f" {skipped} could not move to {status} from their current status."
+        flash(message, "success" if changed else "warning")
+    return redirect(url_for('dashboard', status=request.form.get('status_filter') or None,
+                            customer=request.form.get('customer_filter', type=int)))
+
+@app.route('/admin/analytics')
+@login_required
+def analytics():
+    user = identity.current_user()
+    if not user or not user.is_admin:
+        abort(403)
+    try:
+        start, end = report_range(request.args)
+    except ValueError:
+        abort(400)
+    return render_template('analytics.html', **sales_report(start, end))
+
+@app.route('/admin/export/<any(orders, sales):kind>')
+@login_required
+def export(kind):
+    user = identity.current_user()
+    if not user or not user.is_admin:
+        abort(403)
+    try:
+        start, end = parse_date_range(request.args)
+        rows, fields = ((order_export_rows(start, end), ORDER_EXPORT_FIELDS) if kind == 'orders'
+                        else (sales_export_rows(start, end), SALES_EXPORT_FIELDS))
+        return export_response(rows, fields, kind, request.args.get('format', 'csv'),
+                               request.args.get('compress') or None)
+    except ValueError:
+        abort(400)
+
 @app.route('/services')
+@page_cache.anonymous
 def services():
     return render_template('services.html')
 
@@ -198,10 +314,7 @@ def remove_from_cart():
         return redirect(url_for('cart'))
 
     try:
-        item_to_remove = CartItem.query.filter_by(user_id=user_id, product_id=product_id).first()
-        if item_to_remove:
-            db.session.delete(item_to_remove)
-            db.session.commit()
+        if remove_item(user_id, product_id):
             flash("Item removed from your cart.", "info")
         else:
             flash("Item not found in your cart.", "warning")
@@ -216,18 +329,133 @@ def submit_rating(order_id):
     try:
         stars = int(request.form['stars'])
     except (ValueError, TypeError):
+        stars = None
+    if stars not in STAR_VALUES:
         flash("Invalid rating value.", "danger")
         return redirect(url_for('payment_success', order_id=order_id))
 
     user_id = session['user_id']
-    order = Order.query.get_or_404(order_id)
-
-    for item in order.order_items:
-        rating = Rating(user_id=user_id, product_id=item.product_id, order_id=order.id, stars=stars)
-        db.session.add(rating)
+    order = Order.query.filter_by(id=order_id, user_id=user_id).first_or_404()
 
+    product_ids = [item.product_id for item in order.order_items if item.product_id is not None]
+    save_ratings(user_id, order.id, product_ids, stars)
     db.session.commit()
     flash("Thanks for your rating!", "success")
     return redirect(url_for('dashboard'))
+
+@app.route(f'{API_PREFIX}/products')
+@api_login_required
+def api_products():
+    fields = parse_fields(request.args, PRODUCT_FIELDS)
+    products, next_cursor = products_page(request.args.get('category') or None,
+                                          request.args.get('cursor', type=int), page_limit(request.args))
+    return versioned_response(
+        [(product.id, product.version) for product in products],
+        lambda: {'products': [select_fields(product_record(product), fields) for product in products],
+                 'next_cursor': next_cursor})
+
+@app.route(f'{API_PREFIX}/products/<int:product_id>')
+@api_login_required
+def api_product(product_id):
+    fields = parse_fields(request.args, PRODUCT_FIELDS)
+    product = db.session.get(Product, product_id)
+    if product is None:
+        raise ApiError(404, "Product not found.")
+    return versioned_response([product.version], lambda: select_fields(product_record(product), fields))
+
+def cart_response(user_id):
+    fields = parse_fields(request.args, CART_ITEM_FIELDS)
+
+    def build():
+        items = cart_items(user_id)
+        summary = summarize(items)
+        return {'items': [select_fields(cart_item_record(item), fields) for item in items],
+                'item_count': summary.item_count, 'total': summary.total}
+    # the cart changes answer with the same body as GET, so they share its ETag
+    return versioned_response(cart_versions(user_id), build, key=f"cart?fields={','.join(fields)}")
+
+@app.route(f'{API_PREFIX}/cart')
+@api_login_required
+def api_cart():
+    return cart_response(session['user_id'])
+
+@app.route(f'{API_PREFIX}/cart/items', methods=['POST'])
+@api_login_required
+def api_add_cart_item():
+    # Adds to the cart like the form does and answers with the updated cart,
+    # so the page can redraw without a redirect and a second request.
+    data = request.get_json(silent=True) or {}
+    product_id, quantity = data.get('product_id'), data.get('quantity', 1)
+    if not isinstance(quantity, int) or quantity < 1:
+        raise ApiError(400, "Quantity must be a positive whole number.")
+    product = db.session.get(Product, int(product_id)) if str(product_id).isdigit() else None
+    if product is None:
+        raise ApiError(404, "Product not found.")
+    if not add_item(session['user_id'], product.id, quantity):
+        raise ApiError(409, "Could not add the item to your cart. Please try again.")
+    return cart_response(session['user_id'])
+
+@app.route(f'{API_PREFIX}/cart/items/<int:product_id>', methods=['DELETE'])
+@api_login_required
+def api_remove_cart_item(product_id):
+    if not remove_item(session['user_id'], product_id):
+        raise ApiError(404, "Item not found in your cart.")
+    return cart_response(session['user_id'])
+
+@app.route(f'{API_PREFIX}/orders')
+@api_login_required
+def api_orders():
+    fields = parse_fields(request.args, ORDER_FIELDS)
+    try:
+        orders, next_cursor = customer_orders_page(session['user_id'], request.args.get('cursor') or None,
+                                                   page_limit(request.args))
+    except ValueError:
+        raise ApiError(400, "Invalid cursor.")
+    return versioned_response(
+        [(order.id, order.version) for order in orders],
+        lambda: {'orders': [select_fields(order_record(order), fields) for order in orders],
+                 'next_cursor': next_cursor})
+
+@app.route(f'{API_PREFIX}/orders/<int:order_id>')
+@api_login_required
+def api_order(order_id):
+    # customers see their own orders, admins any order
+    fields = parse_fields(request.args, ORDER_DETAIL_FIELDS)
+    user = identity.current_user()
+    versions = order_versions(order_id, None if user and user.is_admin else session['user_id'])
+    if not versions:
+        raise ApiError(404, "Order not found.")
+    return versioned_response(versions, lambda: select_fields(order_detail(order_id), fields))
+
+@app.cli.command('revoke-sessions')
+@click.argument('email')
+def revoke_sessions_command(email):
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        print(f"No user with email {email}.")
+        return
+    count = app.session_interface.revoke_user(user.id)
+    print(f"Revoked {count} sessions for {email}.")
+
+@app.cli.command('seed-products')
+def seed_products_command():
+    count = seed_products()
+    print(f"Added {count} catalog products.")
+
+@app.cli.command('rebuild-rating-summaries')
+def rebuild_rating_summaries_command():
+    count = rebuild_rating_summaries()
+    print(f"Rebuilt rating summaries for {count} products.")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    count = rebuild_search_index()
+    print(f"Rebuilt the search index for {count} products.")
+
+@app.cli.command('rebuild-sales-rollups')
+def rebuild_sales_rollups_command():
+    count = rebuild_sales_rollups()
+    print(f"Rebuilt sales rollups for {count} days.")
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,25 @@
+# ASGI entry points for the two storefronts:
+#
+#     uvicorn --factory asgi:sql_app --workers 2
+#     uvicorn --factory asgi:dynamo_app --workers 2
+#
+# The apps stay WSGI. a2wsgi runs them on a bounded pool of ASGI_THREADS
+# threads per worker (asgiref's WsgiToAsgi would push every request through
+# one thread), while the event loop keeps slow clients and idle keep-alive
+# connections off those threads. Async views such as /dashboard gather their
+# independent reads inside the request as they do under gunicorn.
+import os
+
+from a2wsgi import WSGIMiddleware
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+
+
+def sql_app():
+    from app import app
+    return WSGIMiddleware(app, workers=ASGI_THREADS)
+
+
+def dynamo_app():
+    from awsapp import app
+    return WSGIMiddleware(app, workers=ASGI_THREADS)
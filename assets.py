@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import request, send_file, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Versioned static URLs never change content, so browsers may keep them a year.
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class StaticAssets:
+    # Fingerprints every file under the static folder at startup: url_for('static')
+    # adds ?v=<content hash>, and requests carrying the current hash are served
+    # with a far-future immutable Cache-Control. Text assets are also compressed
+    # once per content hash into instance/static-compressed (gzip, and brotli
+    # when the brotli package is installed) and served pre-compressed to
+    # clients that accept it.
+
+    def __init__(self, app):
+        self.folder = app.static_folder
+        self.compressed_folder = os.path.join(app.instance_path, 'static-compressed')
+        self.versions = {}
+        self.compressed = {}
+        self._build()
+        app.url_defaults(self._add_version)
+        app.view_functions['static'] = self.send
+
+    def _build(self):
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                version = hashlib.sha256(data).hexdigest()[:12]
+                self.versions[filename] = version
+                mimetype = mimetypes.guess_type(filename)[0] or ''
+                if mimetype.startswith(COMPRESSIBLE_TYPES):
+                    self._compress(filename, version, data)
+
+    def _compress(self, filename, version, data):
+        encoders = [('gzip', 'gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            encoders.insert(0, ('br', 'br', lambda d: brotli.compress(d, quality=11)))
+        os.makedirs(self.compressed_folder, exist_ok=True)
+        for encoding, extension, compress in encoders:
+            path = os.path.join(self.compressed_folder,
+                                f"{version}-{filename.replace('/', '_')}.{extension}")
+            if not os.path.exists(path):
+                encoded = compress(data)
+                if len(encoded) >= len(data):
+                    continue
+                # workers may start together; the rename makes the file appear whole
+                temporary = f'{path}.{os.getpid()}.tmp'
+                with open(temporary, 'wb') as f:
+                    f.write(encoded)
+                os.replace(temporary, path)
+            self.compressed[filename, encoding] = path
+
+    def _add_version(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.versions:
+            values.setdefault('v', self.versions[values['filename']])
+
+    def send(self, filename):
+        versioned = filename in self.versions and request.args.get('v') == self.versions[filename]
+        max_age = STATIC_MAX_AGE if versioned else None
+        encoding = next((e for e in ('br', 'gzip')
+                         if (filename, e) in self.compressed and request.accept_encodings[e]), None)
+        if encoding:
+            # named and typed after the original, not the .gz/.br file on disk
+            response = send_file(self.compressed[filename, encoding], max_age=max_age,
+                                 mimetype=mimetypes.guess_type(filename)[0],
+                                 download_name=os.path.basename(filename))
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(self.folder, filename, max_age=max_age)
+        if any(key[0] == filename for key in self.compressed):
+            response.vary.add('Accept-Encoding')
+        if versioned:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
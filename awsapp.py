@@ -1,11 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, stream_template, request, redirect, url_for, session, flash, get_flashed_messages, Response, abort, jsonify
 import boto3
+import click
 from datetime import datetime
 import uuid
-from functools import wraps
+import os
+from functools import partial
 from decimal import Decimal
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+from concurrency import PerThread, gather_reads
+from dynamo_query import ENTITY_INDEX, PAGE_SIZE, EntityPage, entity_keys, entity_range
+from api import (API_PREFIX, CART_ITEM_FIELDS, ORDER_DETAIL_FIELDS, ORDER_FIELDS, PRODUCT_FIELDS, ApiError,
+                 api_login_required, page_limit, parse_fields, register_api, select_fields,
+                 versioned_response)
+from exports import ORDER_EXPORT_FIELDS, SALES_EXPORT_FIELDS, export_response, parse_date_range, report_range
+from search import MAX_RESULTS, SEARCH_PAGE_SIZE, CachedSearch, InvertedIndex
+from dynamo_sessions import SESSION_TTL_ATTRIBUTE, DynamoSessionStore
+from sessions import ServerSessionInterface
+from dynamo_sales import rebuild_sales_rollups, record_order_sales, sales_report
+from identity import CurrentUser, Identity
+from instrumentation import Instrumentation
+from assets import StaticAssets
+from pages import PageCache, enable_template_bytecode_cache
+from passwords import PasswordHasher, PasswordHasherBusy
+from ratelimit import LoginThrottle, trust_proxies
+from outbox import Outbox, OutboxDispatcher, SnsPublisher, outbox_metrics
+from dynamo_cache import CachedTable, cache_backend_from_env, cache_metrics
+from dynamo_batch import MAX_TRANSACTION_ITEMS, batch_get, batch_write, transact_write, is_transaction_conflict
 
 AWS_REGION = 'us-east-1'
 USERS_TABLE_NAME = 'Users'
@@ -14,30 +35,119 @@ SNS_TOPIC_ARN = "arn:aws:sns:us-east-1:418272775181:PickleOrderUpdates"
 
 app = Flask(__name__)
 app.secret_key = 'your_super_secret_key_here'
+trust_proxies(app)
 
 dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-users_table = dynamodb.Table(USERS_TABLE_NAME)
-appdata_table = dynamodb.Table(APPDATA_TABLE_NAME)
-sns = boto3.client('sns', region_name=AWS_REGION)
 
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
+def dynamodb_table(name):
+    # boto3 resources are not thread-safe, so each thread (gthread and ASGI
+    # request threads, the gather_reads pool, the outbox dispatcher) gets its
+    # own Table. They share dynamodb's low-level client, which is thread-safe
+    # and carries the instrumentation hooks.
+    return PerThread(lambda: type(dynamodb)(client=dynamodb.meta.client).Table(name))
+
+# get_item reads go through a read-through cache (DYNAMO_CACHE=local|redis|off)
+item_cache = cache_backend_from_env()
+users_table = CachedTable(dynamodb_table(USERS_TABLE_NAME), ('email',), item_cache)
+appdata_table = CachedTable(dynamodb_table(APPDATA_TABLE_NAME), ('PK', 'SK'), item_cache)
+sns = boto3.client('sns', region_name=AWS_REGION)
+app.session_interface = ServerSessionInterface(DynamoSessionStore(appdata_table))
+
+instrumentation = Instrumentation(app)
+enable_template_bytecode_cache(app)
+static_assets = StaticAssets(app)
+page_cache = PageCache()
+instrumentation.watch_client(dynamodb.meta.client)
+instrumentation.watch_client(sns)
+instrumentation.add_collector(lambda: cache_metrics(users_table, appdata_table))
+
+# Product search runs on an in-process index of the PRODUCT entities, reloaded
+# in the background every few minutes and after this process adds a product.
+product_search = CachedSearch(InvertedIndex(lambda: entity_range(appdata_table, 'PRODUCT')))
+register_api(app)
+
+# Order notifications go through an outbox drained by a dispatcher: either
+# 'flask --app awsapp dispatch-outbox' as its own process, or a thread in each
+# web worker when OUTBOX_DISPATCHER=thread. Dispatchers claim records before
+# publishing them, so running several does not send a notification twice.
+order_outbox = Outbox(appdata_table)
+outbox_dispatcher = OutboxDispatcher(order_outbox, SnsPublisher(sns))
+if os.environ.get('OUTBOX_DISPATCHER') == 'thread':
+    outbox_dispatcher.start()
+    instrumentation.add_collector(lambda: outbox_metrics(outbox_dispatcher))
+
+def stream_page(template_name, **context):
+    # Flashed messages are popped before the body starts streaming, while the
+    # session cookie can still be updated.
+    get_flashed_messages()
+    return Response(stream_template(template_name, **context))
+
+def user_order_item(order):
+    # Summary copy of an order in the customer's own partition, sorted by time,
+    # so order history is one Query however large the table grows.
+    return {
+        'PK': f"USER#{order['user_id']}",
+        'SK': f"ORDER#{order['timestamp']}#{order['order_id']}",
+        'order_id': order['order_id'],
+        'status': order.get('status', 'Placed'),
+        'total': order['total'],
+        'timestamp': order['timestamp'],
+        'version': order.get('version', 1)
+    }
+
+def user_orders_page(user_id, cursor=None, limit=PAGE_SIZE):
+    return EntityPage(appdata_table, f'USER#{user_id}', limit=limit, cursor=cursor, sort_prefix='ORDER#',
+                      newest_first=True, index_name=None, partition_key='PK', sort_key='SK')
+
+def product_sort_key(category, name):
+    return f"{category or ''}#{name}"
+
+def customer_profile_item(user):
+    # The customer's row on the admin dashboard, listed by sign-up time through
+    # GSI1. Users live in their own table, so this copy is what the 'USER'
+    # entity page reads; admins get none and stay out of the customer list.
+    sort_key = f"PROFILE#{user.get('registered_at', '')}#{user['user_id']}"
+    return {
+        'PK': f"USER#{user['user_id']}",
+        'SK': sort_key,
+        **entity_keys('USER', sort_key),
+        'user_id': user['user_id'],
+        'username': user['username'],
+        'email': user['email']
+    }
+
+def current_user_snapshot(user):
+    return CurrentUser(id=user['user_id'], username=user['username'], email=user['email'],
+                       is_admin=(user.get('role') == 'admin'))
+
+def load_user(user_id):
+    # Users are keyed by email; the id check guards against a reused address.
+    email = session.get('email')
+    if not email:
+        return None
+    user = users_table.get_item(Key={'email': email}).get('Item')
+    if not user or user['user_id'] != user_id:
+        return None
+    return current_user_snapshot(user)
+
+identity = Identity(load_user)
+login_required = identity.login_required
+passwords = PasswordHasher()
+login_throttle = LoginThrottle()
 
 @app.route('/')
+@page_cache.anonymous
 def home():
     return render_template('index.html')
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
+        if not login_throttle.allow(request.remote_addr):
+            flash("Too many attempts. Please wait a minute and try again.", "error")
+            return render_template('register.html'), 429
         username = request.form['username']
         email = request.form['email']
-        password = generate_password_hash(request.form['password'])
         role = request.form['role']
         user_id = str(uuid.uuid4())
 
@@ -46,13 +156,23 @@ def register():
             flash("Email already registered.", "error")
             return redirect(url_for('register'))
 
-        users_table.put_item(Item={
+        try:
+            password = passwords.hash(request.form['password'])
+        except PasswordHasherBusy:
+            flash("The server is busy. Please try again.", "error")
+            return render_template('register.html'), 503
+
+        user = {
             'user_id': user_id,
             'username': username,
             'email': email,
             'password': password,
-            'role': role
-        })
+            'role': role,
+            'registered_at': datetime.utcnow().isoformat()
+        }
+        users_table.put_item(Item=user)
+        if role != 'admin':
+            appdata_table.put_item(Item=customer_profile_item(user))
 
         flash("Registration successful!", "success")
         return redirect(url_for('login'))
@@ -63,6 +183,9 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
+        if not login_throttle.allow(request.remote_addr, email):
+            flash("Too many login attempts. Please wait a minute and try again.", "error")
+            return render_template('login.html'), 429
 
         try:
             response = users_table.get_item(Key={'email': email})
@@ -73,11 +196,33 @@ def login():
 
         user = response.get('Item')
 
-        if user and check_password_hash(user['password'], password):
+        try:
+            valid = user is not None and passwords.verify(user['password'], password)
+        except PasswordHasherBusy:
+            flash("The server is busy. Please try again.", "error")
+            return render_template('login.html'), 503
+        try:
+            if valid and passwords.needs_rehash(user['password']):
+                users_table.update_item(
+                    Key={'email': user['email']},
+                    UpdateExpression='SET password = :new',
+                    ConditionExpression='password = :old',
+                    ExpressionAttributeValues={':new': passwords.hash(password), ':old': user['password']}
+                )
+        except PasswordHasherBusy:
+            # the password checked out; upgrade the hash on a quieter login
+            pass
+        except ClientError as e:
+            # a concurrent login already upgraded the hash
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+        if valid:
             session['user_id'] = user['user_id']
             session['username'] = user['username']
             session['is_admin'] = (user.get('role') == 'admin')
             session['email'] = user['email']
+            identity.remember(current_user_snapshot(user))
             flash("Login successful.", "success")
             return redirect(url_for('dashboard'))
         else:
@@ -95,56 +240,67 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
-def dashboard():
-    user = get_current_user()
+async def dashboard():
+    user = identity.current_user()
     if not user:
+        session.clear()
         return redirect(url_for('login'))
-    username = user['username']
-    is_admin = user['is_admin']
-    if is_admin:
-        all_items = appdata_table.scan()['Items']
-        users = [item for item in all_items if item.get('SK', '').startswith('PROFILE#') and not item.get('is_admin')]
-        products = [item for item in all_items if item.get('PK', '').startswith('PRODUCT#') and item.get('SK') == 'DETAILS']
-        orders = [item for item in all_items if item.get('SK') == 'DETAILS' and item.get('PK', '').startswith('ORDER#')]
-        feedbacks = [item for item in all_items if item.get('PK', '').startswith('FEEDBACK#')]
-        product_ratings = {}
-        for product in products:
-            product_id = product['PK'].split('#')[1]
-            rating_response = appdata_table.query(
-                KeyConditionExpression=Key('PK').eq(f'RATING#{product_id}')
-            )
-            rating_items = rating_response.get('Items', [])
-
-            if rating_items:
-                total_rating = sum(item.get('rating', 0) for item in rating_items)
-                avg_rating = round(total_rating / len(rating_items), 1)
-            else:
-                avg_rating = 0.0  
-
-            product_ratings[product_id] = avg_rating
-        return render_template(
+    if user.is_admin:
+        # One bounded GSI1 page per entity type, so read units follow the
+        # rows shown rather than the size of the table. The pages are
+        # independent, so they are queried concurrently.
+        try:
+            customers = EntityPage(appdata_table, 'USER', cursor=request.args.get('customers_after'))
+            orders = EntityPage(appdata_table, 'ORDER', cursor=request.args.get('orders_after'),
+                                newest_first=True)
+            products = EntityPage(appdata_table, 'PRODUCT', cursor=request.args.get('products_after'))
+        except ValueError:
+            abort(400)
+        customer_list, order_list, product_list = await gather_reads(
+            partial(list, customers), partial(list, orders), partial(list, products))
+        return stream_page(
             'admin_dashboard.html',
-            users=users,
-            products=products,
-            orders=orders,
-            feedbacks=feedbacks,
-            product_ratings=product_ratings
+            customers=[dashboard_customer(item) for item in customer_list],
+            next_customers=customers.next_cursor,
+            products=[dashboard_product(item) for item in product_list],
+            next_products=products.next_cursor,
+            orders=[dashboard_order(item) for item in order_list],
+            next_orders=orders.next_cursor
         )
     else:
-        orders = appdata_table.query(
-            KeyConditionExpression=Key('PK').eq(f'ORDER#{username}')
-        )['Items']
-        return render_template('customer_dashboard.html', user=user, orders=orders)
+        try:
+            orders = user_orders_page(session['user_id'], cursor=request.args.get('orders_after'))
+        except ValueError:
+            abort(400)
+        return stream_page('customer_dashboard.html', user=user, orders=orders)
 
 
 @app.route('/products')
 @login_required
 def products():
-    response = appdata_table.scan(
-        FilterExpression=Key('PK').begins_with('PRODUCT#')
-    )
-    items = response.get('Items', [])
-    return render_template('products.html', products=items)
+    query = request.args.get('q', '').strip()
+    if query:
+        ids = [result['id'] for result in product_search.search(query, SEARCH_PAGE_SIZE)]
+        found = batch_get(appdata_table, [{'PK': f'PRODUCT#{id}', 'SK': 'DETAILS'} for id in ids])
+        items = [found[f'PRODUCT#{id}', 'DETAILS'] for id in ids if (f'PRODUCT#{id}', 'DETAILS') in found]
+        return stream_page('products.html', products=items, category=None, query=query)
+    category = request.args.get('category')
+    try:
+        items = EntityPage(appdata_table, 'PRODUCT', cursor=request.args.get('cursor'),
+                           sort_prefix=f'{category}#' if category else None)
+    except ValueError:
+        abort(400)
+    return stream_page('products.html', products=items, category=category)
+
+@app.route('/api/products/search')
+@login_required
+def search_products():
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', MAX_RESULTS, type=int), 1), SEARCH_PAGE_SIZE)
+    response = jsonify(query=query, results=product_search.search(query, limit))
+    response.cache_control.private = True
+    response.cache_control.max_age = 30
+    return response
 
 @app.route('/add-product', methods=['POST'])
 @login_required
@@ -163,6 +319,7 @@ def add_product():
     appdata_table.put_item(Item={
     'PK': f'PRODUCT#{product_id}',
     'SK': 'DETAILS',
+    **entity_keys('PRODUCT', product_sort_key(category, name)),
     'product_id': product_id,
     'name': name,
     'price': Decimal(str(price)),
@@ -170,9 +327,11 @@ def add_product():
     'category': category,
     'quantity': quantity,
     'created_by': user_id,
-    'created_at': datetime.datetime.now().isoformat()
+    'created_at': datetime.now().isoformat(),
+    'version': 1
 })
 
+    product_search.clear()
     flash("Product added!", "success")
     return redirect(url_for('products'))
 
@@ -181,30 +340,42 @@ def add_product():
 def add_to_cart():
     user_id = session['user_id']
     product_id = request.form['product_id']
-    name = request.form['name']
-    price = float(request.form['price'])
     quantity = int(request.form.get('quantity', 1))
 
-    appdata_table.put_item(Item={
-        'PK': f'CART#{user_id}',
-        'SK': f'PRODUCT#{product_id}',
-        'product_id': product_id,
-        'name': name,
-        'price': Decimal(str(price)),
-        'quantity': quantity
-    })
+    product = appdata_table.get_item(
+        Key={'PK': f'PRODUCT#{product_id}', 'SK': 'DETAILS'}
+    ).get('Item')
+    if not product:
+        flash("Product not found.", "error")
+        return redirect(url_for('products'))
 
+    put_cart_item(user_id, product, quantity)
     flash("Added to cart!", "success")
     return redirect(url_for('products'))
 
-@app.route('/cart')
-@login_required
-def cart():
-    user_id = session['user_id']
+def put_cart_item(user_id, product, quantity):
+    # An update rather than a put, so the line's version keeps counting up
+    # when the same product is added again.
+    appdata_table.update_item(
+        Key={'PK': f'CART#{user_id}', 'SK': f"PRODUCT#{product['product_id']}"},
+        UpdateExpression='SET product_id = :product_id, #name = :name, category = :category, '
+                         'price = :price, quantity = :quantity ADD version :one',
+        ExpressionAttributeNames={'#name': 'name'},
+        ExpressionAttributeValues={':product_id': product['product_id'], ':name': product['name'],
+                                   ':category': product.get('category'), ':price': product['price'],
+                                   ':quantity': quantity, ':one': 1}
+    )
+
+def user_cart_items(user_id):
     response = appdata_table.query(
         KeyConditionExpression=Key('PK').eq(f'CART#{user_id}')
     )
-    items = response.get('Items', [])
+    return response.get('Items', [])
+
+@app.route('/cart')
+@login_required
+def cart():
+    items = user_cart_items(session['user_id'])
     total = sum(item['price'] * item['quantity'] for item in items)
     return render_template('cart.html', cart=items, total_price=total)
 
@@ -216,10 +387,7 @@ def checkout():
     order_id = str(uuid.uuid4())
     timestamp = datetime.utcnow().isoformat()
 
-    response = appdata_table.query(
-        KeyConditionExpression=Key('PK').eq(f'CART#{user_id}')
-    )
-    cart_items = response.get('Items', [])
+    cart_items = user_cart_items(user_id)
 
     if not cart_items:
         flash("Cart is empty.", "error")
@@ -227,31 +395,47 @@ def checkout():
 
     total = sum(item['price'] * item['quantity'] for item in cart_items)
 
-    appdata_table.put_item(Item={
+    order = {
         'PK': f'ORDER#{order_id}',
         'SK': 'DETAILS',
+        **entity_keys('ORDER', f'{timestamp}#{order_id}'),
         'order_id': order_id,
         'user_id': user_id,
         'address': address,
         'items': cart_items,
+        'status': 'Placed',
         'total': Decimal(str(total)),
-        'timestamp': timestamp
-    })
-
+        'timestamp': timestamp,
+        'version': 1
+    }
     message = f"Order #{order_id} placed by {session.get('email')}. Total: ₹{total}"
+    notification = order_outbox.record(SNS_TOPIC_ARN, "New Pickle Order Notification", message)
+    cart_keys = [{'PK': f'CART#{user_id}', 'SK': f"PRODUCT#{item['product_id']}"} for item in cart_items]
+    # The order, its notification and the cart clear commit together. The delete
+    # conditions make a double-submitted checkout fail instead of placing the
+    # same cart twice. Carts too big for one transaction have the remainder
+    # cleared in batches.
+    actions = [{'Put': {'Item': order, 'ConditionExpression': 'attribute_not_exists(PK)'}},
+               {'Put': {'Item': user_order_item(order)}},
+               {'Put': {'Item': notification}}]
+    in_transaction = MAX_TRANSACTION_ITEMS - len(actions)
+    actions += [{'Delete': {'Key': key, 'ConditionExpression': 'attribute_exists(PK)'}}
+                for key in cart_keys[:in_transaction]]
     try:
-        sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Message=message,
-            Subject="New Pickle Order Notification"
-        )
-    except Exception as e:
-        print("SNS publish failed:", str(e))
+        transact_write(appdata_table, actions)
+    except ClientError as e:
+        if not is_transaction_conflict(e):
+            raise
+        flash("Your cart changed while checking out. Please try again.", "error")
+        return redirect(url_for('cart'))
+    appdata_table.invalidate({'PK': order['PK'], 'SK': order['SK']})
 
-    for item in cart_items:
-        appdata_table.delete_item(
-            Key={'PK': f'CART#{user_id}', 'SK': f"PRODUCT#{item['product_id']}"}
-        )
+    batch_write(appdata_table, deletes=cart_keys[in_transaction:])
+    try:
+        record_order_sales(appdata_table, order)
+    except ClientError:
+        # the order stands; rebuild-sales-rollups recounts from the orders
+        app.logger.exception("Could not record sales for order %s", order_id)
 
     flash("Order placed successfully!", "success")
     return redirect(url_for('payment_success', order_id=order_id))
@@ -289,33 +473,415 @@ def remove_from_cart(product_id):
     return redirect(url_for('cart'))
 
 
+def dashboard_customer(user):
+    # the admin dashboard reads the same fields from both apps' rows
+    return {'id': user['user_id'], 'username': user.get('username'), 'email': user.get('email')}
+
+def dashboard_product(product):
+    return {'name': product.get('name'), 'category': product.get('category'),
+            'stock': product.get('quantity'), 'avg_rating': rating_average(product)}
+
+def dashboard_order(order):
+    # ratings are kept per product here, not per order
+    return {'id': order['order_id'], 'customer': order.get('user_id'), 'status': order.get('status', 'Placed'),
+            'total': order.get('total'), 'rating': None}
+
+def rating_average(product):
+    count = product.get('rating_count', 0)
+    if not count:
+        return 0.0
+    return round(product.get('rating_sum', 0) / count, 1)
+
+def rating_summary_update(product_id, rating, old_rating=None):
+    # Keeps rating_count/rating_sum/stars_N on the product's DETAILS item in step
+    # with the RATING# items, so reading an average never touches the ratings.
+    if old_rating == rating:
+        return None
+    names = {'#new': f'stars_{rating}'}
+    values = {':one': 1}
+    if old_rating is None:
+        values[':rating'] = rating
+        update = 'ADD rating_count :one, rating_sum :rating, #new :one, version :one'
+    else:
+        names['#old'] = f'stars_{old_rating}'
+        values[':delta'] = rating - old_rating
+        values[':minus_one'] = -1
+        update = 'ADD rating_sum :delta, #new :one, #old :minus_one, version :one'
+    return {
+        'Key': {'PK': f'PRODUCT#{product_id}', 'SK': 'DETAILS'},
+        'UpdateExpression': update,
+        'ConditionExpression': 'attribute_exists(PK)',
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }
+
+@app.cli.command('rebuild-rating-summaries')
+def rebuild_rating_summaries_command():
+    summaries = {}
+    scan_kwargs = {
+        'FilterExpression': Attr('PK').begins_with('RATING#') |
+                            (Attr('PK').begins_with('PRODUCT#') & Attr('SK').eq('DETAILS'))
+    }
+    while True:
+        response = appdata_table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            product_id = item['PK'].split('#', 1)[1]
+            summary = summaries.setdefault(product_id, {'rating_count': 0, 'rating_sum': 0, 'stars': [0] * 5})
+            if item['PK'].startswith('RATING#') and 1 <= item.get('rating', 0) <= 5:
+                summary['rating_count'] += 1
+                summary['rating_sum'] += item['rating']
+                summary['stars'][int(item['rating']) - 1] += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    rebuilt = 0
+    for product_id, summary in summaries.items():
+        values = {':count': summary['rating_count'], ':sum': summary['rating_sum'], ':one': 1}
+        for stars, count in enumerate(summary['stars'], start=1):
+            values[f':stars_{stars}'] = count
+        try:
+            appdata_table.update_item(
+                Key={'PK': f'PRODUCT#{product_id}', 'SK': 'DETAILS'},
+                UpdateExpression='SET rating_count = :count, rating_sum = :sum, ' +
+                                 ', '.join(f'stars_{n} = :stars_{n}' for n in range(1, 6)) +
+                                 ' ADD version :one',
+                ConditionExpression='attribute_exists(PK)',
+                ExpressionAttributeValues=values
+            )
+            rebuilt += 1
+        except appdata_table.meta.client.exceptions.ConditionalCheckFailedException:
+            continue
+    print(f"Rebuilt rating summaries for {rebuilt} products.")
+
+def entity_keys_for(item):
+    pk, sk = item['PK'], item['SK']
+    if pk.startswith('PRODUCT#') and sk == 'DETAILS':
+        return entity_keys('PRODUCT', product_sort_key(item.get('category'), item.get('name', '')))
+    if pk.startswith('ORDER#') and sk == 'DETAILS':
+        return entity_keys('ORDER', f"{item.get('timestamp', '')}#{pk.split('#', 1)[1]}")
+    if sk.startswith('PROFILE#'):
+        return entity_keys('USER', sk)
+    if pk.startswith('FEEDBACK#'):
+        return entity_keys('FEEDBACK', f"{item.get('timestamp', '')}#{pk}")
+    return None
+
+@app.cli.command('create-entity-index')
+def create_entity_index_command():
+    appdata_table.meta.client.update_table(
+        TableName=appdata_table.name,
+        AttributeDefinitions=[
+            {'AttributeName': 'GSI1PK', 'AttributeType': 'S'},
+            {'AttributeName': 'GSI1SK', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexUpdates=[{'Create': {
+            'IndexName': ENTITY_INDEX,
+            'KeySchema': [
+                {'AttributeName': 'GSI1PK', 'KeyType': 'HASH'},
+                {'AttributeName': 'GSI1SK', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }}]
+    )
+    print(f"Creating {ENTITY_INDEX} on {appdata_table.name}; run backfill-entity-index once it is active.")
+
+@app.cli.command('backfill-entity-index')
+def backfill_entity_index_command():
+    scan_kwargs = {'FilterExpression': Attr('GSI1PK').not_exists()}
+    backfilled = 0
+    while True:
+        response = appdata_table.scan(**scan_kwargs)
+        updated = []
+        for item in response.get('Items', []):
+            keys = entity_keys_for(item)
+            if keys:
+                updated.append(dict(item, **keys))
+        batch_write(appdata_table, puts=updated)
+        backfilled += len(updated)
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"Backfilled {ENTITY_INDEX} keys on {backfilled} items.")
+
+@app.cli.command('backfill-user-orders')
+def backfill_user_orders_command():
+    scan_kwargs = {'FilterExpression': Attr('PK').begins_with('ORDER#') & Attr('SK').eq('DETAILS')}
+    backfilled = 0
+    while True:
+        response = appdata_table.scan(**scan_kwargs)
+        user_orders = [user_order_item(order) for order in response.get('Items', [])
+                       if order.get('user_id') and order.get('timestamp')]
+        batch_write(appdata_table, puts=user_orders)
+        backfilled += len(user_orders)
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"Backfilled {backfilled} customer order index items.")
+
+@app.cli.command('backfill-customer-profiles')
+def backfill_customer_profiles_command():
+    scan_kwargs = {}
+    backfilled = 0
+    while True:
+        response = users_table.scan(**scan_kwargs)
+        profiles = [customer_profile_item(user) for user in response.get('Items', [])
+                    if user.get('role') != 'admin']
+        batch_write(appdata_table, puts=profiles)
+        backfilled += len(profiles)
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"Backfilled {backfilled} customer profiles.")
+
+@app.cli.command('enable-session-expiry')
+def enable_session_expiry_command():
+    # DynamoDB deletes expired sessions itself once TTL is on
+    appdata_table.meta.client.update_time_to_live(
+        TableName=appdata_table.name,
+        TimeToLiveSpecification={'Enabled': True, 'AttributeName': SESSION_TTL_ATTRIBUTE}
+    )
+    print(f"Enabled TTL on {appdata_table.name}.{SESSION_TTL_ATTRIBUTE}.")
+
+@app.cli.command('revoke-sessions')
+@click.argument('email')
+def revoke_sessions_command(email):
+    user = users_table.get_item(Key={'email': email}).get('Item')
+    if not user:
+        print(f"No user with email {email}.")
+        return
+    count = app.session_interface.revoke_user(user['user_id'])
+    print(f"Revoked {count} sessions for {email}.")
+
+@app.cli.command('rebuild-sales-rollups')
+def rebuild_sales_rollups_command():
+    count = rebuild_sales_rollups(appdata_table)
+    print(f"Rebuilt sales rollups for {count} days.")
+
+@app.cli.command('dispatch-outbox')
+def dispatch_outbox_command():
+    print("Dispatching order notifications; Ctrl+C to stop.")
+    try:
+        outbox_dispatcher.run()
+    except KeyboardInterrupt:
+        pass
+    print("Outbox metrics:", dict(outbox_dispatcher.metrics))
+
 @app.route('/submit-rating/<order_id>', methods=['POST'])
 @login_required
 def submit_rating(order_id):
-    rating = int(request.form['rating'])
+    try:
+        rating = int(request.form['rating'])
+    except (KeyError, ValueError):
+        rating = None
+    if rating not in range(1, 6):
+        flash("Invalid rating value.", "danger")
+        return redirect(url_for('payment_success', order_id=order_id))
     user_id = session['user_id']
     response = appdata_table.get_item(Key={
         'PK': f'ORDER#{order_id}',
         'SK': 'DETAILS'
     })
     order = response.get('Item')
-    if not order:
+    if not order or order.get('user_id') != user_id:
         flash("Order not found", "danger")
         return redirect(url_for('dashboard'))
-    for item in order.get('items', []):
-        product_id = item['product_id']
-        appdata_table.put_item(Item={
-            'PK': f'RATING#{product_id}',
-            'SK': f'USER#{user_id}',
-            'product_id': product_id,
-            'user_id': user_id,
-            'rating': rating,
-            'timestamp': datetime.now().isoformat()
-        })
+    product_ids = list(dict.fromkeys(item['product_id'] for item in order.get('items', [])))
+    rating_keys = {product_id: {'PK': f'RATING#{product_id}', 'SK': f'USER#{user_id}'}
+                   for product_id in product_ids}
+    product_keys = [{'PK': f'PRODUCT#{product_id}', 'SK': 'DETAILS'} for product_id in product_ids]
+    existing = batch_get(appdata_table, list(rating_keys.values()) + product_keys)
+
+    # Each rating is written together with its product summary adjustment.
+    # The put is conditioned on the rating read above, so a concurrent
+    # re-rating cancels the transaction instead of skewing the summary.
+    timestamp = datetime.now().isoformat()
+    transactions = [[]]
+    for product_id in product_ids:
+        previous = existing.get((f'RATING#{product_id}', f'USER#{user_id}'))
+        put = {'Item': dict(rating_keys[product_id], product_id=product_id, user_id=user_id,
+                            rating=rating, timestamp=timestamp)}
+        if previous:
+            put['ConditionExpression'] = 'rating = :previous'
+            put['ExpressionAttributeValues'] = {':previous': previous['rating']}
+        else:
+            put['ConditionExpression'] = 'attribute_not_exists(PK)'
+        actions = [{'Put': put}]
+        update = rating_summary_update(product_id, rating, previous['rating'] if previous else None)
+        if update and (f'PRODUCT#{product_id}', 'DETAILS') in existing:
+            actions.append({'Update': update})
+        if len(transactions[-1]) + len(actions) > MAX_TRANSACTION_ITEMS:
+            transactions.append([])
+        transactions[-1].extend(actions)
+
+    try:
+        for actions in transactions:
+            if actions:
+                transact_write(appdata_table, actions)
+    except ClientError as e:
+        if not is_transaction_conflict(e):
+            raise
+        flash("Your rating could not be saved. Please try again.", "danger")
+        return redirect(url_for('dashboard'))
+    finally:
+        # the summary updates changed the cached product items
+        appdata_table.invalidate(*product_keys)
     flash("Thank you for your rating!", "success")
     return redirect(url_for('dashboard'))
 
+def exported_orders(start, end):
+    return entity_range(appdata_table, 'ORDER', start.isoformat() if start else None,
+                        end.isoformat() if end else None)
+
+def sales_export_rows(start, end):
+    for order in exported_orders(start, end):
+        for item in order.get('items', []):
+            yield {'order_id': order['order_id'], 'timestamp': order['timestamp'],
+                   'status': order.get('status'), 'product_id': item.get('product_id'),
+                   'name': item.get('name'), 'category': item.get('category'),
+                   'quantity': item.get('quantity'), 'price': item.get('price'),
+                   'line_total': item.get('price', 0) * item.get('quantity', 0)}
+
+@app.route('/admin/analytics')
+@login_required
+def analytics():
+    if not session.get('is_admin'):
+        return redirect(url_for('dashboard'))
+    try:
+        start, end = report_range(request.args)
+    except ValueError:
+        abort(400)
+    return render_template('analytics.html', **sales_report(appdata_table, start, end))
+
+@app.route('/admin/export/<any(orders, sales):kind>')
+@login_required
+def export(kind):
+    if not session.get('is_admin'):
+        return redirect(url_for('dashboard'))
+    try:
+        start, end = parse_date_range(request.args)
+        rows, fields = ((exported_orders(start, end), ORDER_EXPORT_FIELDS) if kind == 'orders'
+                        else (sales_export_rows(start, end), SALES_EXPORT_FIELDS))
+        return export_response(rows, fields, kind, request.args.get('format', 'csv'),
+                               request.args.get('compress') or None)
+    except ValueError:
+        abort(400)
+
+def product_record(item):
+    # the product's stock is kept in its quantity attribute
+    return {'id': item['product_id'], 'name': item.get('name'), 'description': item.get('description'),
+            'price': item.get('price'), 'category': item.get('category'), 'stock': item.get('quantity')}
+
+def cart_item_record(item):
+    return {'product_id': item['product_id'], 'name': item.get('name'), 'category': item.get('category'),
+            'price': item['price'], 'quantity': item['quantity'], 'line_total': item['price'] * item['quantity']}
+
+def order_record(order):
+    return {'id': order['order_id'], 'status': order.get('status', 'Placed'), 'total': order.get('total'),
+            'timestamp': order.get('timestamp')}
+
+@app.route(f'{API_PREFIX}/products')
+@api_login_required
+def api_products():
+    fields = parse_fields(request.args, PRODUCT_FIELDS)
+    category = request.args.get('category')
+    try:
+        page = EntityPage(appdata_table, 'PRODUCT', limit=page_limit(request.args), cursor=request.args.get('cursor'),
+                          sort_prefix=f'{category}#' if category else None)
+        items = list(page)
+    except ValueError:
+        raise ApiError(400, "Invalid cursor.")
+    return versioned_response(
+        [(item['product_id'], item.get('version', 0)) for item in items],
+        lambda: {'products': [select_fields(product_record(item), fields) for item in items],
+                 'next_cursor': page.next_cursor})
+
+@app.route(f'{API_PREFIX}/products/<string:product_id>')
+@api_login_required
+def api_product(product_id):
+    fields = parse_fields(request.args, PRODUCT_FIELDS)
+    item = appdata_table.get_item(Key={'PK': f'PRODUCT#{product_id}', 'SK': 'DETAILS'}).get('Item')
+    if not item:
+        raise ApiError(404, "Product not found.")
+    return versioned_response([item.get('version', 0)], lambda: select_fields(product_record(item), fields))
+
+def cart_response(user_id):
+    fields = parse_fields(request.args, CART_ITEM_FIELDS)
+    items = user_cart_items(user_id)
+
+    def build():
+        return {'items': [select_fields(cart_item_record(item), fields) for item in items],
+                'item_count': sum(item['quantity'] for item in items),
+                'total': sum(item['price'] * item['quantity'] for item in items)}
+    # the cart changes answer with the same body as GET, so they share its ETag
+    return versioned_response([(item['SK'], item.get('version', 0)) for item in items], build,
+                              key=f"cart?fields={','.join(fields)}")
+
+@app.route(f'{API_PREFIX}/cart')
+@api_login_required
+def api_cart():
+    return cart_response(session['user_id'])
+
+@app.route(f'{API_PREFIX}/cart/items', methods=['POST'])
+@api_login_required
+def api_add_cart_item():
+    # Adds to the cart like the form does and answers with the updated cart,
+    # so the page can redraw without a redirect and a second request.
+    data = request.get_json(silent=True) or {}
+    product_id, quantity = data.get('product_id'), data.get('quantity', 1)
+    if not isinstance(quantity, int) or quantity < 1:
+        raise ApiError(400, "Quantity must be a positive whole number.")
+    product = appdata_table.get_item(
+        Key={'PK': f'PRODUCT#{product_id}', 'SK': 'DETAILS'}
+    ).get('Item') if isinstance(product_id, str) else None
+    if not product:
+        raise ApiError(404, "Product not found.")
+    put_cart_item(session['user_id'], product, quantity)
+    return cart_response(session['user_id'])
+
+@app.route(f'{API_PREFIX}/cart/items/<string:product_id>', methods=['DELETE'])
+@api_login_required
+def api_remove_cart_item(product_id):
+    removed = appdata_table.delete_item(
+        Key={'PK': f"CART#{session['user_id']}", 'SK': f'PRODUCT#{product_id}'},
+        ReturnValues='ALL_OLD'
+    ).get('Attributes')
+    if not removed:
+        raise ApiError(404, "Item not found in your cart.")
+    return cart_response(session['user_id'])
+
+@app.route(f'{API_PREFIX}/orders')
+@api_login_required
+def api_orders():
+    fields = parse_fields(request.args, ORDER_FIELDS)
+    try:
+        page = user_orders_page(session['user_id'], cursor=request.args.get('cursor'), limit=page_limit(request.args))
+        orders = list(page)
+    except ValueError:
+        raise ApiError(400, "Invalid cursor.")
+    return versioned_response(
+        [(order['order_id'], order.get('version', 0)) for order in orders],
+        lambda: {'orders': [select_fields(order_record(order), fields) for order in orders],
+                 'next_cursor': page.next_cursor})
+
+@app.route(f'{API_PREFIX}/orders/<string:order_id>')
+@api_login_required
+def api_order(order_id):
+    # customers see their own orders, admins any order
+    fields = parse_fields(request.args, ORDER_DETAIL_FIELDS)
+    order = appdata_table.get_item(Key={'PK': f'ORDER#{order_id}', 'SK': 'DETAILS'}).get('Item')
+    if not order or (order.get('user_id') != session['user_id'] and not session.get('is_admin')):
+        raise ApiError(404, "Order not found.")
+
+    def build():
+        return select_fields(dict(order_record(order), address=order.get('address'), history=[], items=[
+            {'product_id': item.get('product_id'), 'name': item.get('name'),
+             'quantity': item.get('quantity'), 'price': item.get('price')}
+            for item in order.get('items', [])
+        ]), fields)
+    return versioned_response([order.get('version', 0)], build)
+
 @app.route('/services')
+@page_cache.anonymous
 def services():
     return render_template('services.html')
 
@@ -0,0 +1,147 @@
+"""Concurrent-user capacity: sync gunicorn vs gthread vs the ASGI entry point.
+
+Seeds a scratch store once, then serves it with each server model in turn.
+Each model gets the same process count. At every concurrency level, that
+many logged-in users request one route back to back for --seconds. The
+script reports throughput, p50/p99 latency and errors per model and level:
+
+    python benchmarks/capacity.py --route /dashboard --users 1 8 32 64
+    python benchmarks/capacity.py --app dynamo --endpoint-url http://localhost:8000
+
+The load generator is a Python thread per user, so at high levels it can
+saturate before the server does. Compare models at the same level, not
+absolute numbers across machines.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from routes import (ROOT, HttpClient, _free_port, git_commit, percentile,  # noqa: E402
+                    prepare_dynamo, prepare_sql, start_server)
+from seed import ADMIN_EMAIL, BENCH_PASSWORD, CUSTOMER_EMAIL  # noqa: E402
+
+
+def server_argv(model, module, factory, port, processes, threads):
+    python = sys.executable
+    if model == 'gunicorn-sync':
+        return [python, '-m', 'gunicorn', '-w', str(processes), '-b', f'127.0.0.1:{port}', f'{module}:app']
+    if model == 'gunicorn-gthread':
+        return [python, '-m', 'gunicorn', '-k', 'gthread', '--threads', str(threads), '-w', str(processes),
+                '-b', f'127.0.0.1:{port}', f'{module}:app']
+    return [python, '-m', 'uvicorn', '--factory', f'asgi:{factory}', '--workers', str(processes),
+            '--host', '127.0.0.1', '--port', str(port), '--no-access-log']
+
+
+def run_level(base_url, route, email, users, seconds):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    # everyone logs in first, so password hashing is not part of the timing
+    ready = threading.Barrier(users + 1)
+    start = threading.Event()
+    deadline = [0.0]
+
+    def user():
+        nonlocal errors
+        client = HttpClient(base_url)
+        client.request('POST', '/login', {'email': email, 'password': BENCH_PASSWORD})
+        own, failed = [], 0
+        ready.wait()
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                status = client.request('GET', route)
+            except OSError:
+                status = None
+            if status != 200:
+                failed += 1
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+            errors += failed
+
+    threads = [threading.Thread(target=user) for _ in range(users)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    deadline[0] = time.perf_counter() + seconds
+    start.set()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return {
+        'users': users,
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / seconds, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', choices=['sql', 'dynamo'], default='sql')
+    parser.add_argument('--models', nargs='+', default=['gunicorn-sync', 'gunicorn-gthread', 'uvicorn'],
+                        choices=['gunicorn-sync', 'gunicorn-gthread', 'uvicorn'])
+    parser.add_argument('--route', default='/dashboard')
+    parser.add_argument('--role', choices=['admin', 'customer'], default='admin')
+    parser.add_argument('--users', nargs='+', type=int, default=[1, 8, 32, 64])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='gthread threads per process')
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--endpoint-url', help='DynamoDB Local / moto_server endpoint')
+    parser.add_argument('--output', help='JSON results path')
+    args = parser.parse_args()
+
+    os.environ.setdefault('LOGIN_ATTEMPTS_PER_IP', '0')
+    os.environ.setdefault('LOGIN_ATTEMPTS_PER_EMAIL', '0')
+    os.environ.setdefault('SLOW_REQUEST_MS', '60000')
+    os.environ.setdefault('ASGI_THREADS', str(args.threads))
+    email = ADMIN_EMAIL if args.role == 'admin' else CUSTOMER_EMAIL
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_args = argparse.Namespace(users=100, products=50, orders=args.orders,
+                                       mode='gunicorn', endpoint_url=args.endpoint_url)
+        prepare = prepare_sql if args.app == 'sql' else prepare_dynamo
+        _, module, env, _, _, _ = prepare(seed_args, workdir)
+        factory = 'sql_app' if args.app == 'sql' else 'dynamo_app'
+        for model in args.models:
+            port = _free_port()
+            server, base_url = start_server(
+                server_argv(model, module, factory, port, args.processes, args.threads), port, env)
+            try:
+                results[model] = []
+                for users in args.users:
+                    level = run_level(base_url, args.route, email, users, args.seconds)
+                    results[model].append(level)
+                    print(f"{model:<18} {json.dumps(level)}")
+            finally:
+                server.terminate()
+                server.wait()
+
+    report = {
+        'app': args.app,
+        'commit': git_commit(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'models': results,
+    }
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"capacity-{args.app}-{report['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Requests, bytes and time per cart action: HTML forms against the JSON API.
+
+Runs the SQL app in-process on a scratch SQLite database with the seeded
+catalog. Each cart action is done --actions times both ways:
+
+  form  POST /add-to-cart (or /remove-from-cart), then the redirected page
+  api   POST /api/v1/cart/items (or DELETE /api/v1/cart/items/<id>), which
+        answers with the updated cart
+
+It also fetches the product list from the API cold, gzipped, with a subset
+of fields, and revalidated with If-None-Match:
+
+    python benchmarks/cart_api.py --actions 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def timed(client, actions):
+    requests = sent = 0
+    timings = []
+    for action in actions:
+        started = time.perf_counter()
+        for response in action(client):
+            requests += 1
+            sent += len(response.get_data())
+        timings.append((time.perf_counter() - started) * 1000)
+    return requests / len(actions), sent / len(actions), statistics.median(timings)
+
+
+def form_add(product_id):
+    def action(client):
+        response = client.post('/add-to-cart', data={'product_id': product_id, 'quantity': 1})
+        return [response, client.get(response.headers['Location'])]
+    return action
+
+
+def form_remove(product_id):
+    def action(client):
+        response = client.post('/remove-from-cart', data={'product_id': product_id})
+        return [response, client.get(response.headers['Location'])]
+    return action
+
+
+def api_add(product_id):
+    return lambda client: [client.post('/api/v1/cart/items', json={'product_id': product_id})]
+
+
+def api_remove(product_id):
+    return lambda client: [client.delete(f'/api/v1/cart/items/{product_id}')]
+
+
+def cart_rounds(product_ids, count, add, remove):
+    # fills the cart with the catalog and empties it again until `count` adds
+    actions = []
+    while len(actions) < 2 * count:
+        chunk = product_ids[:count - len(actions) // 2]
+        actions += [add(product_id) for product_id in chunk] + [remove(product_id) for product_id in chunk]
+    return actions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--actions', type=int, default=200, help='cart adds (and as many removes) per flow')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='cart-api-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    from app import app, db
+    from catalog import seed_products
+    from models import Product, User
+
+    with app.app_context():
+        db.create_all()
+        seed_products()
+        user = User(username='bench', email='bench@example.com', password='-')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        product_ids = [product_id for (product_id,) in db.session.query(Product.id).order_by(Product.id)]
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=user_id, username='bench')
+
+    print(f"{'cart action':<14}{'requests':>10}{'bytes':>10}{'p50 ms':>10}")
+    for name, add, remove in (('form', form_add, form_remove), ('api', api_add, api_remove)):
+        requests, sent, p50 = timed(client, cart_rounds(product_ids, args.actions, add, remove))
+        print(f"{name:<14}{requests:>10.1f}{sent:>10.0f}{p50:>10.2f}")
+
+    print(f"\n{'product list':<22}{'status':>8}{'bytes':>10}")
+    full = client.get('/api/v1/products?limit=200')
+    compressed = client.get('/api/v1/products?limit=200', headers={'Accept-Encoding': 'gzip'})
+    fields = client.get('/api/v1/products?limit=200&fields=id,name,price', headers={'Accept-Encoding': 'gzip'})
+    revalidated = client.get('/api/v1/products?limit=200&fields=id,name,price',
+                             headers={'Accept-Encoding': 'gzip', 'If-None-Match': fields.headers['ETag']})
+    for name, response in (('all fields', full), ('gzip', compressed), ('gzip, 3 fields', fields),
+                           ('If-None-Match', revalidated)):
+        print(f"{name:<22}{response.status_code:>8}{len(response.get_data()):>10}")
+
+
+if __name__ == '__main__':
+    main()
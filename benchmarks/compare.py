@@ -0,0 +1,59 @@
+"""Compare two benchmarks/routes.py result files.
+
+    python benchmarks/compare.py baseline.json candidate.json --threshold 10
+
+Prints per-route p50/p99/throughput/call-count changes and exits non-zero
+when any route's p50 or p99 got slower, or its throughput dropped, by more
+than the threshold percentage, or when it makes more calls per request.
+"""
+import argparse
+import json
+import sys
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed regression in percent')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{'route':<28} {'p50 ms':>18} {'p99 ms':>18} {'req/s':>18} {'calls/req':>12}")
+    regressions = []
+    for name, new in candidate['routes'].items():
+        old = baseline['routes'].get(name)
+        if not old:
+            print(f"{name:<28} (new route)")
+            continue
+        cells = []
+        for key, worse_if_higher in (('p50_ms', True), ('p99_ms', True), ('requests_per_second', False)):
+            pct = change(old[key], new[key])
+            cells.append(f"{old[key]:>7}->{new[key]:<7}" + (f"{pct:+.0f}%" if pct is not None else ''))
+            if pct is not None and (pct if worse_if_higher else -pct) > args.threshold:
+                regressions.append(f"{name}: {key} {old[key]} -> {new[key]}")
+        calls_old, calls_new = old.get('calls_per_request'), new.get('calls_per_request')
+        cells.append(f"{calls_old}->{calls_new}")
+        if calls_old is not None and calls_new is not None and calls_new > calls_old:
+            regressions.append(f"{name}: calls_per_request {calls_old} -> {calls_new}")
+        print(f"{name:<28} " + ' '.join(f"{c:>18}" for c in cells))
+
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
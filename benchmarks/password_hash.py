@@ -0,0 +1,55 @@
+"""Password hash cost benchmark.
+
+Times werkzeug's scrypt and pbkdf2 at several work factors on this machine
+and recommends the strongest PASSWORD_HASH_METHOD whose verification fits
+the target latency:
+
+    python benchmarks/password_hash.py --target-ms 100
+"""
+import argparse
+import json
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+CANDIDATES = [
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+    'scrypt:131072:8:1',
+    'pbkdf2:sha256:300000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+]
+
+
+def time_method(method, rounds):
+    pwhash = generate_password_hash('benchmark-password', method)
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        check_password_hash(pwhash, 'benchmark-password')
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target-ms', type=float, default=100)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    best = {}
+    for method in CANDIDATES:
+        ms = round(time_method(method, args.rounds), 1)
+        print(json.dumps({'method': method, 'verify_ms': ms}))
+        family = method.split(':')[0]
+        if ms <= args.target_ms:
+            best[family] = method
+    for family, method in best.items():
+        print(f"Strongest {family} within {args.target_ms} ms: PASSWORD_HASH_METHOD={method}")
+
+
+if __name__ == '__main__':
+    main()
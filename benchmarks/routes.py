@@ -0,0 +1,315 @@
+"""Route benchmark for app.py (SQLite) and awsapp.py (DynamoDB).
+
+Seeds a scratch store, logs in an admin and a customer, then drives
+/products, /cart, /dashboard, checkout and /submit-rating. It reports p50/p99
+latency, throughput and SQL statements or DynamoDB calls per request, and
+writes the results as JSON for benchmarks/compare.py.
+
+    python benchmarks/routes.py --app sql
+    python benchmarks/routes.py --app dynamo
+    python benchmarks/routes.py --app sql --mode gunicorn --workers 4 --concurrency 8
+    python benchmarks/routes.py --app dynamo --mode gunicorn --endpoint-url http://localhost:8000
+
+The client mode calls the Flask test client in-process. The dynamo app then
+runs against moto. The gunicorn mode starts a local gunicorn and sends real
+HTTP requests. For the dynamo app it needs a DynamoDB Local or moto_server
+endpoint. Statement and call counts are only available in client mode.
+"""
+import argparse
+import contextvars
+import http.cookiejar
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import ADMIN_EMAIL, BENCH_PASSWORD, CUSTOMER_EMAIL  # noqa: E402
+
+SQL_ROUTES = [
+    {'name': 'GET /products', 'role': 'customer', 'method': 'GET', 'path': '/products'},
+    {'name': 'GET /cart', 'role': 'customer', 'method': 'GET', 'path': '/cart',
+     'setup_once': [('POST', '/add-to-cart', {'product_id': '1', 'quantity': '1'})]},
+    {'name': 'GET /dashboard (admin)', 'role': 'admin', 'method': 'GET', 'path': '/dashboard'},
+    {'name': 'GET /dashboard (customer)', 'role': 'customer', 'method': 'GET', 'path': '/dashboard'},
+    {'name': 'POST /process-checkout', 'role': 'customer', 'method': 'POST', 'path': '/process-checkout',
+     'data': {'address': 'Bench street'},
+     'setup': [('POST', '/add-to-cart', {'product_id': '2', 'quantity': '1'})]},
+    {'name': 'POST /submit-rating', 'role': 'customer', 'method': 'POST',
+     'path': '/submit-rating/{customer_order_id}', 'data': {'stars': '4'}},
+]
+
+DYNAMO_ROUTES = [
+    {'name': 'GET /products', 'role': 'customer', 'method': 'GET', 'path': '/products'},
+    {'name': 'GET /cart', 'role': 'customer', 'method': 'GET', 'path': '/cart',
+     'setup_once': [('POST', '/add-to-cart', {'product_id': 'p1', 'quantity': '1'})]},
+    {'name': 'GET /dashboard (admin)', 'role': 'admin', 'method': 'GET', 'path': '/dashboard'},
+    {'name': 'GET /dashboard (customer)', 'role': 'customer', 'method': 'GET', 'path': '/dashboard'},
+    {'name': 'POST /checkout', 'role': 'customer', 'method': 'POST', 'path': '/checkout',
+     'data': {'address': 'Bench street'},
+     'setup': [('POST', '/add-to-cart', {'product_id': 'p2', 'quantity': '1'})]},
+    {'name': 'POST /submit-rating', 'role': 'customer', 'method': 'POST',
+     'path': '/submit-rating/{customer_order_id}', 'data': {'rating': '4'}},
+]
+
+
+class CallCounter:
+    # Counts SQL statements / DynamoDB calls made inside a timed request, so
+    # untimed setup requests do not skew the per-route figure. The flag is a
+    # context variable so it follows async views and their read pool threads.
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._active = contextvars.ContextVar('bench_timing', default=False)
+
+    def timing(self, active):
+        self._active.set(active)
+
+    def __call__(self, *args, **kwargs):
+        if self._active.get():
+            with self._lock:
+                self.count += 1
+
+
+class FlaskClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_route(route, make_client, context, counter, requests, concurrency, warmup):
+    path = route['path'].format(**context)
+    latencies, busy, statuses = [], [], {}
+    lock = threading.Lock()
+
+    def session_worker():
+        client = make_client()
+        email = ADMIN_EMAIL if route['role'] == 'admin' else CUSTOMER_EMAIL
+        client.request('POST', '/login', {'email': email, 'password': BENCH_PASSWORD})
+        for method, setup_path, data in route.get('setup_once', []):
+            client.request(method, setup_path, data)
+        own, own_busy = [], 0.0
+        for i in range(warmup + requests):
+            for method, setup_path, data in route.get('setup', []):
+                client.request(method, setup_path, data)
+            if counter and i >= warmup:
+                counter.timing(True)
+            started = time.perf_counter()
+            status = client.request(route['method'], path, route.get('data'))
+            elapsed = time.perf_counter() - started
+            if counter:
+                counter.timing(False)
+            if i >= warmup:
+                own.append(elapsed)
+                own_busy += elapsed
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(own)
+            busy.append((len(own), own_busy))
+
+    if counter:
+        counter.count = 0
+    threads = [threading.Thread(target=session_worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        'requests': total,
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / total * 1000, 3),
+        'requests_per_second': round(sum(n / t for n, t in busy if t), 1),
+        'calls_per_request': round(counter.count / total, 2) if counter else None,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(argv, port, env):
+    process = subprocess.Popen(argv, cwd=ROOT, env=dict(os.environ, **env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{argv[2]} exited with {process.returncode}; is it installed?')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{argv[2]} did not start')
+
+
+def start_gunicorn(module, workers, env):
+    port = _free_port()
+    return start_server([sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                         f'{module}:app'], port, env)
+
+
+def prepare_sql(args, workdir):
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['DATABASE_URL'] = url
+    from seed import seed_sql
+    from app import app
+    from models import db
+
+    context = seed_sql(app, users=args.users, products=args.products, orders=args.orders)
+    counter = CallCounter()
+    with app.app_context():
+        from sqlalchemy import event
+        event.listen(db.engine, 'before_cursor_execute', counter)
+    return app, 'app', {'DATABASE_URL': url}, context, counter, SQL_ROUTES
+
+
+def prepare_dynamo(args, workdir):
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env = {}
+    if args.endpoint_url:
+        os.environ['AWS_ENDPOINT_URL'] = args.endpoint_url
+        env['AWS_ENDPOINT_URL'] = args.endpoint_url
+    else:
+        if args.mode == 'gunicorn':
+            raise SystemExit('--mode gunicorn with --app dynamo needs --endpoint-url')
+        from moto import mock_aws
+        mock_aws().start()
+
+    import awsapp
+    from seed import create_dynamo_tables, seed_dynamo
+    create_dynamo_tables(awsapp.dynamodb)
+    context = seed_dynamo(awsapp, users=args.users, products=args.products, orders=args.orders)
+    counter = CallCounter()
+    awsapp.dynamodb.meta.client.meta.events.register('before-call.dynamodb', counter)
+    return awsapp.app, 'awsapp', env, context, counter, DYNAMO_ROUTES
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', choices=['sql', 'dynamo'], default='sql')
+    parser.add_argument('--mode', choices=['client', 'gunicorn'], default='client')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per session')
+    parser.add_argument('--concurrency', type=int, default=1, help='concurrent sessions per route')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--endpoint-url', help='DynamoDB Local / moto_server endpoint')
+    parser.add_argument('--route', action='append', help='only run routes whose name contains this')
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/...)')
+    args = parser.parse_args()
+
+    # every session logs in from 127.0.0.1, which the login throttle would
+    # stop, and each login is slow enough to flood the slow-request log
+    os.environ.setdefault('LOGIN_ATTEMPTS_PER_IP', '0')
+    os.environ.setdefault('LOGIN_ATTEMPTS_PER_EMAIL', '0')
+    os.environ.setdefault('SLOW_REQUEST_MS', '60000')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare = prepare_sql if args.app == 'sql' else prepare_dynamo
+        app, module, env, context, counter, routes = prepare(args, workdir)
+
+        server = None
+        if args.mode == 'gunicorn':
+            server, base_url = start_gunicorn(module, args.workers, env)
+            make_client, counter = (lambda: HttpClient(base_url)), None
+        else:
+            make_client = lambda: FlaskClient(app)  # noqa: E731
+
+        results = {}
+        try:
+            for route in routes:
+                if args.route and not any(r in route['name'] for r in args.route):
+                    continue
+                results[route['name']] = run_route(route, make_client, context, counter,
+                                                   args.requests, args.concurrency, args.warmup)
+                print(f"{route['name']:<28} {json.dumps(results[route['name']])}")
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    report = {
+        'app': args.app,
+        'mode': args.mode,
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'route')},
+        'routes': results,
+    }
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"{args.app}-{args.mode}-{report['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
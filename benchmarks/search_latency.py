@@ -0,0 +1,116 @@
+"""Product search latency on a large synthetic catalog.
+
+Builds a catalog of --products SKUs in a scratch SQLite database (indexed by
+the FTS5 triggers) and in the in-process InvertedIndex used by the DynamoDB
+app. It then replays typeahead queries, each word typed a character at a
+time, against both. Reports p50/p99/max latency with the result cache
+bypassed, and with it enabled:
+
+    python benchmarks/search_latency.py --products 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from routes import percentile  # noqa: E402
+
+FLAVOURS = ['Mango', 'Lemon', 'Garlic', 'Ginger', 'Tomato', 'Amla', 'Gongura', 'Chilli', 'Carrot',
+            'Chicken', 'Fish', 'Mutton', 'Prawn', 'Crab', 'Banana', 'Ragi', 'Peanut', 'Murukku']
+KINDS = ['Pickle', 'Pickle', 'Pickle', 'Thokku', 'Chips', 'Mixture', 'Podi']
+SYLLABLES = ['ka', 'ma', 'ra', 'pa', 'ta', 'la', 'na', 'va', 'sa', 'ga', 'da', 'ba', 'ji', 'ko', 'ru']
+
+
+def synthetic_catalog(count, rng):
+    # a few thousand made-up brand and region words keep the vocabulary wide
+    words = sorted({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(6000)})
+    for i in range(count):
+        flavour, kind = rng.choice(FLAVOURS), rng.choice(KINDS)
+        yield {
+            'id': i + 1,
+            'name': f"{rng.choice(words).title()} {flavour} {kind}",
+            'description': ' '.join(rng.choices(words + [flavour.lower(), 'spicy', 'tangy', 'homemade'], k=10)),
+            'category': 'snack' if kind in ('Chips', 'Mixture') else rng.choice(['veg', 'non_veg']),
+            'price': rng.randint(40, 400),
+            'stock': 100,
+        }
+
+
+def typeahead_queries(products, count, rng):
+    queries = []
+    for product in rng.sample(products, count):
+        typed = ''
+        for word in product['name'].split()[:2]:
+            for end in range(2, len(word) + 1):
+                queries.append((typed + word[:end]).lower())
+            typed += word + ' '
+    return queries
+
+
+def time_queries(search, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'queries': len(timings),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'max_ms': round(timings[-1] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--typed', type=int, default=200, help='product names to type out')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    products = list(synthetic_catalog(args.products, rng))
+    queries = typeahead_queries(products, args.typed, rng)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'search.db')}"
+        from sqlalchemy import insert
+        from app import app
+        from models import db, Product
+        from search import CachedSearch, InvertedIndex, SqliteProductSearch
+
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            db.session.execute(insert(Product), products)
+            db.session.commit()
+            print(f"Indexed {len(products)} products in SQLite FTS5 in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            index = InvertedIndex(lambda: products)
+            index.search('warm up')
+            print(f"Built the in-process index in {time.perf_counter() - started:.1f}s")
+
+            results = {}
+            for name, backend in (('sqlite-fts5', SqliteProductSearch()), ('inverted-index', index)):
+                results[name] = time_queries(backend.search, queries)
+                cached = CachedSearch(backend)
+                time_queries(cached.search, queries)
+                results[f'{name} (cached)'] = time_queries(cached.search, queries)
+            db.session.remove()
+            db.engine.dispose()
+
+    for name, result in results.items():
+        print(f"{name:<26} {json.dumps(result)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Seed data for the benchmark suite.
+
+Both stores get the same shape of data: N customers plus one admin, products
+across the catalog categories, orders of one to three items, and a rating
+per ordered product. Every user's password is BENCH_PASSWORD.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from werkzeug.security import generate_password_hash
+
+BENCH_PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'admin@bench.local'
+CUSTOMER_EMAIL = 'customer0@bench.local'
+CATEGORIES = ('veg', 'non_veg', 'snack')
+
+
+def _orders(users, products, orders, rng):
+    start = datetime.utcnow() - timedelta(days=365)
+    for i in range(orders):
+        lines = rng.sample(range(products), k=min(products, rng.randint(1, 3)))
+        yield (i % users, start + timedelta(minutes=i), [(p, rng.randint(1, 4)) for p in lines])
+
+
+def seed_sql(app, users=100, products=50, orders=1000, seed=1):
+    from sqlalchemy import insert
+    from models import db, User, Product, Order, OrderItem, Rating
+    from ratings import rebuild_rating_summaries
+
+    rng = random.Random(seed)
+    password = generate_password_hash(BENCH_PASSWORD)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(insert(User), [
+            {'id': 1, 'username': 'admin', 'email': ADMIN_EMAIL, 'password': password, 'is_admin': True}
+        ] + [
+            {'id': i + 2, 'username': f'customer{i}', 'email': f'customer{i}@bench.local',
+             'password': password, 'is_admin': False}
+            for i in range(users)
+        ])
+        db.session.execute(insert(Product), [
+            {'id': i + 1, 'name': f'Pickle {i}', 'description': f'Benchmark pickle {i}',
+             'price': 50 + i % 150, 'category': CATEGORIES[i % len(CATEGORIES)], 'stock': 10 ** 9}
+            for i in range(products)
+        ])
+        order_rows, item_rows, rating_rows = [], [], []
+        for order_id, (user, timestamp, lines) in enumerate(_orders(users, products, orders, rng), start=1):
+            user_id = user + 2
+            order_rows.append({'id': order_id, 'user_id': user_id, 'address': 'Bench street',
+                               'status': 'Placed', 'timestamp': timestamp,
+                               'total': sum((50 + p % 150) * q for p, q in lines)})
+            for product, quantity in lines:
+                item_rows.append({'order_id': order_id, 'product_id': product + 1,
+                                  'quantity': quantity, 'price': 50 + product % 150})
+                rating_rows.append({'order_id': order_id, 'product_id': product + 1,
+                                    'user_id': user_id, 'stars': rng.randint(1, 5)})
+        db.session.execute(insert(Order), order_rows)
+        db.session.execute(insert(OrderItem), item_rows)
+        db.session.execute(insert(Rating), rating_rows)
+        db.session.commit()
+        rebuild_rating_summaries()
+    return {'customer_order_id': 1}
+
+
+def create_dynamo_tables(dynamodb):
+    dynamodb.create_table(
+        TableName='Users',
+        KeySchema=[{'AttributeName': 'email', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'email', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    dynamodb.create_table(
+        TableName='AppData',
+        KeySchema=[{'AttributeName': 'PK', 'KeyType': 'HASH'}, {'AttributeName': 'SK', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': name, 'AttributeType': 'S'}
+                              for name in ('PK', 'SK', 'GSI1PK', 'GSI1SK')],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'GSI1',
+            'KeySchema': [{'AttributeName': 'GSI1PK', 'KeyType': 'HASH'},
+                          {'AttributeName': 'GSI1SK', 'KeyType': 'RANGE'}],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def seed_dynamo(awsapp, users=100, products=50, orders=1000, seed=1):
+    from dynamo_batch import batch_write
+    from dynamo_query import entity_keys
+
+    rng = random.Random(seed)
+    password = generate_password_hash(BENCH_PASSWORD)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    admin_id = str(uuid.uuid4())
+
+    with awsapp.users_table.batch_writer() as writer:
+        writer.put_item(Item={'email': ADMIN_EMAIL, 'user_id': admin_id, 'username': 'admin',
+                              'password': password, 'role': 'admin'})
+        for i, user_id in enumerate(user_ids):
+            writer.put_item(Item={'email': f'customer{i}@bench.local', 'user_id': user_id,
+                                  'username': f'customer{i}', 'password': password, 'role': 'customer'})
+
+    items = []
+    summaries = {}
+    product_rows = {}
+    for i in range(products):
+        product_id = f'p{i}'
+        category = CATEGORIES[i % len(CATEGORIES)]
+        product_rows[i] = {
+            'PK': f'PRODUCT#{product_id}', 'SK': 'DETAILS',
+            **entity_keys('PRODUCT', awsapp.product_sort_key(category, f'Pickle {i}')),
+            'product_id': product_id, 'name': f'Pickle {i}', 'price': Decimal(50 + i % 150),
+            'description': f'Benchmark pickle {i}', 'category': category, 'quantity': 10 ** 9
+        }
+    first_order = None
+    for user, timestamp, lines in _orders(users, products, orders, rng):
+        order_id = str(uuid.uuid4())
+        first_order = first_order or order_id
+        timestamp = timestamp.isoformat()
+        order = {
+            'PK': f'ORDER#{order_id}', 'SK': 'DETAILS',
+            **entity_keys('ORDER', f'{timestamp}#{order_id}'),
+            'order_id': order_id, 'user_id': user_ids[user], 'address': 'Bench street',
+            'items': [{'product_id': f'p{p}', 'name': f'Pickle {p}', 'price': Decimal(50 + p % 150),
+                       'quantity': q} for p, q in lines],
+            'status': 'Placed', 'timestamp': timestamp,
+            'total': Decimal(sum((50 + p % 150) * q for p, q in lines))
+        }
+        items += [order, awsapp.user_order_item(order)]
+        for product, _ in lines:
+            stars = rng.randint(1, 5)
+            items.append({'PK': f'RATING#p{product}', 'SK': f'USER#{user_ids[user]}',
+                          'product_id': f'p{product}', 'user_id': user_ids[user],
+                          'rating': stars, 'timestamp': timestamp})
+            # a later rating by the same user replaces the earlier one
+            summaries.setdefault(product, {})[user] = stars
+    for product, by_user in summaries.items():
+        row = product_rows[product]
+        row['rating_count'] = len(by_user)
+        row['rating_sum'] = sum(by_user.values())
+        for stars in range(1, 6):
+            row[f'stars_{stars}'] = sum(1 for s in by_user.values() if s == stars)
+    batch_write(awsapp.appdata_table, puts=items + list(product_rows.values()))
+    return {'customer_order_id': first_order}
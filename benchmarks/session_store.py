@@ -0,0 +1,77 @@
+"""Per-request session cost: Flask's signed cookie against the server-side store.
+
+Runs the SQL app in-process on a scratch SQLite database and times two kinds
+of request with a signed-in session, first with SecureCookieSessionInterface
+and then with the app's ServerSessionInterface:
+
+  read       a view that reads user_id (most requests)
+  flash+pop  a view that flashes, then the view that shows it (every
+             POST-redirect-GET), which writes the session twice
+
+It reports the median per request (or pair) and the cookie size:
+
+    python benchmarks/session_store.py --requests 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def median_us(client, paths, count):
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        for path in paths:
+            client.get(path)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='timed requests per case')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='session-store-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    from flask import flash, session
+    from flask.sessions import SecureCookieSessionInterface
+    from app import app, db
+
+    with app.app_context():
+        db.create_all()
+
+    @app.route('/_bench/read')
+    def bench_read():
+        return str(session.get('user_id'))
+
+    @app.route('/_bench/flash')
+    def bench_flash():
+        flash("Item added to cart.", "success")
+        return ''
+
+    @app.route('/_bench/pop')
+    def bench_pop():
+        session.pop('_flashes', None)
+        return ''
+
+    print(f"{'session':<10}{'read us':>10}{'flash+pop us':>14}{'cookie bytes':>14}")
+    for name, interface in (('cookie', SecureCookieSessionInterface()), ('server', app.session_interface)):
+        app.session_interface = interface
+        client = app.test_client()
+        with client.session_transaction() as bench_session:
+            bench_session.update(user_id=1, username='bench', is_admin=False, email='bench@example.com')
+        read = median_us(client, ['/_bench/read'], args.requests)
+        flashed = median_us(client, ['/_bench/flash', '/_bench/pop'], args.requests)
+        cookie = len(client.get_cookie('session').value)
+        print(f"{name:<10}{read:>10.0f}{flashed:>14.0f}{cookie:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Multi-process SQLite write benchmark.
+
+Runs the same write workload against a scratch database with SQLite's
+defaults and with the pragmas from database.py, and prints commits per
+second and "database is locked" failures for each mode:
+
+    python benchmarks/sqlite_writes.py --processes 4 --writes 500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import apply_sqlite_pragmas  # noqa: E402
+
+
+def connect(path, tuned):
+    # pysqlite's own timeout is disabled so only the pragmas decide waiting;
+    # untuned connections keep SQLite's defaults (rollback journal, FULL sync,
+    # no busy wait), as the app had before database.py.
+    connection = sqlite3.connect(path, timeout=0)
+    if tuned:
+        apply_sqlite_pragmas(connection)
+    return connection
+
+
+def worker(path, tuned, writes, results):
+    committed = locked = 0
+    try:
+        connection = connect(path, tuned)
+        for i in range(writes):
+            try:
+                # shaped like a checkout: a stock update plus an order insert
+                connection.execute('UPDATE product SET stock = stock - 1 WHERE id = ?', (i % 10 + 1,))
+                connection.execute('INSERT INTO "order" (user_id, total, status) VALUES (?, ?, ?)',
+                                   (os.getpid(), 100, 'Placed'))
+                connection.commit()
+                committed += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                connection.rollback()
+                locked += 1
+        connection.close()
+    finally:
+        results.put((committed, locked))
+
+
+def run(tuned, processes, writes):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        setup = connect(path, tuned)
+        setup.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, stock INTEGER)')
+        setup.execute('CREATE TABLE "order" (id INTEGER PRIMARY KEY, user_id INTEGER, total FLOAT, status TEXT)')
+        setup.executemany('INSERT INTO product (id, stock) VALUES (?, ?)', [(i, 10 ** 9) for i in range(1, 11)])
+        setup.commit()
+        setup.close()
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=worker, args=(path, tuned, writes, results))
+                   for _ in range(processes)]
+        started = time.perf_counter()
+        for p in workers:
+            p.start()
+        totals = [results.get() for _ in workers]
+        for p in workers:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+    committed = sum(c for c, _ in totals)
+    return {
+        'mode': 'tuned' if tuned else 'default',
+        'processes': processes,
+        'committed': committed,
+        'locked_errors': sum(l for _, l in totals),
+        'seconds': round(elapsed, 3),
+        'commits_per_second': round(committed / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--writes', type=int, default=500, help='writes per process')
+    args = parser.parse_args()
+    for tuned in (False, True):
+        print(json.dumps(run(tuned, args.processes, args.writes)))
+
+
+if __name__ == '__main__':
+    main()
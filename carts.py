@@ -0,0 +1,106 @@
+from collections import namedtuple
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from cache import TTLCache
+from models import db, CartItem, Product
+
+CartSummary = namedtuple('CartSummary', ['item_count', 'total'])
+
+# Per-user cart summaries for the navbar badge. The cache is per process and
+# a cart write only invalidates the entry of the worker that made it, so the
+# TTL is what bounds how long another worker shows an old count. Nothing that
+# decides what a user may do reads it; see cart_has_items().
+CART_SUMMARY_TTL = 5
+_summaries = TTLCache(maxsize=4096, ttl=CART_SUMMARY_TTL)
+
+
+def cart_items(user_id):
+    items = (CartItem.query
+             .options(joinedload(CartItem.product))
+             .filter(CartItem.user_id == user_id)
+             .order_by(CartItem.id)
+             .all())
+    items = [item for item in items if item.product is not None]
+    _summaries.set(user_id, summarize(items))
+    return items
+
+
+def summarize(items):
+    return CartSummary(item_count=sum(item.quantity for item in items),
+                       total=sum(item.product.price * item.quantity for item in items))
+
+
+def cart_summary(user_id):
+    summary = _summaries.get(user_id)
+    if summary is None:
+        count, total = (db.session.query(db.func.sum(CartItem.quantity),
+                                         db.func.sum(CartItem.quantity * Product.price))
+                        .join(Product, Product.id == CartItem.product_id)
+                        .filter(CartItem.user_id == user_id)
+                        .one())
+        summary = CartSummary(item_count=count or 0, total=total or 0)
+        _summaries.set(user_id, summary)
+    return summary
+
+
+def cart_has_items(user_id):
+    # straight from the table, for checks that must see another worker's writes
+    return db.session.query(
+        CartItem.query
+        .join(Product, Product.id == CartItem.product_id)
+        .filter(CartItem.user_id == user_id)
+        .exists()
+    ).scalar()
+
+
+def cart_versions(user_id):
+    # Line and product versions, so a price change shows in the cart too
+    return [tuple(row) for row in
+            db.session.query(CartItem.id, CartItem.version, Product.version)
+            .outerjoin(Product, Product.id == CartItem.product_id)
+            .filter(CartItem.user_id == user_id)
+            .order_by(CartItem.id)]
+
+
+def cart_item_record(item):
+    return {'product_id': item.product_id, 'name': item.product.name, 'category': item.product.category,
+            'price': item.product.price, 'quantity': item.quantity,
+            'line_total': item.product.price * item.quantity}
+
+
+def add_item(user_id, product_id, quantity):
+    # Update-then-insert against the (user_id, product_id) unique index; a
+    # concurrent insert of the same line turns into the update on retry.
+    # Returns False if the line still could not be written, so the caller can
+    # tell the user rather than drop the add.
+    added = False
+    for _ in range(2):
+        updated = db.session.execute(
+            update(CartItem)
+            .where(CartItem.user_id == user_id, CartItem.product_id == product_id)
+            .values(quantity=CartItem.quantity + quantity, version=CartItem.version + 1)
+        )
+        if updated.rowcount == 0:
+            db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=quantity))
+        try:
+            db.session.commit()
+            added = True
+            break
+        except IntegrityError:
+            db.session.rollback()
+    invalidate_cart(user_id)
+    return added
+
+
+def remove_item(user_id, product_id):
+    removed = (CartItem.query
+               .filter_by(user_id=user_id, product_id=product_id)
+               .delete(synchronize_session=False))
+    db.session.commit()
+    invalidate_cart(user_id)
+    return removed
+
+
+def invalidate_cart(user_id):
+    _summaries.delete(user_id)
@@ -0,0 +1,90 @@
+import time
+from flask import render_template
+from markupsafe import Markup
+from sqlalchemy import event
+from models import db, Product
+
+CATEGORIES = ('veg', 'non_veg', 'snack')
+
+CATALOG = [
+    {"name": "Mango Pickle", "description": "Spicy and tangy mango pickle.", "price": 100, "category": "veg", "stock": 50},
+    {"name": "Lemon Pickle", "description": "Sour lemon pickle with aromatic spices.", "price": 90, "category": "veg", "stock": 40},
+    {"name": "Garlic Pickle", "description": "Bold garlic flavor in oil.", "price": 110, "category": "veg", "stock": 30},
+    {"name": "Ginger Pickle", "description": "Tangy ginger and spice blend.", "price": 95, "category": "veg", "stock": 35},
+    {"name": "Tomato Pickle", "description": "South Indian style tomato pickle.", "price": 85, "category": "veg", "stock": 40},
+    {"name": "Amla Pickle", "description": "Healthy gooseberry pickle.", "price": 105, "category": "veg", "stock": 25},
+    {"name": "Mixed Veg Pickle", "description": "Combination of various vegetables.", "price": 120, "category": "veg", "stock": 45},
+    {"name": "Green Chilli Pickle", "description": "Hot and spicy green chili delight.", "price": 70, "category": "veg", "stock": 20},
+    {"name": "Curry Leaf Pickle", "description": "Unique flavor with curry leaves.", "price": 100, "category": "veg", "stock": 15},
+    {"name": "Carrot Pickle", "description": "Crunchy carrot in mustard oil.", "price": 90, "category": "veg", "stock": 30},
+
+    {"name": "Chicken Pickle", "description": "Spicy and soft chicken chunks.", "price": 150, "category": "non_veg", "stock": 25},
+    {"name": "Fish Pickle", "description": "Kerala-style fish pickle.", "price": 140, "category": "non_veg", "stock": 20},
+    {"name": "Mutton Pickle", "description": "Rich goat meat in masala.", "price": 160, "category": "non_veg", "stock": 15},
+    {"name": "Prawn Pickle", "description": "Tangy shrimp pickle.", "price": 155, "category": "non_veg", "stock": 18},
+    {"name": "Egg Pickle", "description": "Hard-boiled eggs in spicy blend.", "price": 130, "category": "non_veg", "stock": 12},
+    {"name": "Crab Pickle", "description": "For crab lovers, spicy twist.", "price": 170, "category": "non_veg", "stock": 10},
+    {"name": "Dry Fish Pickle", "description": "Salted dry fish and spices.", "price": 145, "category": "non_veg", "stock": 20},
+    {"name": "Quail Pickle", "description": "Rare spicy bird meat pickle.", "price": 180, "category": "non_veg", "stock": 8},
+    {"name": "Turkey Pickle", "description": "Festive flavor in a bottle.", "price": 165, "category": "non_veg", "stock": 10},
+    {"name": "Beef Pickle", "description": "South-style spicy beef chunks.", "price": 175, "category": "non_veg", "stock": 5},
+
+    {"name": "Murukku", "description": "Classic crunchy spiral snack.", "price": 60, "category": "snack", "stock": 100},
+    {"name": "Mixture", "description": "Spicy mix of lentils and sev.", "price": 70, "category": "snack", "stock": 100},
+    {"name": "Chakli", "description": "Spiral savory delight.", "price": 65, "category": "snack", "stock": 80},
+    {"name": "Thattai", "description": "Crispy and round rice crackers.", "price": 55, "category": "snack", "stock": 75},
+    {"name": "Ribbon Pakoda", "description": "Flat and spicy deep-fried snack.", "price": 50, "category": "snack", "stock": 90},
+    {"name": "Karasev", "description": "Peppery crunchy snack.", "price": 60, "category": "snack", "stock": 95},
+    {"name": "Banana Chips", "description": "Kerala-style banana crisps.", "price": 45, "category": "snack", "stock": 100},
+    {"name": "Potato Chips", "description": "Thin, salty and crunchy.", "price": 50, "category": "snack", "stock": 100},
+    {"name": "Boondi", "description": "Tiny fried gram balls.", "price": 40, "category": "snack", "stock": 100},
+    {"name": "Namak Para", "description": "Diamond-cut crispy snack.", "price": 55, "category": "snack", "stock": 80},
+    {"name": "Chekkalu", "description": "Rice flour crackers with cumin.", "price": 60, "category": "snack", "stock": 70},
+    {"name": "Omapodi", "description": "Thin crunchy sev variety.", "price": 45, "category": "snack", "stock": 85},
+    {"name": "Ragi Chips", "description": "Healthy finger millet snack.", "price": 65, "category": "snack", "stock": 50},
+    {"name": "Peanut Chikki", "description": "Sweet snack with jaggery.", "price": 40, "category": "snack", "stock": 60},
+    {"name": "Kara Boondi", "description": "Spicy boondi with curry leaves.", "price": 50, "category": "snack", "stock": 90},
+]
+
+# Rendered product cards per category. Entries are dropped as soon as a
+# Product row changes in this process; the TTL bounds how long another
+# gunicorn worker can keep serving a stale copy.
+FRAGMENT_TTL = 60
+_fragments = {}
+
+
+def seed_products():
+    existing = {name for (name,) in db.session.query(Product.name)}
+    missing = [entry for entry in CATALOG if entry['name'] not in existing]
+    if missing:
+        db.session.execute(db.insert(Product), missing)
+        db.session.commit()
+        invalidate_catalog()
+    return len(missing)
+
+
+def catalog_products(category=None):
+    query = Product.query
+    if category:
+        query = query.filter(Product.category == category)
+    return query.order_by(Product.id).all()
+
+
+def render_catalog(category=None):
+    cached = _fragments.get(category)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    html = Markup(render_template('_product_cards.html', products=catalog_products(category)))
+    _fragments[category] = (html, time.monotonic() + FRAGMENT_TTL)
+    return html
+
+
+def invalidate_catalog():
+    _fragments.clear()
+
+
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_update')
+@event.listens_for(Product, 'after_delete')
+def _product_changed(mapper, connection, target):
+    invalidate_catalog()
@@ -0,0 +1,42 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+READ_WORKERS = int(os.environ.get('CONCURRENT_READ_WORKERS', 16))
+
+# Shared by every request, so an async view does not start threads of its own.
+_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix='concurrent-read')
+
+
+async def gather_reads(*calls):
+    # Runs zero-argument blocking callables (boto3 queries through PerThread
+    # resources, SQLAlchemy queries on their own Session) concurrently and
+    # returns their results in order. Each call sees a copy of the caller's
+    # context, so flask.g and the app context are available, but it must not
+    # use the request's db.session.
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(
+        loop.run_in_executor(_executor, contextvars.copy_context().run, call) for call in calls
+    ))
+
+
+class PerThread:
+    # Gives each thread its own object from factory(), for objects that must
+    # not be shared between threads, such as boto3 resources: request threads
+    # and the read pool above each build theirs on first use. Attribute access
+    # goes to the calling thread's object.
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+
+    def get(self):
+        value = getattr(self._local, 'value', None)
+        if value is None:
+            value = self._local.value = self._factory()
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
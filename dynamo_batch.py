@@ -0,0 +1,81 @@
+import time
+
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
+MAX_TRANSACTION_ITEMS = 100
+MAX_ATTEMPTS = 6
+BASE_BACKOFF = 0.05
+
+
+class UnprocessedItemsError(Exception):
+    pass
+
+
+def _key(item):
+    return (item['PK'], item['SK'])
+
+
+def _backoff(attempt):
+    time.sleep(min(BASE_BACKOFF * (2 ** attempt), 2.0))
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def batch_write(table, puts=(), deletes=()):
+    # BatchWriteItem rejects two requests for the same key in one call, so the
+    # last write for a key wins, as it would with sequential put/delete calls.
+    requests = {}
+    for key in deletes:
+        requests[_key(key)] = {'DeleteRequest': {'Key': key}}
+    for item in puts:
+        requests[_key(item)] = {'PutRequest': {'Item': item}}
+
+    client = table.meta.client
+    for chunk in _chunks(list(requests.values()), BATCH_WRITE_SIZE):
+        pending = {table.name: chunk}
+        for attempt in range(MAX_ATTEMPTS):
+            pending = client.batch_write_item(RequestItems=pending).get('UnprocessedItems')
+            if not pending:
+                break
+            _backoff(attempt)
+        else:
+            raise UnprocessedItemsError(f"{len(pending[table.name])} writes to {table.name} were not processed")
+
+
+def batch_get(table, keys):
+    unique_keys = list({_key(key): key for key in keys}.values())
+    client = table.meta.client
+    items = {}
+    for chunk in _chunks(unique_keys, BATCH_GET_SIZE):
+        pending = {table.name: {'Keys': chunk}}
+        for attempt in range(MAX_ATTEMPTS):
+            response = client.batch_get_item(RequestItems=pending)
+            for item in response['Responses'].get(table.name, []):
+                items[_key(item)] = item
+            pending = response.get('UnprocessedKeys')
+            if not pending:
+                break
+            _backoff(attempt)
+        else:
+            raise UnprocessedItemsError(f"{len(pending[table.name]['Keys'])} reads from {table.name} were not processed")
+    return items
+
+
+def transact_write(table, actions):
+    # actions are TransactWriteItems entries without the table name, e.g.
+    # {'Put': {'Item': {...}}} or {'Delete': {'Key': {...}, 'ConditionExpression': ...}}
+    if len(actions) > MAX_TRANSACTION_ITEMS:
+        raise ValueError(f"a transaction can hold at most {MAX_TRANSACTION_ITEMS} items")
+    transact_items = []
+    for action in actions:
+        (operation, params), = action.items()
+        transact_items.append({operation: dict(params, TableName=table.name)})
+    table.meta.client.transact_write_items(TransactItems=transact_items)
+
+
+def is_transaction_conflict(error):
+    return error.response.get('Error', {}).get('Code') in (
+        'TransactionCanceledException', 'ConditionalCheckFailedException')
@@ -0,0 +1,161 @@
+import copy
+import json
+import os
+import threading
+from collections import Counter
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from cache import TTLCache
+
+DYNAMO_CACHE = os.environ.get('DYNAMO_CACHE', 'local')
+DYNAMO_CACHE_TTL = float(os.environ.get('DYNAMO_CACHE_TTL', 60))
+DYNAMO_CACHE_NEGATIVE_TTL = float(os.environ.get('DYNAMO_CACHE_NEGATIVE_TTL', 10))
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+class LocalCacheBackend:
+    # Per-process; other workers only see a write once their copy expires.
+
+    def __init__(self, maxsize=10000):
+        self.cache = TTLCache(maxsize=maxsize)
+
+    def get(self, key):
+        # copies, so a caller editing an item cannot change the cached one
+        return copy.deepcopy(self.cache.get(key))
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, copy.deepcopy(value), ttl=ttl)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+
+class RedisCacheBackend:
+    # Shared by every worker, so invalidation is seen everywhere. client is a
+    # redis.Redis or anything with the same get/set/delete, e.g.
+    # fakeredis.FakeRedis() in tests. Items are stored as DynamoDB JSON.
+
+    def __init__(self, client, prefix='dynamo:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        if 'Item' in value:
+            value['Item'] = {k: _deserializer.deserialize(v) for k, v in value['Item'].items()}
+        return value
+
+    def set(self, key, value, ttl):
+        if 'Item' in value:
+            value = {'Item': {k: _serializer.serialize(v) for k, v in value['Item'].items()}}
+        try:
+            raw = json.dumps(value)
+        except TypeError:
+            # binary attributes are not cached
+            return
+        self.client.set(self.prefix + key, raw, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class NullCacheBackend:
+    # DYNAMO_CACHE=off: every get_item goes to the table.
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+class CachedTable:
+    # Read-through cache for get_item on a boto3 Table. Missing items are
+    # cached for negative_ttl. put_item/update_item/delete_item through this
+    # wrapper invalidate their key. Writes that go around it (transactions,
+    # batch writes) must call invalidate(). Other attributes pass straight to
+    # the table.
+
+    def __init__(self, table, key_names, backend, ttl=DYNAMO_CACHE_TTL, negative_ttl=DYNAMO_CACHE_NEGATIVE_TTL):
+        self.table = table
+        self.key_names = key_names
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    def _cache_key(self, key):
+        return f"{self.table.name}|" + json.dumps([str(key[name]) for name in self.key_names])
+
+    def _count(self, result):
+        with self._lock:
+            self.stats[result] += 1
+
+    def get_item(self, Key, **kwargs):
+        if kwargs:
+            # consistent reads and projections always go to the table
+            self._count('bypass')
+            return self.table.get_item(Key=Key, **kwargs)
+        cache_key = self._cache_key(Key)
+        cached = self.backend.get(cache_key)
+        if cached is not None:
+            self._count('hit' if cached else 'negative_hit')
+            return cached
+        self._count('miss')
+        response = self.table.get_item(Key=Key)
+        value = {'Item': response['Item']} if 'Item' in response else {}
+        self.backend.set(cache_key, value, self.ttl if value else self.negative_ttl)
+        return response
+
+    def put_item(self, **kwargs):
+        try:
+            return self.table.put_item(**kwargs)
+        finally:
+            self.invalidate({name: kwargs['Item'][name] for name in self.key_names})
+
+    def update_item(self, **kwargs):
+        try:
+            return self.table.update_item(**kwargs)
+        finally:
+            self.invalidate(kwargs['Key'])
+
+    def delete_item(self, **kwargs):
+        try:
+            return self.table.delete_item(**kwargs)
+        finally:
+            self.invalidate(kwargs['Key'])
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self.backend.delete(self._cache_key(key))
+
+
+def cache_backend_from_env():
+    if DYNAMO_CACHE == 'off':
+        return NullCacheBackend()
+    if DYNAMO_CACHE == 'redis':
+        import redis
+        return RedisCacheBackend(redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0')))
+    return LocalCacheBackend()
+
+
+def cache_metrics(*tables):
+    lines = ['# HELP dynamodb_cache_requests_total get_item calls by cache result',
+             '# TYPE dynamodb_cache_requests_total counter']
+    for table in tables:
+        with table._lock:
+            stats = sorted(table.stats.items())
+        for result, count in stats:
+            lines.append(f'dynamodb_cache_requests_total{{table="{table.table.name}",result="{result}"}} {count}')
+    return lines
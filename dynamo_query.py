@@ -0,0 +1,95 @@
+import base64
+import json
+from boto3.dynamodb.conditions import Key
+
+ENTITY_INDEX = 'GSI1'
+PAGE_SIZE = 50
+
+
+def encode_cursor(last_key):
+    return base64.urlsafe_b64encode(json.dumps(last_key, sort_keys=True).encode()).decode()
+
+
+def decode_cursor(cursor, key_names):
+    # ValueError for anything that is not a key with exactly these attributes,
+    # so a tampered cursor is refused before it reaches DynamoDB
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(key, dict) or set(key) != set(key_names) or not all(isinstance(v, str) for v in key.values()):
+        raise ValueError("Invalid cursor.")
+    return key
+
+
+def entity_keys(entity, sort_key):
+    return {'GSI1PK': entity, 'GSI1SK': sort_key}
+
+
+class EntityPage:
+    # Lazily queries one page of an entity type from the GSI1 index, asking
+    # DynamoDB for no more rows than are still needed. next_cursor is set once
+    # the page has been iterated, so templates can render it after the loop.
+    # A bad cursor raises ValueError here rather than mid-iteration.
+
+    def __init__(self, table, entity, limit=PAGE_SIZE, cursor=None, sort_prefix=None,
+                 newest_first=False, index_name=ENTITY_INDEX, partition_key='GSI1PK', sort_key='GSI1SK'):
+        self.table = table
+        self.entity = entity
+        self.limit = limit
+        self.cursor = cursor
+        self.sort_prefix = sort_prefix
+        self.newest_first = newest_first
+        self.index_name = index_name
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self.next_cursor = None
+        self.start_key = decode_cursor(cursor, {'PK', 'SK', partition_key, sort_key}) if cursor else None
+
+    def __iter__(self):
+        condition = Key(self.partition_key).eq(self.entity)
+        if self.sort_prefix:
+            condition = condition & Key(self.sort_key).begins_with(self.sort_prefix)
+        kwargs = {
+            'KeyConditionExpression': condition,
+            'ScanIndexForward': not self.newest_first,
+        }
+        if self.index_name:
+            kwargs['IndexName'] = self.index_name
+        if self.start_key:
+            kwargs['ExclusiveStartKey'] = self.start_key
+
+        remaining = self.limit
+        while remaining > 0:
+            response = self.table.query(Limit=remaining, **kwargs)
+            items = response.get('Items', [])
+            remaining -= len(items)
+            yield from items
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return
+            kwargs['ExclusiveStartKey'] = last_key
+        self.next_cursor = encode_cursor(last_key)
+
+
+def entity_range(table, entity, start=None, end=None, index_name=ENTITY_INDEX, page_size=500,
+                 partition_key='GSI1PK', sort_key='GSI1SK'):
+    # Yields every item of an entity type whose sort key falls in
+    # [start, end), one Query page at a time, so only the current page is held.
+    condition = Key(partition_key).eq(entity)
+    if start and end:
+        condition = condition & Key(sort_key).between(start, end)
+    elif start:
+        condition = condition & Key(sort_key).gte(start)
+    elif end:
+        condition = condition & Key(sort_key).lt(end)
+    kwargs = {'KeyConditionExpression': condition, 'Limit': page_size}
+    if index_name:
+        kwargs['IndexName'] = index_name
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get('Items', []):
+            # between() is inclusive; keys equal to `end` itself are dropped here
+            if end is None or item[sort_key] < end:
+                yield item
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
@@ -0,0 +1,112 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from dynamo_batch import batch_write
+from dynamo_query import entity_range
+
+# Rollups live in three partitions keyed by day, so a report is three range
+# queries whatever the order volume:
+#   SALES#DAY       <day>
+#   SALES#PRODUCT   <day>#<product_id>
+#   SALES#CATEGORY  <day>#<category>
+SALES_DAY, SALES_PRODUCT, SALES_CATEGORY = 'SALES#DAY', 'SALES#PRODUCT', 'SALES#CATEGORY'
+TOP_PRODUCTS = 10
+
+
+def _partition(table, partition, start=None, end=None):
+    return entity_range(table, partition, start, end, index_name=None, partition_key='PK', sort_key='SK')
+
+
+def sales_rollups(orders, category_of=None):
+    # Folds orders into rollup items. Each order adds one to order_count on
+    # every rollup it touches, so nothing per order is kept.
+    category_of = category_of or (lambda line: line.get('category'))
+    rollups = {}
+    for order in orders:
+        day = order['timestamp'][:10]
+        touched = set()
+        for line in order.get('items', []):
+            quantity = int(line.get('quantity', 0))
+            revenue = Decimal(str(line.get('price', 0))) * quantity
+            category = category_of(line) or ''
+            keys = [((SALES_DAY, day), {}),
+                    ((SALES_CATEGORY, f'{day}#{category}'), {'category': category})]
+            if line.get('product_id'):
+                keys.append(((SALES_PRODUCT, f"{day}#{line['product_id']}"),
+                             {'product_id': line['product_id'], 'name': line.get('name')}))
+            for key, attributes in keys:
+                item = rollups.setdefault(key, dict(PK=key[0], SK=key[1], day=day, order_count=0,
+                                                    units=0, revenue=Decimal(0), **attributes))
+                item['units'] += quantity
+                item['revenue'] += revenue
+                touched.add(key)
+        for key in touched:
+            rollups[key]['order_count'] += 1
+    return list(rollups.values())
+
+
+def record_order_sales(table, order):
+    # ADD keeps concurrent checkouts from overwriting each other's totals.
+    for item in sales_rollups([order]):
+        attributes = {name: value for name, value in item.items()
+                      if name not in ('PK', 'SK', 'order_count', 'units', 'revenue')}
+        table.update_item(
+            Key={'PK': item['PK'], 'SK': item['SK']},
+            UpdateExpression='ADD order_count :orders, units :units, revenue :revenue SET ' +
+                             ', '.join(f'#{name} = :{name}' for name in attributes),
+            ExpressionAttributeNames={f'#{name}': name for name in attributes},
+            ExpressionAttributeValues={':orders': item['order_count'], ':units': item['units'],
+                                       ':revenue': item['revenue'],
+                                       **{f':{name}': value for name, value in attributes.items()}}
+        )
+
+
+def rebuild_sales_rollups(table):
+    for partition in (SALES_DAY, SALES_PRODUCT, SALES_CATEGORY):
+        batch_write(table, deletes=[{'PK': item['PK'], 'SK': item['SK']}
+                                    for item in _partition(table, partition)])
+    categories = {}
+
+    def category_of(line):
+        # orders placed before carts carried the category look it up once per product
+        if line.get('category') is not None or not line.get('product_id'):
+            return line.get('category')
+        product_id = line['product_id']
+        if product_id not in categories:
+            product = table.get_item(Key={'PK': f'PRODUCT#{product_id}', 'SK': 'DETAILS'}).get('Item')
+            categories[product_id] = (product or {}).get('category')
+        return categories[product_id]
+
+    orders = (order for order in entity_range(table, 'ORDER')
+              if order.get('status') != 'Cancelled' and order.get('timestamp'))
+    rollups = sales_rollups(orders, category_of)
+    batch_write(table, puts=rollups)
+    return sum(1 for item in rollups if item['PK'] == SALES_DAY)
+
+
+def sales_report(table, start, end):
+    # start/end are dates, end exclusive; reads only the rollup partitions
+    start_key, end_key = start.isoformat(), end.isoformat()
+    days = list(_partition(table, SALES_DAY, start_key, end_key))
+    products = defaultdict(lambda: {'order_count': 0, 'units': 0, 'revenue': Decimal(0)})
+    for item in _partition(table, SALES_PRODUCT, start_key, end_key):
+        product = products[item['product_id']]
+        product.update(product_id=item['product_id'], name=item.get('name'))
+        for name in ('order_count', 'units', 'revenue'):
+            product[name] += item[name]
+    categories = defaultdict(lambda: {'order_count': 0, 'units': 0, 'revenue': Decimal(0)})
+    for item in _partition(table, SALES_CATEGORY, start_key, end_key):
+        category = categories[item['category']]
+        category['category'] = item['category']
+        for name in ('order_count', 'units', 'revenue'):
+            category[name] += item[name]
+    return {
+        'start': start,
+        'end': end - timedelta(days=1),
+        'days': days,
+        'top_products': sorted(products.values(), key=lambda row: row['revenue'], reverse=True)[:TOP_PRODUCTS],
+        'categories': sorted(categories.values(), key=lambda row: row['revenue'], reverse=True),
+        'order_count': sum(day['order_count'] for day in days),
+        'units': sum(day['units'] for day in days),
+        'revenue': sum(day['revenue'] for day in days),
+    }
@@ -0,0 +1,83 @@
+import time
+from botocore.exceptions import ClientError
+from dynamo_batch import batch_write
+from dynamo_query import entity_keys, entity_range
+
+# One item per session:
+#   PK SESSION#<id>  SK DETAILS  GSI1PK SESSIONS#<user_id>  GSI1SK <id>
+# expires_at (epoch seconds) is the table's TTL attribute, so DynamoDB deletes
+# expired sessions itself; reads check it too, as that deletion can lag.
+SESSION_TTL_ATTRIBUTE = 'expires_at'
+
+
+def _key(sid):
+    return {'PK': f'SESSION#{sid}', 'SK': 'DETAILS'}
+
+
+def _is_condition_failure(error):
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+class DynamoSessionStore:
+
+    def __init__(self, table):
+        self.table = table
+
+    def load(self, sid):
+        # consistent, so a session written a moment ago by another worker is seen
+        item = self.table.get_item(Key=_key(sid), ConsistentRead=True).get('Item')
+        if item is None:
+            return None
+        return item['data'], int(item['version']), int(item[SESSION_TTL_ATTRIBUTE])
+
+    def create(self, sid, user_id, data, expires_at):
+        item = dict(_key(sid), data=data, version=1, **{SESSION_TTL_ATTRIBUTE: expires_at})
+        if user_id is not None:
+            item.update(entity_keys(f'SESSIONS#{user_id}', sid), user_id=user_id)
+        self.table.put_item(Item=item, ConditionExpression='attribute_not_exists(PK)')
+
+    def update(self, sid, data, expires_at, version):
+        # Only sessions that still exist at the version the writer read, so a
+        # revoked one stays revoked and a newer write is not overwritten. The
+        # user never changes: a different user gets a new session id.
+        try:
+            response = self.table.update_item(
+                Key=_key(sid),
+                UpdateExpression='SET #data = :data, #expires = :expires ADD version :one',
+                ConditionExpression='attribute_exists(PK) AND #expires > :now AND version = :seen',
+                ExpressionAttributeNames={'#data': 'data', '#expires': SESSION_TTL_ATTRIBUTE},
+                ExpressionAttributeValues={':data': data, ':expires': expires_at, ':one': 1,
+                                           ':now': int(time.time()), ':seen': version},
+                ReturnValues='UPDATED_NEW'
+            )
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+            return None
+        return int(response['Attributes']['version'])
+
+    def touch(self, sid, expires_at):
+        try:
+            self.table.update_item(
+                Key=_key(sid),
+                UpdateExpression='SET #expires = :expires',
+                ConditionExpression='attribute_exists(PK) AND #expires > :now',
+                ExpressionAttributeNames={'#expires': SESSION_TTL_ATTRIBUTE},
+                ExpressionAttributeValues={':expires': expires_at, ':now': int(time.time())}
+            )
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+            return False
+        return True
+
+    def delete(self, sid):
+        self.table.delete_item(Key=_key(sid))
+
+    def revoke_user(self, user_id):
+        # GSI1 is eventually consistent: a session created a moment ago can be
+        # missed, so run it again if the user is still signing in
+        keys = [{'PK': item['PK'], 'SK': item['SK']}
+                for item in entity_range(self.table, f'SESSIONS#{user_id}')]
+        batch_write(self.table, deletes=keys)
+        return len(keys)
@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+ORDER_EXPORT_FIELDS = ('order_id', 'user_id', 'email', 'status', 'total', 'timestamp')
+SALES_EXPORT_FIELDS = ('order_id', 'timestamp', 'status', 'product_id', 'name', 'category',
+                       'quantity', 'price', 'line_total')
+# Rows are buffered up to this many bytes before a chunk is sent.
+CHUNK_SIZE = 64 * 1024
+REPORT_DAYS = 30
+
+
+def parse_date_range(args):
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD, both days included. Returns naive UTC
+    # datetimes [start, end) or None for an open side; bad dates raise ValueError.
+    start = args.get('from') or None
+    end = args.get('to') or None
+    if start is not None:
+        start = datetime.combine(date.fromisoformat(start), time.min)
+    if end is not None:
+        end = datetime.combine(date.fromisoformat(end), time.min) + timedelta(days=1)
+    return start, end
+
+
+def report_range(args):
+    # The same range as dates, [start, end), defaulting to the last REPORT_DAYS days.
+    start, end = parse_date_range(args)
+    end = end.date() if end else datetime.utcnow().date() + timedelta(days=1)
+    start = start.date() if start else end - timedelta(days=REPORT_DAYS)
+    return start, end
+
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+def encode_csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([row.get(field) for field in fields])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def encode_ndjson(rows, fields):
+    chunk, size = [], 0
+    for row in rows:
+        line = json.dumps({field: row.get(field) for field in fields}, default=json_value) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(chunk).encode()
+            chunk, size = [], 0
+    yield ''.join(chunk).encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(rows, fields, name, export_format='csv', compress=None):
+    # Streams `rows` (an iterator of dicts) as a file download. Only one chunk
+    # is held at a time, so memory stays flat however many rows there are.
+    # compress=gzip produces a .gz file, compressed while it streams.
+    if export_format not in EXPORT_FORMATS or compress not in (None, 'gzip'):
+        raise ValueError(export_format if compress is None else compress)
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    encode = encode_csv if export_format == 'csv' else encode_ndjson
+    chunks = encode(rows, fields)
+    filename = f'{name}.{extension}'
+    if compress == 'gzip':
+        chunks = gzip_chunks(chunks)
+        mimetype, filename = 'application/gzip', f'{filename}.gz'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,56 @@
+import inspect
+from collections import namedtuple
+from functools import wraps
+from flask import g, has_app_context, session, redirect, url_for
+from cache import TTLCache
+
+CurrentUser = namedtuple('CurrentUser', ['id', 'username', 'email', 'is_admin'])
+
+
+class Identity:
+    # Loads the signed-in user at most once per request into flask.g, backed by
+    # a per-process TTL/LRU cache keyed by user id. loader(user_id) returns a
+    # CurrentUser or None; call invalidate() whenever a profile changes.
+
+    def __init__(self, loader, maxsize=1024, ttl=60):
+        self.loader = loader
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def current_user(self):
+        if 'current_user' not in g:
+            user_id = session.get('user_id')
+            g.current_user = self._load(user_id) if user_id is not None else None
+        return g.current_user
+
+    def _load(self, user_id):
+        user = self.cache.get(user_id)
+        if user is None:
+            user = self.loader(user_id)
+            if user is not None:
+                self.cache.set(user_id, user)
+        return user
+
+    def remember(self, user):
+        self.cache.set(user.id, user)
+        g.current_user = user
+
+    def invalidate(self, user_id):
+        self.cache.delete(user_id)
+        if has_app_context() and g.get('current_user') is not None and g.current_user.id == user_id:
+            g.pop('current_user')
+
+    def login_required(self, f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def decorated_coroutine(*args, **kwargs):
+                if 'user_id' not in session:
+                    return redirect(url_for('login'))
+                return await f(*args, **kwargs)
+            return decorated_coroutine
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if 'user_id' not in session:
+                return redirect(url_for('login'))
+            return f(*args, **kwargs)
+        return decorated_function
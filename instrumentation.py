@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, abort, before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CALL_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+
+class RequestTimings:
+    # One per request. Async views run their reads on pool threads that share
+    # it (see concurrency.gather_reads), so the counters are updated under a lock.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        self.aws_calls = 0
+        self.aws_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_started = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add_db_statement(self, seconds):
+        with self.lock:
+            self.db_statements += 1
+            self.db_seconds += seconds
+
+    def add_aws_call(self, seconds):
+        with self.lock:
+            self.aws_calls += 1
+            self.aws_seconds += seconds
+
+    def server_timing(self, sql, aws):
+        # Streamed pages render after the headers are sent, so their render
+        # time only shows up in the metrics and the slow-request log.
+        parts = []
+        if sql:
+            parts.append(f'db;desc="{self.db_statements} statements";dur={self.db_seconds * 1000:.1f}')
+        if aws:
+            parts.append(f'aws;desc="{self.aws_calls} calls";dur={self.aws_seconds * 1000:.1f}')
+        if self.render_seconds:
+            parts.append(f'render;dur={self.render_seconds * 1000:.1f}')
+        parts.append(f'app;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def current_timings():
+    return g.get('request_timings') if has_app_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timings() is not None:
+        conn.info['instrumentation_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    started = conn.info.pop('instrumentation_started', None)
+    if timings is not None and started is not None:
+        timings.add_db_statement(time.perf_counter() - started)
+
+
+def _before_aws_call(context, **kwargs):
+    if current_timings() is not None:
+        context['instrumentation_started'] = time.perf_counter()
+
+
+def _after_aws_call(context, **kwargs):
+    timings = current_timings()
+    started = context.pop('instrumentation_started', None)
+    if timings is not None and started is not None:
+        timings.add_aws_call(time.perf_counter() - started)
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts = self.series.setdefault(labels, [0] * (len(self.buckets) + 2))
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def render(self, label_names):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: list(counts) for labels, counts in self.series.items()}
+        for labels, counts in sorted(series.items()):
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {counts[-1]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+class Instrumentation:
+    # Per-request SQL statement counts (engine events), boto3 call timing
+    # (botocore hooks, see watch_client) and template render time. Each
+    # response gets a Server-Timing header. Requests slower than slow_ms are
+    # logged as JSON, and /metrics serves Prometheus histograms per endpoint.
+    # Metrics are per process; scrape each gunicorn worker or aggregate upstream.
+    # Set METRICS_TOKEN to require "Authorization: Bearer <token>" on /metrics.
+
+    label_names = ('method', 'endpoint')
+
+    def __init__(self, app, sql=False, slow_ms=SLOW_REQUEST_MS):
+        self.sql = sql
+        self.aws = False
+        self.slow_ms = slow_ms
+        self.log = app.logger.getChild('slow_requests')
+        self.requests = {}
+        self.requests_lock = threading.Lock()
+        self.durations = Histogram('http_request_duration_seconds', 'Request latency', DURATION_BUCKETS)
+        self.render = Histogram('http_request_render_seconds', 'Template render time', DURATION_BUCKETS)
+        self.db = Histogram('http_request_sql_statements', 'SQL statements per request', CALL_BUCKETS)
+        self.boto = Histogram('http_request_aws_calls', 'AWS API calls per request', CALL_BUCKETS)
+        self.collectors = []
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    def add_collector(self, collect):
+        # collect() returns extra Prometheus text lines for /metrics
+        self.collectors.append(collect)
+
+    def watch_client(self, client):
+        self.aws = True
+        client.meta.events.register('before-call', _before_aws_call, unique_id='instrumentation-before-call')
+        client.meta.events.register('after-call', _after_aws_call, unique_id='instrumentation-after-call')
+
+    def _start(self):
+        g.request_timings = RequestTimings()
+
+    def _render_started(self, sender, template, context, **extra):
+        timings = current_timings()
+        if timings is not None:
+            timings.render_started = time.perf_counter()
+
+    def _render_finished(self, sender, template, context, **extra):
+        timings = current_timings()
+        if timings is not None and timings.render_started is not None:
+            timings.render_seconds += time.perf_counter() - timings.render_started
+            timings.render_started = None
+
+    def _finish(self, response):
+        timings = current_timings()
+        if timings is None or request.endpoint == 'metrics':
+            return response
+        response.headers['Server-Timing'] = timings.server_timing(self.sql, self.aws)
+        details = (request.method, request.endpoint or 'unmatched', request.path, response.status_code)
+        if response.is_streamed:
+            response.call_on_close(lambda: self._record(timings, *details))
+        else:
+            self._record(timings, *details)
+        return response
+
+    def _record(self, timings, method, endpoint, path, status):
+        duration = timings.elapsed()
+        labels = (method, endpoint)
+        with self.requests_lock:
+            key = labels + (str(status),)
+            self.requests[key] = self.requests.get(key, 0) + 1
+        self.durations.observe(labels, duration)
+        self.render.observe(labels, timings.render_seconds)
+        if self.sql:
+            self.db.observe(labels, timings.db_statements)
+        if self.aws:
+            self.boto.observe(labels, timings.aws_calls)
+
+        if duration * 1000 >= self.slow_ms:
+            self.log.warning('slow request %s', json.dumps({
+                'method': method,
+                'path': path,
+                'endpoint': endpoint,
+                'status': status,
+                'duration_ms': round(duration * 1000, 1),
+                'db_statements': timings.db_statements,
+                'db_ms': round(timings.db_seconds * 1000, 1),
+                'aws_calls': timings.aws_calls,
+                'aws_ms': round(timings.aws_seconds * 1000, 1),
+                'render_ms': round(timings.render_seconds * 1000, 1),
+            }))
+
+    def metrics(self):
+        token = os.environ.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+        lines = ['# HELP http_requests_total Requests handled', '# TYPE http_requests_total counter']
+        with self.requests_lock:
+            requests = sorted(self.requests.items())
+        for (method, endpoint, status), count in requests:
+            lines.append(f'http_requests_total{{method="{method}",endpoint="{endpoint}",status="{status}"}} {count}')
+        histograms = [self.durations, self.render]
+        if self.sql:
+            histograms.append(self.db)
+        if self.aws:
+            histograms.append(self.boto)
+        for histogram in histograms:
+            lines += histogram.render(self.label_names)
+        for collect in self.collectors:
+            lines += collect()
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
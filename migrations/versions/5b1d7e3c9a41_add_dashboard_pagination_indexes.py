@@ -0,0 +1,36 @@
+"""Add dashboard pagination indexes
+
+Revision ID: 5b1d7e3c9a41
+Revises: 37f0432c2a5e
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1d7e3c9a41'
+down_revision = '37f0432c2a5e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_order_status_timestamp_id', ['status', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_order_user_id_timestamp_id', ['user_id', 'timestamp', 'id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_is_admin_id', ['is_admin', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_is_admin_id')
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_user_id_timestamp_id')
+        batch_op.drop_index('ix_order_status_timestamp_id')
+        batch_op.drop_index('ix_order_timestamp_id')
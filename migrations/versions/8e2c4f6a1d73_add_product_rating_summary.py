@@ -0,0 +1,49 @@
+"""Add product rating summary
+
+Revision ID: 8e2c4f6a1d73
+Revises: 5b1d7e3c9a41
+Create Date: 2026-10-17 10:03:27.542911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2c4f6a1d73'
+down_revision = '5b1d7e3c9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_rating_summary',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('stars_1', sa.Integer(), nullable=False),
+    sa.Column('stars_2', sa.Integer(), nullable=False),
+    sa.Column('stars_3', sa.Integer(), nullable=False),
+    sa.Column('stars_4', sa.Integer(), nullable=False),
+    sa.Column('stars_5', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    # backfill from the existing ratings
+    op.execute("""
+        INSERT INTO product_rating_summary
+            (product_id, rating_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+        SELECT product_id, COUNT(id), SUM(stars),
+               SUM(CASE WHEN stars = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN stars = 2 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN stars = 3 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN stars = 4 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN stars = 5 THEN 1 ELSE 0 END)
+        FROM rating
+        WHERE product_id IS NOT NULL AND stars BETWEEN 1 AND 5
+        GROUP BY product_id
+    """)
+
+
+def downgrade():
+    op.drop_table('product_rating_summary')
@@ -0,0 +1,47 @@
+"""Require order status and add order status history
+
+Revision ID: a7d4e2b9c6f1
+Revises: f3a8c6d1b294
+Create Date: 2026-10-17 23:41:27.603518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e2b9c6f1'
+down_revision = 'f3a8c6d1b294'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE \"order\" SET status = 'Placed' WHERE status IS NULL")
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(length=50), nullable=False,
+                              server_default='Placed')
+
+    op.create_table('order_status_change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('from_status', sa.String(length=50), nullable=False),
+    sa.Column('to_status', sa.String(length=50), nullable=False),
+    sa.Column('changed_by', sa.Integer(), nullable=True),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['changed_by'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['order_id'], ['order.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('order_status_change', schema=None) as batch_op:
+        batch_op.create_index('ix_order_status_change_order_id_id', ['order_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order_status_change', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_status_change_order_id_id')
+
+    op.drop_table('order_status_change')
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(length=50), nullable=True,
+                              server_default=None)
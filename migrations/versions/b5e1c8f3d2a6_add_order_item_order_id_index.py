@@ -0,0 +1,26 @@
+"""Add order item order_id index
+
+Revision ID: b5e1c8f3d2a6
+Revises: a7d4e2b9c6f1
+Create Date: 2026-10-18 00:27:53.914062
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1c8f3d2a6'
+down_revision = 'a7d4e2b9c6f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.create_index('ix_order_item_order_id_id', ['order_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_item_order_id_id')
@@ -0,0 +1,28 @@
+"""Add product catalog indexes
+
+Revision ID: c47a2e9b8f15
+Revises: 8e2c4f6a1d73
+Create Date: 2026-10-17 11:26:05.304772
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a2e9b8f15'
+down_revision = '8e2c4f6a1d73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_name'), ['name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_category'), ['category'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_category'))
+        batch_op.drop_index(batch_op.f('ix_product_name'))
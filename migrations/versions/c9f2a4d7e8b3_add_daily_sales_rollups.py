@@ -0,0 +1,75 @@
+"""Add daily sales rollups
+
+Revision ID: c9f2a4d7e8b3
+Revises: b5e1c8f3d2a6
+Create Date: 2026-10-18 01:14:06.287431
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f2a4d7e8b3'
+down_revision = 'b5e1c8f3d2a6'
+branch_labels = None
+depends_on = None
+
+SALES_FROM = """
+        FROM "order" JOIN order_item ON order_item.order_id = "order".id
+        LEFT OUTER JOIN product ON product.id = order_item.product_id
+        WHERE "order".status != 'Cancelled' AND "order".timestamp IS NOT NULL
+"""
+SALES_COUNTERS = """
+        COUNT(DISTINCT "order".id), SUM(order_item.quantity), SUM(order_item.quantity * order_item.price)
+"""
+
+
+def upgrade():
+    op.create_table('daily_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('daily_product_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+    op.create_table('daily_category_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'category')
+    )
+    # backfill from the existing orders
+    op.execute(f"""
+        INSERT INTO daily_sales (day, order_count, units, revenue)
+        SELECT date("order".timestamp), {SALES_COUNTERS} {SALES_FROM}
+        GROUP BY date("order".timestamp)
+    """)
+    op.execute(f"""
+        INSERT INTO daily_product_sales (day, product_id, order_count, units, revenue)
+        SELECT date("order".timestamp), order_item.product_id, {SALES_COUNTERS} {SALES_FROM}
+          AND order_item.product_id IS NOT NULL
+        GROUP BY date("order".timestamp), order_item.product_id
+    """)
+    op.execute(f"""
+        INSERT INTO daily_category_sales (day, category, order_count, units, revenue)
+        SELECT date("order".timestamp), COALESCE(product.category, ''), {SALES_COUNTERS} {SALES_FROM}
+        GROUP BY date("order".timestamp), COALESCE(product.category, '')
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_category_sales')
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_sales')
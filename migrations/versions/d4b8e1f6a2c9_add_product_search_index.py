@@ -0,0 +1,57 @@
+"""Add product full-text search index
+
+Revision ID: d4b8e1f6a2c9
+Revises: c9f2a4d7e8b3
+Create Date: 2026-10-18 02:03:41.550218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e1f6a2c9'
+down_revision = 'c9f2a4d7e8b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 is SQLite-only; other databases use the in-process index
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+            name, description, category, content='product', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON product BEGIN
+            INSERT INTO product_search(rowid, name, description, category)
+            VALUES (new.id, new.name, new.description, new.category);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON product BEGIN
+            INSERT INTO product_search(product_search, rowid, name, description, category)
+            VALUES ('delete', old.id, old.name, old.description, old.category);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS product_search_update AFTER UPDATE OF name, description, category ON product BEGIN
+            INSERT INTO product_search(product_search, rowid, name, description, category)
+            VALUES ('delete', old.id, old.name, old.description, old.category);
+            INSERT INTO product_search(rowid, name, description, category)
+            VALUES (new.id, new.name, new.description, new.category);
+        END
+    """)
+    op.execute("INSERT INTO product_search(product_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS product_search_update")
+    op.execute("DROP TRIGGER IF EXISTS product_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS product_search_insert")
+    op.execute("DROP TABLE IF EXISTS product_search")
@@ -0,0 +1,39 @@
+"""Add unique cart item user/product index
+
+Revision ID: e19b5d2a7c60
+Revises: c47a2e9b8f15
+Create Date: 2026-10-17 13:41:52.870316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e19b5d2a7c60'
+down_revision = 'c47a2e9b8f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # merge duplicate lines into the oldest one before enforcing uniqueness
+    op.execute("""
+        UPDATE cart_item
+        SET quantity = (SELECT SUM(c2.quantity) FROM cart_item c2
+                        WHERE c2.user_id = cart_item.user_id
+                          AND c2.product_id = cart_item.product_id)
+        WHERE id IN (SELECT MIN(id) FROM cart_item
+                     GROUP BY user_id, product_id HAVING COUNT(*) > 1)
+    """)
+    op.execute("""
+        DELETE FROM cart_item
+        WHERE id NOT IN (SELECT MIN(id) FROM cart_item GROUP BY user_id, product_id)
+    """)
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.create_index('ix_cart_item_user_id_product_id', ['user_id', 'product_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_cart_item_user_id_product_id')
@@ -0,0 +1,43 @@
+"""Add row versions to products, cart items and orders
+
+Revision ID: e6a3f9c1d7b4
+Revises: d4b8e1f6a2c9
+Create Date: 2026-10-18 03:14:52.318406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a3f9c1d7b4'
+down_revision = 'd4b8e1f6a2c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    # A batch rebuild of product would drop the search index triggers, and
+    # SQLite (3.35+) can drop the column in place.
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ALTER TABLE product DROP COLUMN version')
+    else:
+        with op.batch_alter_table('product', schema=None) as batch_op:
+            batch_op.drop_column('version')
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,49 @@
+"""Deduplicate ratings and add unique user/order/product index
+
+Revision ID: f3a8c6d1b294
+Revises: e19b5d2a7c60
+Create Date: 2026-10-17 22:58:04.512887
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c6d1b294'
+down_revision = 'e19b5d2a7c60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keep the latest rating for each user/order/product
+    op.execute("""
+        DELETE FROM rating
+        WHERE user_id IS NOT NULL AND order_id IS NOT NULL AND product_id IS NOT NULL
+          AND id NOT IN (SELECT MAX(id) FROM rating GROUP BY user_id, order_id, product_id)
+    """)
+    with op.batch_alter_table('rating', schema=None) as batch_op:
+        batch_op.create_index('ix_rating_user_id_order_id_product_id',
+                              ['user_id', 'order_id', 'product_id'], unique=True)
+
+    # the summaries counted the duplicates, so rebuild them from what is left
+    op.execute("DELETE FROM product_rating_summary")
+    op.execute("""
+        INSERT INTO product_rating_summary
+            (product_id, rating_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+        SELECT product_id, COUNT(id), SUM(stars),
+               SUM(CASE WHEN stars = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN stars = 2 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN stars = 3 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN stars = 4 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN stars = 5 THEN 1 ELSE 0 END)
+        FROM rating
+        WHERE product_id IS NOT NULL AND stars BETWEEN 1 AND 5
+        GROUP BY product_id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('rating', schema=None) as batch_op:
+        batch_op.drop_index('ix_rating_user_id_order_id_product_id')
@@ -0,0 +1,39 @@
+"""Add server-side session store
+
+Revision ID: f8d2b6a4c1e7
+Revises: e6a3f9c1d7b4
+Create Date: 2026-10-18 04:02:37.841925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8d2b6a4c1e7'
+down_revision = 'e6a3f9c1d7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_session',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('user_session', schema=None) as batch_op:
+        batch_op.create_index('ix_user_session_expires_at', ['expires_at'], unique=False)
+        batch_op.create_index('ix_user_session_user_id', ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_session', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_session_user_id')
+        batch_op.drop_index('ix_user_session_expires_at')
+
+    op.drop_table('user_session')
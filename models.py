@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
 
 db = SQLAlchemy()
 
@@ -10,33 +12,67 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_user_is_admin_id', 'is_admin', 'id'),
+    )
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120))
+    name = db.Column(db.String(120), index=True)
     description = db.Column(db.String(500))
     price = db.Column(db.Integer)
-    category = db.Column(db.String(50))
+    category = db.Column(db.String(50), index=True)
     stock = db.Column(db.Integer)
+    # Row version for the API's ETags. ORM updates bump it (see
+    # bump_row_version); bulk UPDATE statements must bump it themselves.
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     ratings = db.relationship('Rating', backref='product')
+    rating_summary = db.relationship('ProductRatingSummary', uselist=False, backref='product')
 
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
     quantity = db.Column(db.Integer)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     user = db.relationship('User', backref='cart_items')
     product = db.relationship('Product')
 
+    __table_args__ = (
+        db.Index('ix_cart_item_user_id_product_id', 'user_id', 'product_id', unique=True),
+    )
+
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     total = db.Column(db.Float)
-    status = db.Column(db.String(50), default='Placed')
+    status = db.Column(db.String(50), nullable=False, default='Placed', server_default='Placed')
     address = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     user = db.relationship('User', backref='orders')
     ratings = db.relationship('Rating', backref='order')
     order_items = db.relationship('OrderItem', backref='order')
+    status_changes = db.relationship('OrderStatusChange', backref='order',
+                                     order_by='OrderStatusChange.id')
+
+    __table_args__ = (
+        db.Index('ix_order_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_order_status_timestamp_id', 'status', 'timestamp', 'id'),
+        db.Index('ix_order_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
+class OrderStatusChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    from_status = db.Column(db.String(50), nullable=False)
+    to_status = db.Column(db.String(50), nullable=False)
+    changed_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_order_status_change_order_id_id', 'order_id', 'id'),
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -46,9 +82,85 @@ class OrderItem(db.Model):
     price = db.Column(db.Float)
     product = db.relationship('Product')
 
+    __table_args__ = (
+        db.Index('ix_order_item_order_id_id', 'order_id', 'id'),
+    )
+
 class Rating(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'))
-    stars = db.Column(db.Integer)
\ No newline at end of file
+    stars = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('ix_rating_user_id_order_id_product_id', 'user_id', 'order_id', 'product_id', unique=True),
+    )
+
+
+class ProductRatingSummary(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def average(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+
+class DailySales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class DailyProductSales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class DailyCategorySales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    # '' for products without a category, so it can be part of the key
+    category = db.Column(db.String(50), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class UserSession(db.Model):
+    # server-side session data; the cookie only holds the id (see sessions.py)
+    id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    data = db.Column(db.Text, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    # epoch seconds
+    expires_at = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_user_session_user_id', 'user_id'),
+        db.Index('ix_user_session_expires_at', 'expires_at'),
+    )
+
+
+def bump_row_version(mapper, connection, target):
+    # Increments in the UPDATE itself (version = version + 1) rather than
+    # checking the version read, so concurrent writers to a row never fail
+    # over it; only the ETags need it to change.
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = type(target).version + 1
+
+
+for versioned in (Product, CartItem, Order):
+    event.listen(versioned, 'before_update', bump_row_version)
@@ -0,0 +1,127 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import delete, insert, or_, update
+from models import db, CartItem, Order, OrderItem, OrderStatusChange, Product
+from sales import record_sales, remove_orders_from_sales
+
+# Each status lists the statuses an order may move to next.
+ORDER_TRANSITIONS = {
+    'Placed': ('Packed', 'Cancelled'),
+    'Packed': ('Shipped', 'Cancelled'),
+    'Shipped': ('Delivered',),
+    'Delivered': (),
+    'Cancelled': (),
+}
+ORDER_STATUSES = tuple(ORDER_TRANSITIONS)
+MAX_BULK_STATUS_ORDERS = 1000
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class OrderStatusError(Exception):
+    pass
+
+
+def cart_lines(user_id):
+    return (db.session.query(CartItem.product_id, CartItem.quantity, Product.price, Product.name,
+                             Product.category)
+            .outerjoin(Product, Product.id == CartItem.product_id)
+            .filter(CartItem.user_id == user_id)
+            .all())
+
+
+def place_order(user_id, address):
+    lines = cart_lines(user_id)
+    quantities = Counter()
+    prices, names, categories = {}, {}, {}
+    for product_id, quantity, price, name, category in lines:
+        if price is None:
+            # the product was removed; the line is dropped with the cart
+            continue
+        quantities[product_id] += quantity
+        prices[product_id] = price
+        names[product_id] = name
+        categories[product_id] = category
+    if not quantities:
+        raise CheckoutError("Your cart is empty.")
+
+    try:
+        # Clearing the cart first opens the write transaction and makes a
+        # second submit of the same cart see nothing left to buy.
+        cleared = db.session.execute(delete(CartItem).where(CartItem.user_id == user_id))
+        if cleared.rowcount != len(lines):
+            raise CheckoutError("Your cart changed while checking out. Please try again.")
+
+        # Products are reserved in id order so concurrent checkouts take row
+        # locks in the same order. Products with no stock figure are untracked.
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            reserved = db.session.execute(
+                update(Product)
+                .where(Product.id == product_id,
+                       or_(Product.stock.is_(None), Product.stock >= quantity))
+                .values(stock=Product.stock - quantity, version=Product.version + 1)
+            )
+            if reserved.rowcount != 1:
+                raise CheckoutError(f"Sorry, {names[product_id]} is out of stock.")
+
+        total = sum(prices[product_id] * quantity for product_id, quantity in quantities.items())
+        order = Order(user_id=user_id, total=total, address=address)
+        db.session.add(order)
+        db.session.flush()
+
+        db.session.execute(insert(OrderItem), [
+            {'order_id': order.id, 'product_id': product_id, 'quantity': quantity,
+             'price': prices[product_id]}
+            for product_id, quantity in quantities.items()
+        ])
+        day = order.timestamp.date()
+        record_sales([(order.id, day, product_id, categories[product_id], quantity, prices[product_id])
+                      for product_id, quantity in quantities.items()])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return order
+
+
+def change_order_status(order_ids, status, changed_by=None):
+    # Moves the given orders to `status` with one UPDATE per status it can be
+    # reached from, so no order rows are loaded. Each UPDATE only matches rows
+    # still in that source status, so a concurrent change is never overwritten
+    # and an order can only take a valid step. The history rows for everything
+    # that moved are inserted in one batch. Returns the ids that changed.
+    if status not in ORDER_TRANSITIONS:
+        raise OrderStatusError(f"Unknown order status: {status}.")
+    order_ids = sorted(set(order_ids))
+    if len(order_ids) > MAX_BULK_STATUS_ORDERS:
+        raise OrderStatusError(f"At most {MAX_BULK_STATUS_ORDERS} orders can be updated at once.")
+    sources = [source for source, targets in ORDER_TRANSITIONS.items() if status in targets]
+    if not order_ids or not sources:
+        return []
+
+    changed_at = datetime.utcnow()
+    history = []
+    try:
+        for source in sources:
+            moved = db.session.execute(
+                update(Order)
+                .where(Order.id.in_(order_ids), Order.status == source)
+                .values(status=status, version=Order.version + 1)
+                .returning(Order.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            history.extend({'order_id': order_id, 'from_status': source, 'to_status': status,
+                            'changed_by': changed_by, 'changed_at': changed_at}
+                           for order_id in moved)
+        if history:
+            db.session.execute(insert(OrderStatusChange), history)
+            if status == 'Cancelled':
+                remove_orders_from_sales([change['order_id'] for change in history])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return sorted(change['order_id'] for change in history)
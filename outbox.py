@@ -0,0 +1,230 @@
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+from dynamo_batch import batch_write, transact_write
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PARTITION = 'OUTBOX'
+DEAD_LETTER_PARTITION = 'OUTBOX_DEAD'
+SNS_BATCH_SIZE = 10
+# What a dispatcher counts, by record, for /metrics
+RECORD_RESULTS = ('published', 'retried', 'dead_lettered', 'claimed_elsewhere')
+# Seconds a dispatcher owns the records it claimed. One that dies mid-batch
+# leaves them to be picked up again after this.
+CLAIM_LEASE = 60
+
+
+class Outbox:
+    # Pending notifications stored in the AppData table. record() returns the
+    # item so callers can put it in the same transaction as the change that
+    # caused it.
+
+    def __init__(self, table, partition=OUTBOX_PARTITION, dead_letter_partition=DEAD_LETTER_PARTITION):
+        self.table = table
+        self.partition = partition
+        self.dead_letter_partition = dead_letter_partition
+
+    def record(self, topic_arn, subject, message):
+        now = datetime.utcnow().isoformat()
+        return {
+            'PK': self.partition,
+            'SK': f'{now}#{uuid.uuid4()}',
+            'topic_arn': topic_arn,
+            'subject': subject,
+            'message': message,
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now
+        }
+
+    def pending(self, limit):
+        # Limit applies before the filter, so records still backing off can
+        # fill a page; pages are followed until `limit` due records are found.
+        kwargs = {
+            'KeyConditionExpression': Key('PK').eq(self.partition),
+            'FilterExpression': Attr('next_attempt_at').lte(datetime.utcnow().isoformat()),
+        }
+        records = []
+        while len(records) < limit:
+            response = self.table.query(Limit=limit, **kwargs)
+            records.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return records[:limit]
+
+    def claim(self, records, lease=CLAIM_LEASE):
+        # Moves each record's next attempt `lease` seconds out, conditioned on
+        # the value it was read with. When several dispatchers run (a thread
+        # per web worker), only the one whose update lands publishes it.
+        until = (datetime.utcnow() + timedelta(seconds=lease)).isoformat()
+        claimed = []
+        for record in records:
+            try:
+                self.table.update_item(
+                    Key={'PK': record['PK'], 'SK': record['SK']},
+                    UpdateExpression='SET next_attempt_at = :until',
+                    ConditionExpression='next_attempt_at = :seen',
+                    ExpressionAttributeValues={':until': until, ':seen': record['next_attempt_at']}
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                continue
+            claimed.append(record)
+        return claimed
+
+    def complete(self, records):
+        batch_write(self.table, deletes=[{'PK': r['PK'], 'SK': r['SK']} for r in records])
+
+    def retry_later(self, record, error, delay):
+        self.table.update_item(
+            Key={'PK': record['PK'], 'SK': record['SK']},
+            UpdateExpression='SET attempts = attempts + :one, next_attempt_at = :next, last_error = :error',
+            ExpressionAttributeValues={
+                ':one': 1,
+                ':next': (datetime.utcnow() + timedelta(seconds=delay)).isoformat(),
+                ':error': str(error)[:1000]
+            }
+        )
+
+    def dead_letter(self, record, error):
+        dead = dict(record, PK=self.dead_letter_partition, attempts=record['attempts'] + 1,
+                    last_error=str(error)[:1000])
+        transact_write(self.table, [
+            {'Put': {'Item': dead}},
+            {'Delete': {'Key': {'PK': record['PK'], 'SK': record['SK']}}}
+        ])
+
+
+class SnsPublisher:
+    def __init__(self, client):
+        self.client = client
+
+    def publish_batch(self, topic_arn, records):
+        # Returns {record SK: error} for the entries SNS did not accept.
+        entries = [{'Id': str(i), 'Message': r['message'], 'Subject': r['subject']}
+                   for i, r in enumerate(records)]
+        response = self.client.publish_batch(TopicArn=topic_arn, PublishBatchRequestEntries=entries)
+        return {records[int(f['Id'])]['SK']: f.get('Message') or f.get('Code')
+                for f in response.get('Failed', [])}
+
+
+class InMemoryPublisher:
+    # Stand-in publisher for local runs and tests; fail_subjects makes matching
+    # records fail so retry and dead-letter handling can be exercised.
+
+    def __init__(self, fail_subjects=()):
+        self.published = []
+        self.fail_subjects = set(fail_subjects)
+
+    def publish_batch(self, topic_arn, records):
+        failed = {}
+        for record in records:
+            if record['subject'] in self.fail_subjects:
+                failed[record['SK']] = 'simulated failure'
+            else:
+                self.published.append((topic_arn, record['subject'], record['message']))
+        return failed
+
+
+class OutboxDispatcher:
+    def __init__(self, outbox, publisher, batch_size=50, max_attempts=5,
+                 base_retry_delay=5, poll_interval=1.0, claim_lease=CLAIM_LEASE):
+        self.outbox = outbox
+        self.claim_lease = claim_lease
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_retry_delay = base_retry_delay
+        self.poll_interval = poll_interval
+        # every key up front, so /metrics can read them while the thread counts
+        self.metrics = Counter(dict.fromkeys(RECORD_RESULTS + ('dispatch_errors', 'publish_batches',
+                                                               'publish_seconds', 'due'), 0))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def dispatch_once(self):
+        pending = self.outbox.pending(self.batch_size)
+        self.metrics['due'] = len(pending)
+        records = self.outbox.claim(pending, self.claim_lease)
+        self.metrics['claimed_elsewhere'] += len(pending) - len(records)
+        by_topic = {}
+        for record in records:
+            by_topic.setdefault(record['topic_arn'], []).append(record)
+
+        for topic_arn, topic_records in by_topic.items():
+            for start in range(0, len(topic_records), SNS_BATCH_SIZE):
+                batch = topic_records[start:start + SNS_BATCH_SIZE]
+                started = time.monotonic()
+                try:
+                    failed = self.publisher.publish_batch(topic_arn, batch)
+                except Exception as e:
+                    failed = {record['SK']: e for record in batch}
+                self.metrics['publish_batches'] += 1
+                self.metrics['publish_seconds'] += time.monotonic() - started
+
+                self.outbox.complete([r for r in batch if r['SK'] not in failed])
+                self.metrics['published'] += len(batch) - len(failed)
+                for record in batch:
+                    if record['SK'] in failed:
+                        self._handle_failure(record, failed[record['SK']])
+        return len(pending)
+
+    def _handle_failure(self, record, error):
+        attempts = int(record['attempts']) + 1
+        if attempts >= self.max_attempts:
+            self.outbox.dead_letter(record, error)
+            self.metrics['dead_lettered'] += 1
+        else:
+            self.outbox.retry_later(record, error, self.base_retry_delay * (2 ** (attempts - 1)))
+            self.metrics['retried'] += 1
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.dispatch_once()
+            except Exception:
+                self.metrics['dispatch_errors'] += 1
+                logger.exception("Outbox dispatch failed")
+                processed = 0
+            # keep draining while full batches come back
+            if processed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def outbox_metrics(dispatcher):
+    # Prometheus lines for an in-process dispatcher (OUTBOX_DISPATCHER=thread)
+    metrics = dict(dispatcher.metrics)
+    lines = ['# HELP outbox_records_total Outbox records by what the dispatcher did with them',
+             '# TYPE outbox_records_total counter']
+    lines += [f'outbox_records_total{{result="{result}"}} {metrics[result]}' for result in RECORD_RESULTS]
+    return lines + [
+        '# HELP outbox_dispatch_errors_total Dispatch passes that failed',
+        '# TYPE outbox_dispatch_errors_total counter',
+        f"outbox_dispatch_errors_total {metrics['dispatch_errors']}",
+        '# HELP outbox_publish_batches_total Batches sent to the publisher',
+        '# TYPE outbox_publish_batches_total counter',
+        f"outbox_publish_batches_total {metrics['publish_batches']}",
+        '# HELP outbox_publish_seconds_total Time spent publishing',
+        '# TYPE outbox_publish_seconds_total counter',
+        f"outbox_publish_seconds_total {metrics['publish_seconds']}",
+        '# HELP outbox_due_records Records due at the last poll, at most one batch',
+        '# TYPE outbox_due_records gauge',
+        f"outbox_due_records {metrics['due']}",
+    ]
@@ -0,0 +1,49 @@
+import hashlib
+import os
+from functools import wraps
+from flask import Response, make_response, request, session
+from jinja2 import FileSystemBytecodeCache
+from cache import TTLCache
+
+
+def enable_template_bytecode_cache(app):
+    # Compiled templates are kept on disk, so a fresh worker loads bytecode
+    # instead of parsing every template again. Entries are keyed on the
+    # template source, so edited templates are recompiled.
+    directory = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'jinja-cache'))
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+class PageCache:
+    # Full-page cache for pages that look the same to every signed-out visitor.
+    # Signed-in users, pending flash messages and non-GET requests always
+    # render. Cached pages carry an ETag and "no-cache", so a repeat visit
+    # revalidates and gets a 304 without rendering anything.
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.pages = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def anonymous(self, view):
+        @wraps(view)
+        def cached_view(*args, **kwargs):
+            if request.method != 'GET' or 'user_id' in session or '_flashes' in session:
+                return view(*args, **kwargs)
+            key = request.full_path
+            page = self.pages.get(key)
+            if page is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                page = (body, response.mimetype, hashlib.sha256(body).hexdigest()[:32])
+                self.pages.set(key, page)
+            body, mimetype, etag = page
+            response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return cached_view
+
+    def clear(self):
+        self.pages.clear()
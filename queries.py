@@ -0,0 +1,189 @@
+from datetime import datetime
+from functools import partial
+from sqlalchemy.orm import Session, joinedload, selectinload
+from concurrency import gather_reads
+from models import db, User, Product, Order, OrderItem
+from orders import ORDER_STATUSES
+
+PAGE_SIZE = 50
+# rows fetched per round trip by the exports; they never build a full list
+EXPORT_BATCH_SIZE = 1000
+
+
+def encode_order_cursor(order):
+    return f"{order.timestamp.isoformat()}|{order.id}"
+
+
+def decode_order_cursor(cursor):
+    timestamp, _, order_id = cursor.rpartition('|')
+    return datetime.fromisoformat(timestamp), int(order_id)
+
+
+def id_page(query, column, after=None, limit=PAGE_SIZE):
+    # Keyset page on an increasing id column: one more row than the page is
+    # fetched to know whether there is a next one, whose cursor is the last id.
+    if after:
+        query = query.filter(column > after)
+    rows = query.order_by(column).limit(limit + 1).all()
+    next_cursor = getattr(rows[limit - 1], column.key) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def products_with_avg_rating(after=None, limit=PAGE_SIZE, session=None):
+    session = session or db.session
+    query = session.query(Product).options(joinedload(Product.rating_summary))
+    products, next_cursor = id_page(query, Product.id, after, limit)
+    for product in products:
+        summary = product.rating_summary
+        product.avg_rating = summary.average if summary else None
+    return products, next_cursor
+
+
+def orders_page(status=None, customer_id=None, after=None, limit=PAGE_SIZE, session=None):
+    # newest first, keyed on (timestamp, id) so each page is an index range scan
+    session = session or db.session
+    query = session.query(Order).options(joinedload(Order.user), selectinload(Order.ratings))
+    if status:
+        query = query.filter(Order.status == status)
+    if customer_id:
+        query = query.filter(Order.user_id == customer_id)
+    if after:
+        query = query.filter(db.tuple_(Order.timestamp, Order.id) < decode_order_cursor(after))
+    orders = query.order_by(Order.timestamp.desc(), Order.id.desc()).limit(limit + 1).all()
+
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    orders = orders[:limit]
+    for order in orders:
+        # the dashboard shows the customer's name and the first rating left on each order
+        order.customer = order.user.username if order.user else order.user_id
+        order.rating = min(order.ratings, key=lambda r: r.id) if order.ratings else None
+    return orders, next_cursor
+
+
+def product_record(product):
+    return {'id': product.id, 'name': product.name, 'description': product.description,
+            'price': product.price, 'category': product.category, 'stock': product.stock}
+
+
+def products_page(category=None, after=None, limit=PAGE_SIZE):
+    query = Product.query
+    if category:
+        query = query.filter(Product.category == category)
+    return id_page(query, Product.id, after, limit)
+
+
+def order_record(order):
+    return {'id': order.id, 'status': order.status, 'total': order.total, 'timestamp': order.timestamp}
+
+
+def customer_orders_page(user_id, after=None, limit=PAGE_SIZE):
+    query = Order.query.filter(Order.user_id == user_id)
+    if after:
+        query = query.filter(db.tuple_(Order.timestamp, Order.id) < decode_order_cursor(after))
+    orders = query.order_by(Order.timestamp.desc(), Order.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
+
+def order_versions(order_id, user_id=None):
+    # The order's own version plus those of its products, whose names the
+    # detail shows. Empty when there is no such order (for this user).
+    query = (db.session.query(Order.version, OrderItem.product_id, Product.version)
+             .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+             .outerjoin(Product, Product.id == OrderItem.product_id)
+             .filter(Order.id == order_id))
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    return [tuple(row) for row in query.order_by(OrderItem.id)]
+
+
+def order_detail(order_id):
+    order = (Order.query
+             .options(selectinload(Order.order_items).joinedload(OrderItem.product),
+                      selectinload(Order.status_changes))
+             .filter(Order.id == order_id)
+             .one())
+    return dict(order_record(order), address=order.address, items=[
+        {'product_id': item.product_id, 'name': item.product.name if item.product else None,
+         'quantity': item.quantity, 'price': item.price}
+        for item in order.order_items
+    ], history=[
+        {'from_status': change.from_status, 'to_status': change.to_status, 'changed_at': change.changed_at}
+        for change in order.status_changes
+    ])
+
+
+def _in_range(query, start, end):
+    if start:
+        query = query.filter(Order.timestamp >= start)
+    if end:
+        query = query.filter(Order.timestamp < end)
+    return query
+
+
+def order_export_rows(start=None, end=None):
+    # yield_per streams through a server-side cursor where the driver has one,
+    # and plain column rows keep the session's identity map empty.
+    query = (db.session.query(Order.id, Order.user_id, User.email, Order.status,
+                              Order.total, Order.timestamp)
+             .outerjoin(User, User.id == Order.user_id))
+    query = _in_range(query, start, end).order_by(Order.timestamp, Order.id)
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        yield {'order_id': row.id, 'user_id': row.user_id, 'email': row.email, 'status': row.status,
+               'total': row.total, 'timestamp': row.timestamp}
+
+
+def sales_export_rows(start=None, end=None):
+    query = (db.session.query(Order.id, Order.timestamp, Order.status, OrderItem.product_id,
+                              Product.name, Product.category, OrderItem.quantity, OrderItem.price)
+             .join(OrderItem, OrderItem.order_id == Order.id)
+             .outerjoin(Product, Product.id == OrderItem.product_id))
+    query = _in_range(query, start, end).order_by(Order.timestamp, Order.id, OrderItem.id)
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        yield {'order_id': row.id, 'timestamp': row.timestamp, 'status': row.status,
+               'product_id': row.product_id, 'name': row.name, 'category': row.category,
+               'quantity': row.quantity, 'price': row.price,
+               'line_total': (row.price or 0) * (row.quantity or 0)}
+
+
+def users_page(is_admin, after=None, limit=PAGE_SIZE, session=None):
+    session = session or db.session
+    return id_page(session.query(User).filter(User.is_admin == is_admin), User.id, after, limit)
+
+
+async def admin_dashboard_data(args):
+    # The four reads are independent, so each runs on its own Session in the
+    # shared read pool and the page waits for the slowest one, not their sum.
+    # Everything the template touches is eagerly loaded, so the objects stay
+    # usable after their sessions close.
+    status = args.get('status') or None
+    if status is not None and status not in ORDER_STATUSES:
+        # only exact statuses can use the (status, timestamp, id) index
+        raise ValueError(status)
+    customer_id = args.get('customer', type=int)
+    sessions = [Session(db.engine) for _ in range(4)]
+    try:
+        pages = await gather_reads(
+            partial(orders_page, status=status, customer_id=customer_id,
+                    after=args.get('orders_after') or None, session=sessions[0]),
+            partial(users_page, False, after=args.get('customers_after', type=int), session=sessions[1]),
+            partial(users_page, True, after=args.get('admins_after', type=int), session=sessions[2]),
+            partial(products_with_avg_rating, after=args.get('products_after', type=int), session=sessions[3]),
+        )
+    finally:
+        for session in sessions:
+            session.close()
+    (orders, next_orders), (customers, next_customers), (admins, next_admins), (products, next_products) = pages
+    return {
+        'customers': customers,
+        'admins': admins,
+        'products': products,
+        'next_products': next_products,
+        'orders': orders,
+        'status_filter': status,
+        'order_statuses': ORDER_STATUSES,
+        'customer_filter': customer_id,
+        'next_orders': next_orders,
+        'next_customers': next_customers,
+        'next_admins': next_admins,
+    }
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+LOGIN_ATTEMPTS_PER_IP = int(os.environ.get('LOGIN_ATTEMPTS_PER_IP', 20))
+LOGIN_ATTEMPTS_PER_EMAIL = int(os.environ.get('LOGIN_ATTEMPTS_PER_EMAIL', 5))
+# Proxies in front of the app that append to X-Forwarded-For, e.g. 1 behind
+# the Heroku router (set in the Procfile). Leave it 0 where clients connect
+# directly, or any client could choose the address it is throttled under.
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+
+def trust_proxies(app, count=TRUSTED_PROXIES):
+    # request.remote_addr is otherwise the router's address for every client,
+    # and the per-IP budget would be shared by all of them
+    if count:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=count, x_proto=count)
+
+
+class TokenBucketLimiter:
+    # Per-key token buckets holding up to capacity tokens and refilling at
+    # capacity per period seconds. Buckets live in a bounded LRU, so an evicted
+    # key simply starts full again. capacity 0 disables the limiter. State is
+    # per process, so each gunicorn worker enforces its own budget.
+
+    def __init__(self, capacity, period=60, maxsize=10000):
+        self.capacity = capacity
+        self.rate = capacity / period if period else 0
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        if not self.capacity:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return allowed
+
+
+class LoginThrottle:
+    # Login and registration budgets per client address and per email, so
+    # credential stuffing from one address or against one account is turned
+    # away before any password hashing is done.
+
+    def __init__(self, per_ip=LOGIN_ATTEMPTS_PER_IP, per_email=LOGIN_ATTEMPTS_PER_EMAIL, period=60):
+        self.by_ip = TokenBucketLimiter(per_ip, period)
+        self.by_email = TokenBucketLimiter(per_email, period)
+
+    def allow(self, ip, email=None):
+        if not self.by_ip.allow(ip):
+            return False
+        return not email or self.by_email.allow(email.strip().lower())
@@ -0,0 +1,78 @@
+from sqlalchemy import case, insert
+from database import dialect_insert
+from models import db, Rating, ProductRatingSummary
+
+STAR_VALUES = range(1, 6)
+
+
+def save_ratings(user_id, order_id, product_ids, stars):
+    # One rating per (user, order, product): new rows are inserted in bulk,
+    # rows that already exist are updated in place, and the product summaries
+    # move by the difference, all inside the caller's transaction. The insert
+    # comes first so the existing rows are read after it has taken the write
+    # lock (SQLite) or under row locks (PostgreSQL), so a double submit cannot
+    # count a rating twice.
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return
+    statement = dialect_insert(db.session)(Rating).values([
+        {'user_id': user_id, 'order_id': order_id, 'product_id': product_id, 'stars': stars}
+        for product_id in product_ids
+    ]).on_conflict_do_nothing(index_elements=['user_id', 'order_id', 'product_id'])
+    added = set(db.session.execute(statement.returning(Rating.product_id)).scalars())
+
+    remaining = [product_id for product_id in product_ids if product_id not in added]
+    existing = []
+    if remaining:
+        existing = (db.session.query(Rating.product_id, Rating.stars)
+                    .filter(Rating.user_id == user_id, Rating.order_id == order_id,
+                            Rating.product_id.in_(remaining), Rating.stars.is_distinct_from(stars))
+                    .with_for_update()
+                    .all())
+    if existing:
+        (Rating.query
+         .filter(Rating.user_id == user_id, Rating.order_id == order_id,
+                 Rating.product_id.in_([product_id for product_id, _ in existing]))
+         .update({Rating.stars: stars}, synchronize_session=False))
+
+    for product_id in added:
+        _adjust_summary(product_id, stars)
+    for product_id, previous in existing:
+        # ratings outside 1-5 were never counted in the summary
+        _adjust_summary(product_id, stars, previous if previous in STAR_VALUES else None)
+
+
+def _adjust_summary(product_id, stars, previous=None):
+    star_column = getattr(ProductRatingSummary, f'stars_{stars}')
+    changes = {
+        ProductRatingSummary.rating_sum: ProductRatingSummary.rating_sum + stars - (previous or 0),
+        star_column: star_column + 1,
+    }
+    if previous is None:
+        changes[ProductRatingSummary.rating_count] = ProductRatingSummary.rating_count + 1
+    else:
+        previous_column = getattr(ProductRatingSummary, f'stars_{previous}')
+        changes[previous_column] = previous_column - 1
+    updated = (ProductRatingSummary.query
+               .filter_by(product_id=product_id)
+               .update(changes, synchronize_session=False))
+    if not updated and previous is None:
+        summary = ProductRatingSummary(product_id=product_id, rating_count=1, rating_sum=stars)
+        for value in STAR_VALUES:
+            setattr(summary, f'stars_{value}', 1 if value == stars else 0)
+        db.session.add(summary)
+
+
+def rebuild_rating_summaries():
+    ProductRatingSummary.query.delete(synchronize_session=False)
+    aggregates = (db.session.query(
+        Rating.product_id,
+        db.func.count(Rating.id),
+        db.func.sum(Rating.stars),
+        *[db.func.sum(case((Rating.stars == value, 1), else_=0)) for value in STAR_VALUES])
+        .filter(Rating.product_id.isnot(None), Rating.stars.in_(STAR_VALUES))
+        .group_by(Rating.product_id))
+    columns = ['product_id', 'rating_count', 'rating_sum'] + [f'stars_{v}' for v in STAR_VALUES]
+    db.session.execute(insert(ProductRatingSummary).from_select(columns, aggregates))
+    db.session.commit()
+    return ProductRatingSummary.query.count()
@@ -0,0 +1,121 @@
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import delete, func, insert
+from database import dialect_insert
+from models import db, DailySales, DailyProductSales, DailyCategorySales, Order, OrderItem, Product
+
+SALES_ROLLUPS = (DailySales, DailyProductSales, DailyCategorySales)
+TOP_PRODUCTS = 10
+
+
+def record_sales(lines, sign=1):
+    # Adds (or with sign=-1 removes) order lines in the daily rollups, inside
+    # the caller's transaction. `lines` are (order_id, day, product_id,
+    # category, quantity, price) tuples. Each rollup row is one upsert that
+    # increments the stored counters, so concurrent checkouts never lose
+    # an update.
+    totals = {model: defaultdict(lambda: [set(), 0, 0.0]) for model in SALES_ROLLUPS}
+    for order_id, day, product_id, category, quantity, price in lines:
+        keys = {DailySales: (day,), DailyCategorySales: (day, category or '')}
+        if product_id is not None:
+            keys[DailyProductSales] = (day, product_id)
+        for model, key in keys.items():
+            total = totals[model][key]
+            total[0].add(order_id)
+            total[1] += quantity or 0
+            total[2] += (quantity or 0) * (price or 0)
+
+    for model, rows in totals.items():
+        if not rows:
+            continue
+        key_names = [column.name for column in model.__table__.primary_key]
+        # rows go in key order so concurrent transactions lock them in the same order
+        statement = dialect_insert(db.session)(model).values([
+            dict(zip(key_names, key), order_count=sign * len(orders), units=sign * units,
+                 revenue=sign * revenue)
+            for key, (orders, units, revenue) in sorted(rows.items())
+        ])
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=key_names,
+            set_={name: getattr(model, name) + getattr(statement.excluded, name)
+                  for name in ('order_count', 'units', 'revenue')},
+        ))
+        if sign < 0:
+            # drop rows left with no orders, as a rebuild would never create them
+            days = {key[0] for key in rows}
+            db.session.execute(delete(model).where(model.day.in_(days), model.order_count <= 0))
+
+
+def _sales_lines(query):
+    return (query.join(OrderItem, OrderItem.order_id == Order.id)
+            .outerjoin(Product, Product.id == OrderItem.product_id))
+
+
+def remove_orders_from_sales(order_ids):
+    # cancelled orders stop counting towards revenue
+    lines = (_sales_lines(db.session.query(Order.id, Order.timestamp, OrderItem.product_id,
+                                           Product.category, OrderItem.quantity, OrderItem.price))
+             .filter(Order.id.in_(order_ids))
+             .all())
+    record_sales([(order_id, timestamp.date(), product_id, category, quantity, price)
+                  for order_id, timestamp, product_id, category, quantity, price in lines], sign=-1)
+
+
+def rebuild_sales_rollups():
+    for model in SALES_ROLLUPS:
+        db.session.execute(delete(model))
+    day = func.date(Order.timestamp)
+    counters = [func.count(Order.id.distinct()), func.sum(OrderItem.quantity),
+                func.sum(OrderItem.quantity * OrderItem.price)]
+    category = func.coalesce(Product.category, '')
+    groupings = {
+        DailySales: [day],
+        DailyProductSales: [day, OrderItem.product_id],
+        DailyCategorySales: [day, category],
+    }
+    for model, keys in groupings.items():
+        aggregates = (_sales_lines(db.session.query(*keys, *counters))
+                      .filter(Order.status != 'Cancelled', Order.timestamp.isnot(None),
+                              *[key.isnot(None) for key in keys[1:]])
+                      .group_by(*keys))
+        columns = [column.name for column in model.__table__.primary_key] + ['order_count', 'units', 'revenue']
+        db.session.execute(insert(model).from_select(columns, aggregates))
+    db.session.commit()
+    return DailySales.query.count()
+
+
+def sales_report(start, end):
+    # Reads only the rollups, so the cost follows the number of days and
+    # products in the range, not the number of orders behind them.
+    days = (DailySales.query
+            .filter(DailySales.day >= start, DailySales.day < end)
+            .order_by(DailySales.day)
+            .all())
+    top_products = (db.session.query(DailyProductSales.product_id, Product.name,
+                                     func.sum(DailyProductSales.order_count).label('order_count'),
+                                     func.sum(DailyProductSales.units).label('units'),
+                                     func.sum(DailyProductSales.revenue).label('revenue'))
+                    .outerjoin(Product, Product.id == DailyProductSales.product_id)
+                    .filter(DailyProductSales.day >= start, DailyProductSales.day < end)
+                    .group_by(DailyProductSales.product_id, Product.name)
+                    .order_by(func.sum(DailyProductSales.revenue).desc())
+                    .limit(TOP_PRODUCTS)
+                    .all())
+    categories = (db.session.query(DailyCategorySales.category,
+                                   func.sum(DailyCategorySales.order_count).label('order_count'),
+                                   func.sum(DailyCategorySales.units).label('units'),
+                                   func.sum(DailyCategorySales.revenue).label('revenue'))
+                  .filter(DailyCategorySales.day >= start, DailyCategorySales.day < end)
+                  .group_by(DailyCategorySales.category)
+                  .order_by(func.sum(DailyCategorySales.revenue).desc())
+                  .all())
+    return {
+        'start': start,
+        'end': end - timedelta(days=1),
+        'days': days,
+        'top_products': top_products,
+        'categories': categories,
+        'order_count': sum(day.order_count for day in days),
+        'units': sum(day.units for day in days),
+        'revenue': sum(day.revenue for day in days),
+    }
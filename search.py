@@ -0,0 +1,355 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+import time
+import unicodedata
+from decimal import Decimal
+from sqlalchemy import bindparam, event, text
+from cache import TTLCache
+from models import db, Product
+
+SEARCH_TABLE = 'product_search'
+MIN_QUERY_LENGTH = 2
+MAX_RESULTS = 10
+SEARCH_PAGE_SIZE = 50
+# Queries matching at most this many products are ranked in Python from the
+# product rows; broader ones are ranked by the FTS5 index one tier at a time.
+SEARCH_CANDIDATES = 100
+# name, description, category
+SEARCH_FIELDS = ('name', 'description', 'category')
+FIELD_WEIGHTS = (10.0, 1.0, 4.0)
+# A term scores the weight of the best field it matches in, a whole word
+# counting double a prefix, and a product the sum over the query's terms:
+# (weight, field, whole word), best first.
+RANK_TIERS = sorted(((weight * factor, field, factor == 2)
+                     for field, weight in enumerate(FIELD_WEIGHTS) for factor in (2, 1)), reverse=True)
+
+# External-content FTS5 index over product, kept in step by triggers so bulk
+# inserts and raw SQL are indexed too. Stock changes do not touch it. Alembic
+# batch operations on product recreate the table and drop the triggers;
+# 'flask rebuild-search-index' puts them back.
+SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        name, description, category, content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON product BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON product BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF name, description, category ON product BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO {SEARCH_TABLE}(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+]
+
+MATCH_SQL = text(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query LIMIT :limit")
+PRODUCTS_SQL = text("SELECT id, name, description, category, price FROM product WHERE id IN :ids").bindparams(
+    bindparam('ids', expanding=True))
+
+
+def search_terms(query):
+    # the same split as FTS5's unicode61 tokenizer: letters and digits,
+    # lower-cased and without diacritics
+    folded = unicodedata.normalize('NFKD', (query or '').casefold())
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return re.findall(r'[^\W_]+', folded)
+
+
+def create_search_index(connection):
+    for statement in SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def rebuild_search_index():
+    connection = db.session.connection()
+    create_search_index(connection)
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+    db.session.commit()
+    return db.session.query(Product).count()
+
+
+def exclude_search_tables(object, name, type_, reflected, compare_to):
+    # keeps autogenerate from dropping the FTS5 table and its shadow tables
+    return not (type_ == 'table' and name.startswith(SEARCH_TABLE))
+
+
+@event.listens_for(Product.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        create_search_index(connection)
+
+
+@event.listens_for(Product.__table__, 'after_drop')
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def tier_score(term, tokens):
+    # weight of the best tier `term` reaches in a product's field tokens
+    for weight, field, whole_word in RANK_TIERS:
+        if (term in tokens[field]) if whole_word else any(token.startswith(term) for token in tokens[field]):
+            return weight
+    return 0
+
+
+class SqliteProductSearch:
+    # Ranks like the in-process index, with ties listed by id: FTS5 returns
+    # matches in rowid order, so a LIMIT stops reading the index early.
+
+    def search(self, query, limit=MAX_RESULTS):
+        terms = list(dict.fromkeys(search_terms(query)))
+        if not terms:
+            return []
+        # every term is a prefix, so 'man pic' finds "Mango Pickle"
+        ids = self._match(' AND '.join(f'"{term}"*' for term in terms), SEARCH_CANDIDATES + 1)
+        if len(ids) <= SEARCH_CANDIDATES:
+            products = self._products(ids)
+            scores = {product['id']: sum(tier_score(term, tokens) for term in terms)
+                      for product, tokens in zip(products, map(self._tokens, products))}
+            ranked = sorted(scores, key=lambda id: (-scores[id], id))[:limit]
+            return self._ordered(products, ranked)
+
+        # Too many to rank in Python: ask the index for each score in turn,
+        # best first, until the page is full. A combination matches every
+        # product reaching at least its tiers, so products already listed
+        # under a better score are skipped.
+        combinations = sorted(itertools.product(range(len(RANK_TIERS)), repeat=len(terms)),
+                              key=lambda combination: -self._score(combination))
+        ranked = []
+        for _, group in itertools.groupby(combinations, key=self._score):
+            match = ' OR '.join('(' + ' AND '.join(self._tier(term, level) for term, level in zip(terms, combination))
+                                + ')' for combination in group)
+            listed = set(ranked)
+            ranked += [id for id in self._match(match, limit) if id not in listed][:limit - len(ranked)]
+            if len(ranked) >= limit:
+                break
+        return self._ordered(self._products(ranked), ranked)
+
+    @staticmethod
+    def _score(combination):
+        return sum(RANK_TIERS[level][0] for level in combination)
+
+    @staticmethod
+    def _tier(term, level):
+        _, field, whole_word = RANK_TIERS[level]
+        return f'{{{SEARCH_FIELDS[field]}}} : "{term}"' + ('' if whole_word else '*')
+
+    @staticmethod
+    def _tokens(product):
+        return tuple(frozenset(search_terms(product[field])) for field in SEARCH_FIELDS)
+
+    @staticmethod
+    def _match(match, limit):
+        return [id for (id,) in db.session.execute(MATCH_SQL, {'query': match, 'limit': limit})]
+
+    @staticmethod
+    def _products(ids):
+        if not ids:
+            return []
+        return [row._asdict() for row in db.session.execute(PRODUCTS_SQL, {'ids': ids})]
+
+    @staticmethod
+    def _ordered(products, ids):
+        by_id = {product['id']: product for product in products}
+        return [{'id': id, 'name': by_id[id]['name'], 'category': by_id[id]['category'], 'price': by_id[id]['price']}
+                for id in ids]
+
+
+class _TermTiers:
+    # The documents a query term matches, split by the best rank tier each one
+    # reaches for it, best tier first. Tiers are built on first use, so a
+    # single-term search that fills its page from the name tiers never builds
+    # the (much larger) description ones.
+
+    def __init__(self, term, words, postings):
+        self.term = term
+        self.words = words
+        self.postings = postings
+        self.levels = []
+        self.matched = set()
+        # postings the unions would read
+        self.size = sum(len(field_postings.get(word, ())) for field_postings in postings for word in words)
+
+    def docs(self, level):
+        while len(self.levels) <= level:
+            _, field, whole_word = RANK_TIERS[len(self.levels)]
+            field_postings = self.postings[field]
+            words = (self.term,) if whole_word else self.words
+            hits = set().union(*(field_postings.get(word, ()) for word in words))
+            hits -= self.matched
+            self.matched |= hits
+            self.levels.append(hits)
+        return self.levels[level]
+
+    def matching(self):
+        self.docs(len(RANK_TIERS) - 1)
+        return self.matched
+
+    def classify(self, candidates, fields):
+        # Splits only `candidates` into tiers by reading their words, which
+        # beats building large unions when few documents are left.
+        words = frozenset(self.words)
+        self.levels = [set() for _ in RANK_TIERS]
+        for doc in candidates:
+            for level, (_, field, whole_word) in enumerate(RANK_TIERS):
+                tokens = fields[doc][field]
+                if (self.term in tokens) if whole_word else not tokens.isdisjoint(words):
+                    self.levels[level].add(doc)
+                    break
+        self.matched = set().union(*self.levels)
+        return self.matched
+
+
+class InvertedIndex:
+    # In-process product index for deployments without FTS5 (DynamoDB). It is
+    # loaded from `loader` (an iterable of product dicts) on first use and
+    # reloaded in the background every `ttl` seconds or after invalidate(),
+    # while searches keep using the previous copy.
+
+    def __init__(self, loader, ttl=300):
+        self.loader = loader
+        self.ttl = ttl
+        # bumped on every load, so cached results from an older copy are not reused
+        self.version = 0
+        self._index = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._expires_at = 0
+        if self._index is not None:
+            self._start_reload()
+
+    def _current(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._load()
+        elif self._expires_at <= time.monotonic():
+            self._start_reload()
+        return self._index
+
+    def _start_reload(self):
+        if self._lock.acquire(blocking=False):
+            self._expires_at = time.monotonic() + self.ttl
+            threading.Thread(target=self._reload, daemon=True, name='search-index').start()
+
+    def _reload(self):
+        try:
+            self._load()
+        finally:
+            self._lock.release()
+
+    def _load(self):
+        # Documents are numbered in name order, so among equally ranked
+        # matches the smallest numbers are the ones listed first.
+        products = sorted(self.loader(), key=lambda product: product.get('name') or '')
+        docs, fields, postings = [], [], tuple({} for _ in FIELD_WEIGHTS)
+        for doc, product in enumerate(products):
+            price = product.get('price')
+            docs.append({'id': product.get('product_id') or product.get('id'), 'name': product.get('name'),
+                         'category': product.get('category'),
+                         'price': float(price) if isinstance(price, Decimal) else price})
+            tokens = tuple(frozenset(search_terms(product.get(field))) for field in SEARCH_FIELDS)
+            fields.append(tokens)
+            for field, field_tokens in enumerate(tokens):
+                for token in field_tokens:
+                    postings[field].setdefault(token, []).append(doc)
+        self._index = (docs, fields, postings, sorted(set().union(*postings)))
+        self._expires_at = time.monotonic() + self.ttl
+        self.version += 1
+
+    def search(self, query, limit=MAX_RESULTS):
+        terms = list(dict.fromkeys(search_terms(query)))
+        if not terms:
+            return []
+        docs, fields, postings, vocabulary = self._current()
+
+        def expand(term):
+            start = bisect.bisect_left(vocabulary, term)
+            end = bisect.bisect_left(vocabulary, term + '\U0010ffff')
+            return vocabulary[start:end]
+
+        # A document's score is the sum, over the terms, of the best tier it
+        # reaches for each, so every combination of one tier per term is a
+        # set of equally ranked documents. Combinations are visited best score
+        # first and stop once the page is full, so every match is ranked
+        # without scoring each one.
+        term_tiers = [_TermTiers(term, expand(term), postings) for term in terms]
+        if len(term_tiers) == 1:
+            combinations = [(level,) for level in range(len(RANK_TIERS))]
+        else:
+            # most selective term first; later ones only need to split what is left
+            ordered = sorted(term_tiers, key=lambda tiers: tiers.size)
+            matching = ordered[0].matching()
+            for tiers in ordered[1:]:
+                if not matching:
+                    return []
+                if len(matching) * 64 < tiers.size:
+                    matching = tiers.classify(matching, fields)
+                else:
+                    matching = matching & tiers.matching()
+            if not matching:
+                return []
+            levels = [[level for level, hits in enumerate(tiers.levels) if not hits.isdisjoint(matching)]
+                      for tiers in term_tiers]
+            combinations = sorted(itertools.product(*levels),
+                                  key=lambda combination: -sum(RANK_TIERS[level][0] for level in combination))
+
+        results = []
+        for _, group in itertools.groupby(combinations, key=lambda c: sum(RANK_TIERS[level][0] for level in c)):
+            tied = set()
+            for combination in group:
+                sets = sorted((tiers.docs(level) for tiers, level in zip(term_tiers, combination)), key=len)
+                tied |= sets[0].intersection(*sets[1:])
+            results += heapq.nsmallest(limit - len(results), tied)
+            if len(results) >= limit:
+                break
+        return [docs[doc] for doc in results]
+
+
+class CachedSearch:
+    # Short-lived result cache in front of a search backend, so the same
+    # prefix typed by many shoppers is looked up once per ttl.
+
+    def __init__(self, backend, ttl=30, maxsize=4096):
+        self.backend = backend
+        self.results = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def search(self, query, limit=MAX_RESULTS):
+        terms = search_terms(query)
+        if sum(map(len, terms)) < MIN_QUERY_LENGTH:
+            return []
+        key = (' '.join(terms), limit, getattr(self.backend, 'version', None))
+        results = self.results.get(key)
+        if results is None:
+            results = self.backend.search(key[0], limit)
+            self.results.set(key, results)
+        return results
+
+    def clear(self):
+        if hasattr(self.backend, 'invalidate'):
+            self.backend.invalidate()
+        self.results.clear()
+
+
+def product_search_backend(app):
+    # FTS5 on SQLite; other databases fall back to the in-process index
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return SqliteProductSearch()
+
+    def load_products():
+        with app.app_context():
+            return [{'id': product.id, 'name': product.name, 'description': product.description,
+                     'category': product.category, 'price': product.price}
+                    for product in Product.query.order_by(Product.id)]
+    return InvertedIndex(load_products)
@@ -0,0 +1,242 @@
+import logging
+import secrets
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from sqlalchemy import bindparam, delete, insert, select, update
+from cache import TTLCache
+from models import db, UserSession
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker trusts its cached copy of a session. Another worker's
+# revocation takes at most this long to reach it.
+SESSION_CACHE_TTL = 30
+SESSION_CLEANUP_INTERVAL = 600
+
+
+class ServerSession(SecureCookieSession):
+    # The session dict, plus where it is stored. `data` and `version` are what
+    # it was loaded as, and `user_id` the user it was loaded with, so a save
+    # can tell an unchanged session, a concurrent write, and a login or logout.
+
+    def __init__(self, initial=None, sid=None, data=None, version=0, expires_at=0):
+        super().__init__(initial)
+        self.sid = sid
+        self.data = data
+        self.version = version
+        self.expires_at = expires_at
+        self.user_id = dict.get(self, 'user_id')
+
+
+class ServerSessionInterface(SessionInterface):
+    # Keeps session data in `store` and only an opaque id in the cookie, so
+    # requests neither verify nor re-sign a signed cookie, and the cookie is
+    # only sent when the id changes. Each worker caches the sessions it has
+    # read for up to cache_ttl seconds, so a write made by another worker can
+    # take that long to be seen there. Writes are compare-and-set on the
+    # stored version: one made from an older copy is applied on top of the
+    # newer one instead of overwriting it. Sessions expire
+    # permanent_session_lifetime after their last write or sliding refresh
+    # (expiry times are epoch seconds). A new id is issued whenever the
+    # signed-in user changes, so an id handed out before login is useless.
+
+    serializer = TaggedJSONSerializer()
+    max_write_attempts = 3
+
+    def __init__(self, store, cache_size=4096, cache_ttl=SESSION_CACHE_TTL,
+                 cleanup_interval=SESSION_CLEANUP_INTERVAL):
+        self.store = store
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.cleanup_interval = cleanup_interval
+        self._cleaner = None
+
+    def open_session(self, app, request):
+        self._start_cleanup()
+        # cookies from before ids stopped carrying a ".<version>" still work
+        sid = (request.cookies.get(self.get_cookie_name(app)) or '').split('.', 1)[0]
+        if not sid:
+            return ServerSession()
+        entry = self.cache.get(sid)
+        if entry is None:
+            entry = self.store.load(sid)
+            if entry is None:
+                return ServerSession()
+            self.cache.set(sid, entry)
+        data, version, expires_at = entry
+        if expires_at <= time.time():
+            return ServerSession()
+        return ServerSession(self.serializer.loads(data), sid, data, version, expires_at)
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add('Cookie')
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        if not session.modified:
+            self._refresh(app, session, response, lifetime)
+            return
+
+        sid = session.sid
+        user_id = session.get('user_id')
+        if sid and (not session or user_id != session.user_id):
+            self.store.delete(sid)
+            self.cache.delete(sid)
+            sid = None
+        if not session:
+            if session.sid:
+                self._delete_cookie(app, response)
+            return
+
+        data = self.serializer.dumps(dict(session))
+        expires_at = int(time.time()) + lifetime
+        if not sid:
+            sid = secrets.token_urlsafe(32)
+            self.store.create(sid, user_id, data, expires_at)
+            self.cache.set(sid, (data, 1, expires_at))
+            self._set_cookie(app, session, response, sid)
+        elif data == session.data:
+            # set, but to the values it already had
+            self._refresh(app, session, response, lifetime)
+        else:
+            entry = self._write(session, data, expires_at)
+            if entry is None:
+                # revoked or expired meanwhile; its changes go with it
+                self.cache.delete(sid)
+                self._delete_cookie(app, response)
+            else:
+                self.cache.set(sid, entry)
+
+    def _refresh(self, app, session, response, lifetime):
+        # sliding expiry without a write on every request
+        if session.sid and session.expires_at - time.time() < lifetime / 2:
+            expires_at = int(time.time()) + lifetime
+            if self.store.touch(session.sid, expires_at):
+                self.cache.set(session.sid, (session.data, session.version, expires_at))
+                if session.permanent:
+                    self._set_cookie(app, session, response, session.sid)
+
+    def _write(self, session, data, expires_at):
+        # Returns the stored (data, version, expires_at), or None once the
+        # session is gone. If another worker wrote first, the keys this
+        # request changed are applied to its copy and the write is retried.
+        version = session.version
+        for _ in range(self.max_write_attempts):
+            written = self.store.update(session.sid, data, expires_at, version)
+            if written is not None:
+                return data, written, expires_at
+            entry = self.store.load(session.sid)
+            if entry is None or entry[2] <= time.time():
+                return None
+            data, version = self._merge(session, entry[0]), entry[1]
+            if data == entry[0]:
+                return entry
+        logger.warning("Gave up saving session changes after %d conflicting writes", self.max_write_attempts)
+        return self.store.load(session.sid)
+
+    def _merge(self, session, stored_data):
+        loaded = self.serializer.loads(session.data)
+        stored = self.serializer.loads(stored_data)
+        for key in loaded.keys() | session.keys():
+            if key not in session:
+                stored.pop(key, None)
+            elif key not in loaded or loaded[key] != session[key]:
+                stored[key] = session[key]
+        return self.serializer.dumps(stored)
+
+    def _set_cookie(self, app, session, response, sid):
+        response.set_cookie(self.get_cookie_name(app), sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=self.get_cookie_domain(app),
+                            path=self.get_cookie_path(app), secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+
+    def _delete_cookie(self, app, response):
+        response.delete_cookie(self.get_cookie_name(app), domain=self.get_cookie_domain(app),
+                               path=self.get_cookie_path(app), secure=self.get_cookie_secure(app),
+                               samesite=self.get_cookie_samesite(app))
+
+    def revoke_user(self, user_id):
+        # Signs the user out everywhere. Other workers drop their cached
+        # copies within SESSION_CACHE_TTL; none can write them back.
+        revoked = self.store.revoke_user(user_id)
+        self.cache.clear()
+        return revoked
+
+    def _start_cleanup(self):
+        # Stores without delete_expired (DynamoDB) expire items themselves.
+        if self._cleaner is None and hasattr(self.store, 'delete_expired'):
+            self._cleaner = threading.Thread(target=self._cleanup, daemon=True, name='session-cleanup')
+            self._cleaner.start()
+
+    def _cleanup(self):
+        while True:
+            try:
+                self.store.delete_expired()
+            except Exception:
+                logger.exception("Could not delete expired sessions")
+            time.sleep(self.cleanup_interval)
+
+
+class SqlSessionStore:
+    # Sessions in the user_session table. Writes use their own short
+    # transaction on the engine, so they never commit the request's session.
+    # Statements are built once; this runs on every request that misses the
+    # cache or writes.
+
+    sessions = UserSession.__table__
+    _load = select(sessions.c.data, sessions.c.version, sessions.c.expires_at).where(
+        sessions.c.id == bindparam('sid'))
+    _create = insert(sessions)
+    # only sessions that still exist at the version the writer read, so a
+    # revoked one stays revoked and a newer write is not overwritten
+    _update = (update(sessions)
+               .where(sessions.c.id == bindparam('sid'), sessions.c.expires_at > bindparam('now'),
+                      sessions.c.version == bindparam('seen'))
+               .values(data=bindparam('data'), version=sessions.c.version + 1,
+                       expires_at=bindparam('expires'))
+               .returning(sessions.c.version))
+    _touch = (update(sessions)
+              .where(sessions.c.id == bindparam('sid'), sessions.c.expires_at > bindparam('now'))
+              .values(expires_at=bindparam('expires')))
+    _delete = delete(sessions).where(sessions.c.id == bindparam('sid'))
+
+    def __init__(self, app):
+        self.app = app
+
+    def _begin(self):
+        with self.app.app_context():
+            return db.engine.begin()
+
+    def load(self, sid):
+        with self._begin() as connection:
+            row = connection.execute(self._load, {'sid': sid}).first()
+        return tuple(row) if row else None
+
+    def create(self, sid, user_id, data, expires_at):
+        with self._begin() as connection:
+            connection.execute(self._create, {'id': sid, 'user_id': user_id, 'data': data, 'version': 1,
+                                              'expires_at': expires_at})
+
+    def update(self, sid, data, expires_at, version):
+        with self._begin() as connection:
+            return connection.execute(self._update, {'sid': sid, 'now': int(time.time()), 'data': data,
+                                                     'expires': expires_at, 'seen': version}).scalar()
+
+    def touch(self, sid, expires_at):
+        with self._begin() as connection:
+            return connection.execute(self._touch, {'sid': sid, 'now': int(time.time()),
+                                                    'expires': expires_at}).rowcount
+
+    def delete(self, sid):
+        with self._begin() as connection:
+            connection.execute(self._delete, {'sid': sid})
+
+    def revoke_user(self, user_id):
+        with self._begin() as connection:
+            return connection.execute(delete(self.sessions).where(self.sessions.c.user_id == user_id)).rowcount
+
+    def delete_expired(self):
+        with self._begin() as connection:
+            return connection.execute(
+                delete(self.sessions).where(self.sessions.c.expires_at <= int(time.time()))
+            ).rowcount
@@ -0,0 +1,65 @@
+// Cart forms carrying data-cart-api are sent to the JSON API, and the page is
+// updated from the cart it answers with instead of posting and redirecting.
+// Without JavaScript or fetch the forms post as before. A request that fails
+// once sent is reported instead: it may have been applied, and posting the
+// form as well could add the item twice.
+(function () {
+    function showMessage(text) {
+        var message = document.getElementById('cartMessage');
+        message.textContent = text;
+        message.hidden = false;
+    }
+
+    function showCart(cart) {
+        document.querySelectorAll('[data-cart-count]').forEach(function (element) {
+            element.textContent = cart.item_count;
+        });
+        document.querySelectorAll('[data-cart-total]').forEach(function (element) {
+            element.textContent = cart.total;
+        });
+    }
+
+    document.addEventListener('submit', function (event) {
+        var form = event.target;
+        var url = form.getAttribute('data-cart-api');
+        if (!url || !window.fetch) { return; }
+        event.preventDefault();
+        var removing = form.getAttribute('data-cart-method') === 'DELETE';
+        var options = {method: 'DELETE', credentials: 'same-origin', headers: {'Accept': 'application/json'}};
+        if (!removing) {
+            options.method = 'POST';
+            options.headers['Content-Type'] = 'application/json';
+            options.body = JSON.stringify({
+                product_id: form.elements.product_id.value,
+                quantity: parseInt(form.elements.quantity.value, 10) || 1
+            });
+        }
+        var request;
+        try {
+            request = fetch(url, options);
+        } catch (error) {
+            // nothing was sent, so the form can still post
+            form.submit();
+            return;
+        }
+        request
+            .then(function (response) {
+                return response.json().then(function (data) { return {ok: response.ok, data: data}; });
+            })
+            .then(function (result) {
+                if (!result.ok) {
+                    showMessage(result.data.error);
+                    return;
+                }
+                showCart(result.data);
+                if (removing) {
+                    form.closest('tr').remove();
+                    if (!result.data.items.length) { window.location.reload(); }
+                }
+                showMessage(removing ? 'Item removed from your cart.' : 'Item added to cart.');
+            })
+            .catch(function () {
+                showMessage('Could not update your cart. Please reload the page to see its contents.');
+            });
+    });
+})();
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import boto3
+import pytest
+from moto import mock_aws
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# app.py picks its database at import time, so point it at a scratch file first
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pickles-tests-'), 'test.db')}"
+# moto's fake account, and no item cache outliving each test's tables in awsapp
+os.environ.update(AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing', AWS_DEFAULT_REGION='us-east-1',
+                  DYNAMO_CACHE='off')
+
+from app import app as flask_app, identity  # noqa: E402
+from models import db, User  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+    # ids are reused by the next test's rows
+    identity.cache.clear()
+    flask_app.session_interface.cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def dynamodb():
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb')
+        dynamodb.create_table(
+            TableName='Users',
+            KeySchema=[{'AttributeName': 'email', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'email', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST')
+        dynamodb.create_table(
+            TableName='AppData',
+            KeySchema=[{'AttributeName': 'PK', 'KeyType': 'HASH'}, {'AttributeName': 'SK', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': name, 'AttributeType': 'S'}
+                                  for name in ('PK', 'SK', 'GSI1PK', 'GSI1SK')],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'GSI1',
+                'KeySchema': [{'AttributeName': 'GSI1PK', 'KeyType': 'HASH'},
+                              {'AttributeName': 'GSI1SK', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'}}],
+            BillingMode='PAY_PER_REQUEST')
+        yield dynamodb
+
+
+@pytest.fixture
+def table(dynamodb):
+    return dynamodb.Table('AppData')
+
+
+@pytest.fixture
+def awsapp(dynamodb, monkeypatch):
+    import awsapp
+    from passwords import PasswordHasher
+    from ratelimit import LoginThrottle
+    monkeypatch.setattr(awsapp, 'login_throttle', LoginThrottle())
+    # quick hashes; sign-ups are not what these tests measure
+    monkeypatch.setattr(awsapp, 'passwords', PasswordHasher(method='pbkdf2:sha256:1000'))
+    return awsapp
+
+
+def add_user(username, is_admin=False):
+    user = User(username=username, email=f'{username}@example.com', password='-', is_admin=is_admin)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def sign_in(client, user):
+    with client.session_transaction() as session:
+        session.update(user_id=user.id, username=user.username, is_admin=user.is_admin)
+
+
+def sign_up(client, username, role='customer'):
+    # registers and logs in through awsapp's forms
+    email = f'{username}@example.com'
+    client.post('/register', data={'username': username, 'email': email, 'password': 'secret', 'role': role})
+    client.post('/login', data={'email': email, 'password': 'secret'})
@@ -0,0 +1,19 @@
+import gzip
+import os
+from flask import url_for
+
+
+def test_precompressed_asset_keeps_the_original_name_and_type(app, client):
+    with app.test_request_context():
+        url = url_for('static', filename='styles.css')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'styles.css' in response.headers['Content-Disposition']
+    assert '.gz' not in response.headers['Content-Disposition']
+    assert 'immutable' in response.headers['Cache-Control']
+    with open(os.path.join(app.static_folder, 'styles.css'), 'rb') as f:
+        assert gzip.decompress(response.get_data()) == f.read()
@@ -0,0 +1,51 @@
+import base64
+import json
+import pytest
+from conftest import sign_up
+from dynamo_query import encode_cursor
+
+TAMPERED = [
+    'not-a-cursor',
+    base64.urlsafe_b64encode(b'[1, 2]').decode(),
+    encode_cursor({'PK': 'PRODUCT#1'}),
+    base64.urlsafe_b64encode(json.dumps({'PK': 1, 'SK': 'x', 'GSI1PK': 'x', 'GSI1SK': 'x'}).encode()).decode(),
+]
+
+
+@pytest.mark.parametrize('cursor', TAMPERED)
+@pytest.mark.parametrize('role, path', [
+    ('admin', '/dashboard?customers_after={}'),
+    ('admin', '/dashboard?orders_after={}'),
+    ('customer', '/dashboard?orders_after={}'),
+    ('customer', '/products?cursor={}'),
+    ('customer', '/api/v1/products?cursor={}'),
+    ('customer', '/api/v1/orders?cursor={}'),
+])
+def test_tampered_cursor_is_a_bad_request(awsapp, role, path, cursor):
+    client = awsapp.app.test_client()
+    sign_up(client, 'shopper', role)
+    assert client.get(path.format(cursor)).status_code == 400
+
+
+def test_registered_customers_are_listed_on_the_admin_dashboard(awsapp):
+    sign_up(awsapp.app.test_client(), 'asha')
+    admin = awsapp.app.test_client()
+    sign_up(admin, 'boss', 'admin')
+
+    page = admin.get('/dashboard').get_data(as_text=True)
+
+    assert 'asha@example.com' in page
+    assert 'boss@example.com' not in page
+
+
+def test_backfill_lists_customers_registered_before_profiles(awsapp, dynamodb, table):
+    users = dynamodb.Table('Users')
+    users.put_item(Item={'user_id': 'u1', 'username': 'ravi', 'email': 'ravi@example.com', 'role': 'customer'})
+    users.put_item(Item={'user_id': 'u2', 'username': 'boss', 'email': 'boss@example.com', 'role': 'admin'})
+
+    result = awsapp.app.test_cli_runner().invoke(args=['backfill-customer-profiles'])
+
+    assert 'Backfilled 1 customer profiles.' in result.output
+    assert [item['email'] for item in table.query(IndexName='GSI1', KeyConditionExpression='GSI1PK = :user',
+                                                   ExpressionAttributeValues={':user': 'USER'})['Items']] == [
+        'ravi@example.com']
@@ -0,0 +1,59 @@
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from conftest import add_user, sign_in
+from carts import cart_summary
+from models import db, CartItem, Product
+
+
+def test_checkout_sees_a_cart_filled_by_another_worker(app, client):
+    with app.app_context():
+        user = add_user('shopper')
+        sign_in(client, user)
+        product = Product(name='Lemon Pickle', category='Veg', price=180, stock=10)
+        db.session.add(product)
+        db.session.commit()
+
+        assert client.get('/checkout').status_code == 302
+        assert cart_summary(user.id).item_count == 0
+        # written behind this process's back, as another worker's add would be
+        db.session.add(CartItem(user_id=user.id, product_id=product.id, quantity=2))
+        db.session.commit()
+
+        assert client.get('/checkout').status_code == 200
+
+
+def test_checkout_ignores_lines_for_removed_products(app, client):
+    with app.app_context():
+        user = add_user('shopper')
+        sign_in(client, user)
+        db.session.add(CartItem(user_id=user.id, product_id=999, quantity=1))
+        db.session.commit()
+
+        response = client.get('/checkout')
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith('/products')
+
+
+def test_add_that_keeps_conflicting_is_reported(app, client):
+    def conflict(session):
+        raise IntegrityError('INSERT INTO cart_item', {}, Exception('UNIQUE constraint failed'))
+
+    with app.app_context():
+        user = add_user('shopper')
+        sign_in(client, user)
+        product = Product(name='Lemon Pickle', category='Veg', price=180, stock=10)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+        event.listen(db.session, 'before_commit', conflict)
+        try:
+            response = client.post('/api/v1/cart/items', json={'product_id': product_id})
+            assert response.status_code == 409
+            response = client.post('/add-to-cart', data={'product_id': product_id}, follow_redirects=True)
+            assert b'Could not add the item to your cart' in response.data
+        finally:
+            event.remove(db.session, 'before_commit', conflict)
+
+        assert client.post('/api/v1/cart/items', json={'product_id': product_id}).status_code == 200
+        assert CartItem.query.filter_by(user_id=user.id).one().quantity == 1
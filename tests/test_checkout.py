@@ -0,0 +1,54 @@
+import threading
+from conftest import add_user
+from models import db, CartItem, Order, OrderItem, Product
+from orders import CheckoutError, place_order
+
+STOCK = 5
+BUYERS = 12
+
+
+def test_concurrent_checkouts_cannot_oversell(app):
+    with app.app_context():
+        product = Product(name='Last Jars Mango Pickle', category='Veg', price=250, stock=STOCK)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+        buyer_ids = []
+        for number in range(BUYERS):
+            buyer = add_user(f'buyer{number}')
+            db.session.add(CartItem(user_id=buyer.id, product_id=product_id, quantity=1))
+            buyer_ids.append(buyer.id)
+        db.session.commit()
+
+    start = threading.Barrier(BUYERS)
+    placed, refused, failed = [], [], []
+
+    def checkout(user_id):
+        with app.app_context():
+            start.wait()
+            try:
+                placed.append(place_order(user_id, 'Somewhere').id)
+            except CheckoutError:
+                refused.append(user_id)
+            except Exception as e:
+                failed.append(e)
+
+    threads = [threading.Thread(target=checkout, args=(user_id,)) for user_id in buyer_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failed == []
+    assert len(placed) == STOCK
+    assert len(refused) == BUYERS - STOCK
+    with app.app_context():
+        assert db.session.get(Product, product_id).stock == 0
+        sold = (db.session.query(db.func.sum(OrderItem.quantity))
+                .filter(OrderItem.order_id.in_(placed))
+                .scalar())
+        assert sold == STOCK
+        assert Order.query.count() == STOCK
+        # the buyers who missed out keep their carts; the others' are cleared
+        assert sorted(user_id for (user_id,) in db.session.query(CartItem.user_id)) == sorted(refused)
+        assert all(item.quantity == 1 for item in CartItem.query)
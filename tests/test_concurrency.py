@@ -0,0 +1,32 @@
+import asyncio
+from concurrency import PerThread, gather_reads
+from instrumentation import RequestTimings
+
+
+def test_each_pool_thread_gets_its_own_object():
+    built = []
+
+    def build():
+        built.append(object())
+        return built[-1]
+
+    shared = PerThread(build)
+    calls = [shared.get for _ in range(16)]
+    seen = asyncio.run(gather_reads(*calls))
+
+    assert len(set(map(id, seen))) == len(built)
+    assert shared.get() is shared.get()
+
+
+def test_request_timings_count_every_call_from_pool_threads():
+    timings = RequestTimings()
+
+    def record():
+        for _ in range(5000):
+            timings.add_db_statement(0.001)
+            timings.add_aws_call(0.001)
+
+    asyncio.run(gather_reads(*[record] * 8))
+
+    assert timings.db_statements == 40000
+    assert timings.aws_calls == 40000
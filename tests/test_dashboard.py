@@ -0,0 +1,67 @@
+import re
+from sqlalchemy import event
+from conftest import add_user, sign_in
+from models import db, Order, OrderItem, Product, Rating
+from queries import PAGE_SIZE
+from ratings import rebuild_rating_summaries
+
+
+def add_rated_orders(start, count):
+    # one product per row, bought by a new customer who rated it
+    for number in range(start, start + count):
+        customer = add_user(f'customer{number}')
+        product = Product(name=f'Pickle {number}', category='Veg', price=100, stock=10)
+        order = Order(user_id=customer.id, total=100, address='Somewhere')
+        db.session.add_all([product, order])
+        db.session.flush()
+        db.session.add_all([OrderItem(order_id=order.id, product_id=product.id, quantity=1, price=100),
+                            Rating(user_id=customer.id, order_id=order.id, product_id=product.id, stars=4)])
+        db.session.commit()
+    rebuild_rating_summaries()
+
+
+def dashboard_statements(client):
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client.get('/dashboard')  # warms the session and user caches
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/dashboard')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return response.get_data(as_text=True), len(statements)
+
+
+def test_dashboard_statement_count_does_not_grow_with_rows(app, client):
+    with app.app_context():
+        sign_in(client, add_user('admin', is_admin=True))
+        add_rated_orders(0, 3)
+        page, few = dashboard_statements(client)
+        assert page.count('Pickle ') == 3
+
+        # still inside one page of orders and customers, so every row is shown
+        add_rated_orders(3, 30)
+        page, many = dashboard_statements(client)
+        assert page.count('Pickle ') == 33
+        assert page.count('⭐') >= 33
+
+    assert many == few
+
+
+def test_dashboard_pages_products(app, client):
+    with app.app_context():
+        sign_in(client, add_user('admin', is_admin=True))
+        db.session.add_all(Product(name=f'Pickle {number:03}', category='Veg', price=100, stock=10)
+                           for number in range(PAGE_SIZE + 5))
+        db.session.commit()
+
+        first = client.get('/dashboard').get_data(as_text=True)
+        assert first.count('Pickle ') == PAGE_SIZE
+        after = re.search(r'products_after=(\d+)', first).group(1)
+        rest = client.get(f'/dashboard?products_after={after}').get_data(as_text=True)
+        assert rest.count('Pickle ') == 5
+        assert 'products_after=' not in rest
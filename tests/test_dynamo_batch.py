@@ -0,0 +1,119 @@
+import pytest
+from botocore.exceptions import ClientError
+from conftest import sign_up
+import dynamo_batch
+from dynamo_batch import (BATCH_WRITE_SIZE, UnprocessedItemsError, batch_get, batch_write, is_transaction_conflict,
+                          transact_write)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(dynamo_batch, 'BASE_BACKOFF', 0)
+
+
+def items(count):
+    return [{'PK': f'PRODUCT#{number}', 'SK': 'DETAILS', 'name': f'Pickle {number}'} for number in range(count)]
+
+
+def keys(items):
+    return [{'PK': item['PK'], 'SK': item['SK']} for item in items]
+
+
+def test_batch_write_sends_chunks_of_25(table, monkeypatch):
+    client = table.meta.client
+    sent = []
+
+    def batch_write_item(RequestItems):
+        sent.append(len(RequestItems[table.name]))
+        return type(client).batch_write_item(client, RequestItems=RequestItems)
+
+    monkeypatch.setattr(client, 'batch_write_item', batch_write_item)
+    batch_write(table, puts=items(60))
+
+    assert sent == [BATCH_WRITE_SIZE, BATCH_WRITE_SIZE, 10]
+    assert len(batch_get(table, keys(items(60)))) == 60
+
+
+def test_batch_write_retries_unprocessed_items(table, monkeypatch):
+    client = table.meta.client
+    sent = []
+
+    def batch_write_item(RequestItems):
+        # the first call only gets through part of the chunk
+        requests = RequestItems[table.name]
+        sent.append(len(requests))
+        if len(sent) == 1:
+            type(client).batch_write_item(client, RequestItems={table.name: requests[:3]})
+            return {'UnprocessedItems': {table.name: requests[3:]}}
+        return type(client).batch_write_item(client, RequestItems=RequestItems)
+
+    monkeypatch.setattr(client, 'batch_write_item', batch_write_item)
+    batch_write(table, puts=items(5))
+
+    assert sent == [5, 2]
+    assert len(batch_get(table, keys(items(5)))) == 5
+
+
+def test_batch_write_gives_up_after_max_attempts(table, monkeypatch):
+    monkeypatch.setattr(table.meta.client, 'batch_write_item',
+                        lambda RequestItems: {'UnprocessedItems': RequestItems})
+
+    with pytest.raises(UnprocessedItemsError):
+        batch_write(table, puts=items(2))
+
+
+def test_batch_get_retries_unprocessed_keys(table, monkeypatch):
+    batch_write(table, puts=items(4))
+    client = table.meta.client
+    calls = []
+
+    def batch_get_item(RequestItems):
+        calls.append(len(RequestItems[table.name]['Keys']))
+        if len(calls) == 1:
+            requested = RequestItems[table.name]['Keys']
+            response = type(client).batch_get_item(client, RequestItems={table.name: {'Keys': requested[:1]}})
+            response['UnprocessedKeys'] = {table.name: {'Keys': requested[1:]}}
+            return response
+        return type(client).batch_get_item(client, RequestItems=RequestItems)
+
+    monkeypatch.setattr(client, 'batch_get_item', batch_get_item)
+    found = batch_get(table, keys(items(4)))
+
+    assert calls == [4, 3]
+    assert sorted(item['name'] for item in found.values()) == [f'Pickle {number}' for number in range(4)]
+
+
+def test_cancelled_transaction_writes_nothing(table):
+    order = {'PK': 'ORDER#1', 'SK': 'DETAILS'}
+    missing_cart_line = {'PK': 'CART#1', 'SK': 'PRODUCT#1'}
+
+    with pytest.raises(ClientError) as error:
+        transact_write(table, [{'Put': {'Item': order}},
+                               {'Delete': {'Key': missing_cart_line, 'ConditionExpression': 'attribute_exists(PK)'}}])
+
+    assert error.value.response['Error']['Code'] == 'TransactionCanceledException'
+    assert is_transaction_conflict(error.value)
+    assert 'Item' not in table.get_item(Key=order)
+
+
+def test_checkout_is_refused_when_the_cart_changes_underneath_it(awsapp, table, monkeypatch):
+    table.put_item(Item={'PK': 'PRODUCT#p1', 'SK': 'DETAILS', 'product_id': 'p1', 'name': 'Mango Pickle',
+                         'category': 'veg', 'price': 150, 'quantity': 3})
+    client = awsapp.app.test_client()
+    sign_up(client, 'asha')
+    client.post('/add-to-cart', data={'product_id': 'p1'})
+
+    # another tab empties the cart after this checkout has read it
+    read_cart = awsapp.user_cart_items
+
+    def read_then_clear(user_id):
+        cart = read_cart(user_id)
+        table.delete_item(Key={'PK': f'CART#{user_id}', 'SK': 'PRODUCT#p1'})
+        return cart
+
+    monkeypatch.setattr(awsapp, 'user_cart_items', read_then_clear)
+    response = client.post('/checkout', data={'address': 'Somewhere'})
+
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/cart')
+    assert not [item for item in table.scan()['Items'] if item['PK'].startswith(('ORDER#', 'OUTBOX'))]
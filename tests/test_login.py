@@ -0,0 +1,75 @@
+import pytest
+from werkzeug.security import generate_password_hash
+import app as app_module
+from models import db, User
+from passwords import PasswordHasher, PasswordHasherBusy
+from ratelimit import LOGIN_ATTEMPTS_PER_IP, LoginThrottle, trust_proxies
+
+
+@pytest.fixture(autouse=True)
+def login_throttle(monkeypatch):
+    monkeypatch.setattr(app_module, 'login_throttle', LoginThrottle())
+
+
+@pytest.fixture
+def behind_proxy(app, monkeypatch):
+    monkeypatch.setattr(app, 'wsgi_app', app.wsgi_app)
+    trust_proxies(app, 1)
+
+
+def attempt(client, address, number):
+    return client.post('/login', data={'email': f'nobody{number}@example.com', 'password': 'wrong'},
+                       headers={'X-Forwarded-For': address})
+
+
+def test_spoofed_forwarded_address_does_not_reset_the_budget(app, client):
+    # no proxy is trusted by default, so the header is the client's to choose
+    for number in range(LOGIN_ATTEMPTS_PER_IP):
+        assert attempt(client, f'203.0.113.{number}', number).status_code == 302
+    assert attempt(client, '198.51.100.23', LOGIN_ATTEMPTS_PER_IP).status_code == 429
+
+
+def test_login_budget_is_per_forwarded_client_address(app, client, behind_proxy):
+    for number in range(LOGIN_ATTEMPTS_PER_IP):
+        assert attempt(client, '203.0.113.7', number).status_code == 302
+    assert attempt(client, '203.0.113.7', LOGIN_ATTEMPTS_PER_IP).status_code == 429
+
+    # every request comes from the same router; another client is not throttled
+    assert attempt(client, '198.51.100.23', 0).status_code == 302
+
+
+class BusyRehash(PasswordHasher):
+    # verifies normally, but the pool is full by the time the upgrade is hashed
+    def hash(self, password):
+        raise PasswordHasherBusy()
+
+
+def test_busy_pool_skips_the_rehash_and_logs_in(app, client, monkeypatch):
+    stored = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+    with app.app_context():
+        db.session.add(User(username='pat', email='pat@example.com', password=stored))
+        db.session.commit()
+    passwords = BusyRehash()
+    passwords._prefix = 'scrypt:32768:8:1'
+    monkeypatch.setattr(app_module, 'passwords', passwords)
+
+    response = client.post('/login', data={'email': 'pat@example.com', 'password': 'secret'})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/dashboard')
+    with app.app_context():
+        assert User.query.filter_by(email='pat@example.com').one().password == stored
+
+
+def test_busy_pool_skips_the_rehash_on_aws(awsapp, dynamodb, monkeypatch):
+    client = awsapp.app.test_client()
+    client.post('/register', data={'username': 'pat', 'email': 'pat@example.com', 'password': 'secret',
+                                   'role': 'customer'})
+    passwords = BusyRehash()
+    passwords._prefix = 'scrypt:32768:8:1'
+    monkeypatch.setattr(awsapp, 'passwords', passwords)
+
+    response = client.post('/login', data={'email': 'pat@example.com', 'password': 'secret'})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/dashboard')
+    stored = dynamodb.Table('Users').get_item(Key={'email': 'pat@example.com'})['Item']['password']
+    assert stored.startswith('pbkdf2:sha256:1000$')
@@ -0,0 +1,87 @@
+import threading
+from datetime import datetime, timedelta
+from outbox import InMemoryPublisher, Outbox, OutboxDispatcher, outbox_metrics
+
+TOPIC = 'arn:aws:sns:us-east-1:123456789012:PickleOrderUpdates'
+
+
+def add_records(table, outbox, count, subject='New order', next_attempt_at=None):
+    records = []
+    for number in range(count):
+        record = outbox.record(TOPIC, subject, f'Order {number}')
+        if next_attempt_at:
+            record['next_attempt_at'] = next_attempt_at
+        table.put_item(Item=record)
+        records.append(record)
+    return records
+
+
+def test_records_backing_off_do_not_hide_newer_ones(table):
+    outbox = Outbox(table)
+    later = (datetime.utcnow() + timedelta(minutes=5)).isoformat()
+    add_records(table, outbox, 30, subject='Backing off', next_attempt_at=later)
+    due = add_records(table, outbox, 3)
+
+    assert [record['SK'] for record in outbox.pending(10)] == [record['SK'] for record in due]
+
+
+def test_concurrent_dispatchers_publish_each_record_once(table, monkeypatch):
+    # DynamoDB applies each conditional update atomically; moto does not
+    # across threads, so its calls are taken one at a time here
+    client, lock = table.meta.client, threading.Lock()
+    make_api_call = client._make_api_call
+
+    def atomic_api_call(*args):
+        with lock:
+            return make_api_call(*args)
+
+    monkeypatch.setattr(client, '_make_api_call', atomic_api_call)
+    outbox = Outbox(table)
+    records = add_records(table, outbox, 40)
+    publishers = [InMemoryPublisher() for _ in range(4)]
+    start = threading.Barrier(len(publishers))
+
+    def dispatch(publisher):
+        start.wait()
+        OutboxDispatcher(outbox, publisher).dispatch_once()
+
+    threads = [threading.Thread(target=dispatch, args=(publisher,)) for publisher in publishers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    messages = sorted(message for publisher in publishers for _, _, message in publisher.published)
+    assert messages == sorted(record['message'] for record in records)
+    assert outbox.pending(50) == []
+
+
+def test_failed_records_are_retried_then_dead_lettered(table):
+    outbox = Outbox(table)
+    add_records(table, outbox, 1, subject='Always fails')
+    dispatcher = OutboxDispatcher(outbox, InMemoryPublisher(fail_subjects={'Always fails'}),
+                                  max_attempts=2, base_retry_delay=0)
+
+    dispatcher.dispatch_once()
+    dispatcher.dispatch_once()
+
+    assert dispatcher.metrics['retried'] == 1
+    assert dispatcher.metrics['dead_lettered'] == 1
+    assert outbox.pending(50) == []
+    dead = table.query(KeyConditionExpression='PK = :pk',
+                       ExpressionAttributeValues={':pk': outbox.dead_letter_partition})['Items']
+    assert [record['attempts'] for record in dead] == [2]
+
+
+def test_dispatcher_counts_are_exposed_as_metrics(table):
+    outbox = Outbox(table)
+    add_records(table, outbox, 2)
+    add_records(table, outbox, 1, subject='Always fails')
+    dispatcher = OutboxDispatcher(outbox, InMemoryPublisher(fail_subjects={'Always fails'}))
+
+    dispatcher.dispatch_once()
+    lines = outbox_metrics(dispatcher)
+
+    assert 'outbox_records_total{result="published"} 2' in lines
+    assert 'outbox_records_total{result="retried"} 1' in lines
+    assert 'outbox_due_records 3' in lines
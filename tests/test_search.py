@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import insert
+from models import db, Product
+from search import InvertedIndex, SqliteProductSearch
+
+# Many older products mention mango, then the one product actually called Mango.
+CATALOG = [{'id': number, 'name': f'Lemon Pickle {number:04}', 'category': 'veg', 'price': 120,
+            'description': 'Goes well with mango rice', 'stock': 10}
+           for number in range(1, 601)]
+CATALOG.append({'id': 601, 'name': 'Mango Pickle', 'category': 'veg', 'price': 150,
+                'description': 'Raw mango in mustard oil', 'stock': 10})
+
+
+# few enough matches to rank every product row, and too many for that
+@pytest.fixture(params=[30, 600], ids=['few-matches', 'many-matches'])
+def catalog(app, request):
+    catalog = CATALOG[-request.param - 1:]
+    with app.app_context():
+        db.session.execute(insert(Product), catalog)
+        db.session.commit()
+        yield catalog
+
+
+@pytest.mark.parametrize('query', ['ma', 'mango', 'pickle man'])
+def test_sqlite_search_ranks_every_match(catalog, query):
+    results = SqliteProductSearch().search(query, 3)
+    assert results[0]['name'] == 'Mango Pickle'
+    # ties are listed by id
+    assert [result['id'] for result in results[1:]] == [product['id'] for product in catalog[:2]]
+
+
+@pytest.mark.parametrize('query', ['ma', 'mango', 'pickle man'])
+def test_inverted_index_ranks_every_match(query):
+    results = InvertedIndex(lambda: CATALOG).search(query, 3)
+    assert results[0]['name'] == 'Mango Pickle'
+    # ties are listed by name
+    assert [result['name'] for result in results[1:]] == ['Lemon Pickle 0001', 'Lemon Pickle 0002']
@@ -0,0 +1,68 @@
+from conftest import add_user, sign_in
+from models import db, Product
+from sessions import ServerSessionInterface
+
+
+def count_writes(app, monkeypatch):
+    store = app.session_interface.store
+    writes = []
+
+    def counted(name, method):
+        def write(*args):
+            writes.append(name)
+            return method(*args)
+        return write
+
+    for name in ('create', 'update', 'touch', 'delete'):
+        monkeypatch.setattr(store, name, counted(name, getattr(store, name)))
+    return writes
+
+
+def test_flash_and_redirect_write_once_each_without_a_new_cookie(app, client, monkeypatch):
+    with app.app_context():
+        product = Product(name='Mango Pickle', category='Veg', price=250, stock=5)
+        db.session.add(product)
+        db.session.commit()
+        sign_in(client, add_user('asha'))
+        product_id = product.id
+    writes = count_writes(app, monkeypatch)
+
+    added = client.post('/add-to-cart', data={'product_id': product_id})
+    shown = client.get(added.headers['Location'])
+    again = client.get('/cart')
+
+    assert 'Item added to cart.' in shown.get_data(as_text=True)
+    assert writes == ['update', 'update']
+    assert [response.headers.getlist('Set-Cookie') for response in (added, shown, again)] == [[], [], []]
+
+
+def test_setting_the_same_values_does_not_write(app, client, monkeypatch):
+    with app.app_context():
+        user = add_user('asha')
+        sign_in(client, user)
+    writes = count_writes(app, monkeypatch)
+
+    with client.session_transaction() as client_session:
+        client_session['username'] = 'asha'
+
+    assert writes == []
+
+
+def test_write_from_a_stale_copy_keeps_the_newer_changes(app, client, monkeypatch):
+    with app.app_context():
+        sign_in(client, add_user('asha'))
+    # two workers, each with its own cache, both holding the signed-in copy
+    workers = [ServerSessionInterface(app.session_interface.store) for _ in range(2)]
+    for worker in workers:
+        monkeypatch.setattr(app, 'session_interface', worker)
+        with client.session_transaction():
+            pass
+
+    for worker, key in zip(workers, ('first', 'second')):
+        monkeypatch.setattr(app, 'session_interface', worker)
+        with client.session_transaction() as client_session:
+            client_session[key] = True
+
+    with client.session_transaction() as client_session:
+        assert client_session['first'] and client_session['second']
+        assert client_session['user_id']
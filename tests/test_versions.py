@@ -0,0 +1,39 @@
+from sqlalchemy.orm import Session
+from conftest import add_user, sign_in
+from models import db, Product
+
+
+def test_concurrent_orm_writes_bump_the_version_without_conflicting(app):
+    with app.app_context():
+        product = Product(name='Mango Pickle', category='Veg', price=250, stock=10)
+        db.session.add(product)
+        db.session.commit()
+        first, second = Session(db.engine), Session(db.engine)
+        try:
+            # both read version 1 before either writes
+            first.get(Product, product.id).stock = 9
+            second.get(Product, product.id).name = 'Raw Mango Pickle'
+            first.commit()
+            second.commit()
+        finally:
+            first.close()
+            second.close()
+
+        db.session.refresh(product)
+        assert (product.name, product.stock, product.version) == ('Raw Mango Pickle', 9, 3)
+
+
+def test_product_etag_changes_after_an_orm_update(app, client):
+    with app.app_context():
+        sign_in(client, add_user('asha'))
+        product = Product(name='Mango Pickle', category='Veg', price=250, stock=10)
+        db.session.add(product)
+        db.session.commit()
+        before = client.get(f'/api/v1/products/{product.id}')
+
+        product.price = 275
+        db.session.commit()
+        after = client.get(f'/api/v1/products/{product.id}', headers={'If-None-Match': before.headers['ETag']})
+
+    assert after.status_code == 200
+    assert after.get_json()['price'] == 275